@@ -2,6 +2,7 @@
 Flask application factory
 """
 import os
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -79,10 +80,114 @@ def run_auto_migrations():
             db.session.commit()
             print("✅ Auto-migration: 'end_date' column added to recurring_rule!")
 
+        # Migration: Add data_version to project if not exists
+        project_columns = [col['name'] for col in inspector.get_columns('project')]
+        if 'data_version' not in project_columns:
+            print("📝 Auto-migration: Adding 'data_version' column to project...")
+            db.session.execute(text(
+                "ALTER TABLE project ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"
+            ))
+            db.session.commit()
+            print("✅ Auto-migration: 'data_version' column added to project!")
+
+        # Migration: Create indexes added after the tables were created
+        from app.models.transaction import Transaction
+        from app.models.recurring import RecurringRule
+        for model in (Transaction, RecurringRule):
+            for index in model.__table__.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+
     except Exception as e:
         print(f"⚠️ Auto-migration check: {e}")
 
 
+def configure_sqlite(app):
+    """
+    Apply the SQLite tuning profile to every new pooled connection
+
+    Only file databases are tuned (in-memory test databases keep SQLite
+    defaults). Returns the settings read back from a live connection, or
+    None when the profile does not apply.
+    """
+    from sqlalchemy import event
+
+    engine = db.engine
+    if engine.dialect.name != 'sqlite' or not app.config.get('SQLITE_TUNING_ENABLED', True):
+        return None
+    if engine.url.database in (None, '', ':memory:'):
+        return None
+
+    pragmas = [
+        ('journal_mode', app.config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', app.config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', int(app.config['SQLITE_BUSY_TIMEOUT_MS'])),
+        ('mmap_size', int(app.config['SQLITE_MMAP_SIZE'])),
+        ('cache_size', -int(app.config['SQLITE_CACHE_SIZE_KB'])),  # negative = KiB, not pages
+        ('temp_store', 'MEMORY'),
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    with engine.connect() as connection:
+        active = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name, _ in pragmas
+        }
+    return active
+
+
+def report_database_settings(app, active):
+    """Print the effective database profile at startup"""
+    pool = db.engine.pool
+    pool_info = type(pool).__name__
+    if hasattr(pool, 'size'):
+        pool_info += (f"(size={pool.size()}, overflow={app.config.get('DB_MAX_OVERFLOW')}, "
+                      f"pre_ping={bool(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('pool_pre_ping'))})")
+    app.extensions['db_profile'] = {'pool': pool_info, 'sqlite': active}
+
+    if active is None:
+        print(f"🗄️ Database profile: {db.engine.dialect.name}, pool {pool_info}")
+        return
+
+    synchronous = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}.get(active['synchronous'], active['synchronous'])
+    print(f"🗄️ SQLite profile: journal_mode={active['journal_mode']} synchronous={synchronous} "
+          f"busy_timeout={active['busy_timeout']}ms mmap={active['mmap_size'] // (1024 * 1024)}MB "
+          f"cache={abs(active['cache_size']) // 1024}MB pool {pool_info}")
+    if str(active['journal_mode']).lower() != str(app.config['SQLITE_JOURNAL_MODE']).lower():
+        print(f"⚠️ SQLite journal_mode is {active['journal_mode']}, "
+              f"expected {app.config['SQLITE_JOURNAL_MODE']} (filesystem may not support it)")
+
+
+def is_serving_process(app):
+    """
+    Whether this process should run background worker threads
+
+    False under test, when BACKGROUND_WORKERS_AUTOSTART is off, for `flask`
+    CLI commands other than `run`, and in the Werkzeug reloader parent
+    (debug `python run.py` or `flask run --reload`), which only watches files.
+    """
+    from werkzeug.serving import is_running_from_reloader
+
+    if app.testing or not app.config.get('BACKGROUND_WORKERS_AUTOSTART', True):
+        return False
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        ctx = click.get_current_context(silent=True)
+        if ctx is None or ctx.info_name != 'run':
+            return False
+        reload = ctx.params.get('reload')
+        if reload is None:
+            reload = app.debug
+        return not reload or is_running_from_reloader()
+    return not app.debug or is_running_from_reloader()
+
+
 def create_app(config_name=None):
     """
     Create and configure the Flask application
@@ -102,6 +207,9 @@ def create_app(config_name=None):
     from app.config import config
     app.config.from_object(config[config_name])
 
+    # Worker threads are started only where requests are actually served
+    app.config['BACKGROUND_WORKERS_AUTOSTART'] = is_serving_process(app)
+
     # Ensure instance folder exists
     try:
         os.makedirs(app.instance_path, exist_ok=True)
@@ -112,13 +220,57 @@ def create_app(config_name=None):
     db.init_app(app)
     migrate.init_app(app, db)
 
+    from app.services.http_client import http_client
+    http_client.init_app(app)
+
+    from app.services.replay_store import replay_store
+    replay_store.init_app(app)
+
+    from app.services.single_flight import single_flight
+    single_flight.init_app(app)
+
+    from app.services.line_push import line_push
+    line_push.init_app(app)
+
     # Import models (for migrations to work)
     with app.app_context():
+        # Tune SQLite connections before anything else touches the database
+        report_database_settings(app, configure_sqlite(app))
+
         from app.models import user, project, category, transaction, budget, recurring
         
         # Auto-run pending migrations
         run_auto_migrations()
 
+        # Keep monthly rollups in sync with transaction writes
+        from app.services.rollup_service import RollupService
+        RollupService.register_listeners()
+
+        # Process-local analytics cache, invalidated on data changes
+        from app.services.cache_service import analytics_cache, register_invalidation_listeners
+        analytics_cache.init_app(app)
+        register_invalidation_listeners(db)
+
+        # Bot identity -> (user, project, categories) cache, dropped on link/switch/category edits
+        from app.services.bot_context import bot_context, register_context_listeners
+        bot_context.init_app(app)
+        register_context_listeners(db)
+
+        # Per-project category name index for chat category resolution
+        from app.services.category_index import category_index, register_listeners as register_category_index_listeners
+        category_index.init_app(app)
+        register_category_index_listeners(db)
+
+        # Per-project data version (bumped with every write) and the AI output memo keyed on it
+        from app.services.data_version import ai_memo, register_listeners as register_data_version_listeners
+        ai_memo.init_app(app)
+        register_data_version_listeners(db)
+
+        # Per-project learned categorizer, updated as transactions are committed
+        from app.services.category_classifier import category_classifier, register_listeners as register_classifier_listeners
+        category_classifier.init_app(app)
+        register_classifier_listeners(db)
+
     # Register blueprints
     from app.routes import auth, api, bot, line as line_routes, web
 
@@ -128,6 +280,19 @@ def create_app(config_name=None):
     app.register_blueprint(bot.bp)
     app.register_blueprint(line_routes.bp)
 
+    # LINE webhook events are processed by a background worker pool
+    from app.services.line_queue_service import line_queue
+    line_queue.init_app(app, line_routes.process_event)
+
+    # Recurring rules are materialized by a periodic batch sweep
+    from app.services.recurring_scheduler import recurring_scheduler
+    recurring_scheduler.init_app(app)
+
+    # Per-project insights are regenerated in the background after data changes
+    from app.services.insight_precompute import insight_precompute, register_listeners as register_precompute_listeners
+    insight_precompute.init_app(app)
+    register_precompute_listeners(db)
+
     # Register error handlers
     register_error_handlers(app)
 
@@ -160,6 +325,55 @@ def register_commands(app):
         initialize_database()
         print('Database initialized successfully!')
 
+    @app.cli.command('rebuild-rollups')
+    @click.option('--project-id', default=None, help='Only rebuild this project')
+    def rebuild_rollups(project_id):
+        """Rebuild monthly transaction rollups from history"""
+        from app.services.rollup_service import RollupService
+        count = RollupService.rebuild(project_id)
+        print(f'Rebuilt {count} rollup rows')
+
+    @app.cli.command('run-recurring')
+    @click.option('--date', 'run_date', default=None, help='Cut-off date YYYY-MM-DD (default: today)')
+    def run_recurring(run_date):
+        """Materialize all due recurring rules (with catch-up)"""
+        from datetime import datetime
+        from app.services.recurring_scheduler import recurring_scheduler
+        today = datetime.strptime(run_date, '%Y-%m-%d').date() if run_date else None
+        report = recurring_scheduler.sweep(today)
+        print(f"Materialized {report['transactions']} transactions from {report['rules']} rules "
+              f"in {report['batches']} batches ({report['elapsed_ms']} ms, {report['tx_per_sec']}/s)")
+
+    @app.cli.command('import-transactions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--project-id', required=True, help='Project to import into')
+    @click.option('--format', 'format', type=click.Choice(['csv', 'json', 'jsonl']), default=None,
+                  help='File format (default: from the file extension)')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Rows per DB transaction')
+    @click.option('--dry-run', is_flag=True, help='Validate and count without writing')
+    def import_transactions(path, project_id, format, chunk_size, dry_run):
+        """Bulk import transactions from a CSV/JSON file (duplicates are skipped)"""
+        from app.services.import_service import ImportService
+
+        def progress(report):
+            print(f"  … {report['processed']} rows read, {report['inserted']} inserted, "
+                  f"{report['duplicates']} duplicates, {report['invalid']} invalid "
+                  f"({report['elapsed_ms']} ms)")
+
+        with open(path, 'rb') as stream:
+            report = ImportService.import_transactions(
+                project_id, None,
+                ImportService.iter_records(stream, format or ImportService.detect_format(path)),
+                chunk_size=chunk_size, dry_run=dry_run, progress=progress
+            )
+        for error in report['errors']:
+            print(f"  row {error['row']}: {error['error']}")
+        if report['aborted']:
+            print(f"  stopped early: {report['aborted']}")
+        print(f"{'Checked' if dry_run else 'Imported'} {report['inserted']} of {report['processed']} rows "
+              f"({report['duplicates']} duplicates, {report['invalid']} invalid) "
+              f"in {report['elapsed_ms']} ms ({report['rows_per_sec']}/s)")
+
     @app.cli.command('create-admin')
     def create_admin():
         """Create admin user"""
@@ -78,7 +78,30 @@ class Config:
         print(f"🔌 Database path: {db_path}")
         print(f"🔌 Database URI: {SQLALCHEMY_DATABASE_URI}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = FLASK_ENV == 'development'
+    # SQL logging is opt-in; echoing every statement serializes request threads on stdout
+    SQLALCHEMY_ECHO = os.getenv('SQLALCHEMY_ECHO', 'False') == 'True'
+
+    # SQLite tuning profile, applied to every new connection of a file database
+    # (WAL lets readers run while a writer commits; NORMAL skips the fsync per commit)
+    SQLITE_TUNING_ENABLED = os.getenv('SQLITE_TUNING_ENABLED', 'True') == 'True'
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+
+    # Connection pool (web threads + LINE queue workers + scheduler share it)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
 
     # Session
     SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False') == 'True'
@@ -116,6 +139,87 @@ class Config:
     INSIGHT_MAX_DAYS = int(os.getenv('INSIGHT_MAX_DAYS', '30'))
     INSIGHT_FIELDS_LEVEL = os.getenv('INSIGHT_FIELDS_LEVEL', 'minimal')
 
+    # Analytics cache (in-process LRU + TTL, optional shared tier: none/file/sqlite)
+    ANALYTICS_CACHE_ENABLED = os.getenv('ANALYTICS_CACHE_ENABLED', 'True') == 'True'
+    ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '2048'))
+    ANALYTICS_CACHE_TTL_SECONDS = int(os.getenv('ANALYTICS_CACHE_TTL_SECONDS', '300'))
+    ANALYTICS_CACHE_SHARED_BACKEND = os.getenv('ANALYTICS_CACHE_SHARED_BACKEND', 'none')
+    ANALYTICS_CACHE_SHARED_PATH = os.getenv('ANALYTICS_CACHE_SHARED_PATH')
+
+    # Bot context cache (bot identity -> user, current project, category snapshot)
+    BOT_CONTEXT_CACHE_ENABLED = os.getenv('BOT_CONTEXT_CACHE_ENABLED', 'True') == 'True'
+    BOT_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv('BOT_CONTEXT_CACHE_MAX_ENTRIES', '5000'))
+    BOT_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv('BOT_CONTEXT_CACHE_TTL_SECONDS', '60'))
+
+    # Category name index (per project; rebuilt after TTL to pick up learned synonyms)
+    CATEGORY_INDEX_MAX_PROJECTS = int(os.getenv('CATEGORY_INDEX_MAX_PROJECTS', '500'))
+    CATEGORY_INDEX_TTL_SECONDS = int(os.getenv('CATEGORY_INDEX_TTL_SECONDS', '600'))
+    CATEGORY_SYNONYM_MIN_COUNT = int(os.getenv('CATEGORY_SYNONYM_MIN_COUNT', '2'))
+
+    # AI output memo, keyed on (project, data version, prompt version)
+    AI_MEMO_ENABLED = os.getenv('AI_MEMO_ENABLED', 'True') == 'True'
+    AI_MEMO_MAX_ENTRIES = int(os.getenv('AI_MEMO_MAX_ENTRIES', '2048'))
+    AI_MEMO_TTL_SECONDS = int(os.getenv('AI_MEMO_TTL_SECONDS', '86400'))
+
+    # Single-flight: concurrent identical analytics/LLM calls share one computation
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True') == 'True'
+    SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', '60'))
+
+    # Transaction digests in AI prompts are trimmed to this many (estimated) tokens
+    AI_PROMPT_TOKEN_BUDGET = int(os.getenv('AI_PROMPT_TOKEN_BUDGET', '1200'))
+
+    # Deferred LINE answers for slow AI commands ("thinking" reply now, push the answer later)
+    AI_LINE_PUSH_ENABLED = os.getenv('AI_LINE_PUSH_ENABLED', 'True') == 'True'
+    AI_LINE_PUSH_WORKERS = int(os.getenv('AI_LINE_PUSH_WORKERS', '4'))
+    # Defer /ai answers when the caller does not say (off: the bot must send deferred=true)
+    AI_LINE_PUSH_DEFAULT = os.getenv('AI_LINE_PUSH_DEFAULT', 'False') == 'True'
+
+    # Background insight precompute (debounced per project, stored in the insight table)
+    INSIGHT_PRECOMPUTE_ENABLED = os.getenv('INSIGHT_PRECOMPUTE_ENABLED', 'True') == 'True'
+    INSIGHT_PRECOMPUTE_WORKERS = int(os.getenv('INSIGHT_PRECOMPUTE_WORKERS', '2'))
+    INSIGHT_PRECOMPUTE_DEBOUNCE_SECONDS = float(os.getenv('INSIGHT_PRECOMPUTE_DEBOUNCE_SECONDS', '5'))
+    INSIGHT_PRECOMPUTE_MAX_DELAY_SECONDS = float(os.getenv('INSIGHT_PRECOMPUTE_MAX_DELAY_SECONDS', '60'))
+    # LLM insights are regenerated on write only for projects read within this window
+    INSIGHT_PRECOMPUTE_ACTIVE_SECONDS = int(os.getenv('INSIGHT_PRECOMPUTE_ACTIVE_SECONDS', '86400'))
+    INSIGHT_LLM_MAX_CONCURRENCY = int(os.getenv('INSIGHT_LLM_MAX_CONCURRENCY', '2'))
+
+    # Local category classifier (per project; the LLM is asked only below MIN_CONFIDENCE)
+    CATEGORY_CLASSIFIER_ENABLED = os.getenv('CATEGORY_CLASSIFIER_ENABLED', 'True') == 'True'
+    CATEGORY_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv('CATEGORY_CLASSIFIER_MIN_CONFIDENCE', '0.6'))
+    CATEGORY_CLASSIFIER_MIN_SAMPLES = int(os.getenv('CATEGORY_CLASSIFIER_MIN_SAMPLES', '20'))
+    CATEGORY_CLASSIFIER_MAX_TRAINING_ROWS = int(os.getenv('CATEGORY_CLASSIFIER_MAX_TRAINING_ROWS', '5000'))
+    CATEGORY_CLASSIFIER_MAX_PROJECTS = int(os.getenv('CATEGORY_CLASSIFIER_MAX_PROJECTS', '200'))
+    CATEGORY_CLASSIFIER_TTL_SECONDS = int(os.getenv('CATEGORY_CLASSIFIER_TTL_SECONDS', '3600'))
+
+    # Background worker threads (LINE queue, insight precompute, recurring sweep) start only in the
+    # serving process; never in tests, `flask` CLI commands other than `run`, or the reloader parent
+    BACKGROUND_WORKERS_AUTOSTART = os.getenv('BACKGROUND_WORKERS_AUTOSTART', 'True') == 'True'
+
+    # LINE webhook queue (durable SQLite file, drained by a worker pool)
+    LINE_QUEUE_PATH = os.getenv('LINE_QUEUE_PATH') or os.path.join(DATA_DIR, 'line_queue.db')
+    LINE_QUEUE_WORKERS = int(os.getenv('LINE_QUEUE_WORKERS', '4'))
+    LINE_QUEUE_MAX_ATTEMPTS = int(os.getenv('LINE_QUEUE_MAX_ATTEMPTS', '3'))
+    LINE_QUEUE_DONE_RETENTION_SECONDS = int(os.getenv('LINE_QUEUE_DONE_RETENTION_SECONDS', '86400'))
+    LINE_QUEUE_PURGE_INTERVAL_SECONDS = int(os.getenv('LINE_QUEUE_PURGE_INTERVAL_SECONDS', '600'))
+
+    # Outbound HTTP (shared keep-alive pool for Botpress, LINE and AI providers)
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+    HTTP_HOST_CONCURRENCY = int(os.getenv('HTTP_HOST_CONCURRENCY', '10'))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+    HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', '5'))
+    HTTP_BREAKER_COOLDOWN = int(os.getenv('HTTP_BREAKER_COOLDOWN', '30'))
+
+    # Bot nonce / idempotency replay store (memory: single process, sqlite: shared file)
+    REPLAY_STORE_BACKEND = os.getenv('REPLAY_STORE_BACKEND', 'memory')
+    REPLAY_STORE_PATH = os.getenv('REPLAY_STORE_PATH') or os.path.join(DATA_DIR, 'replay_store.db')
+    REPLAY_STORE_MAX_ENTRIES = int(os.getenv('REPLAY_STORE_MAX_ENTRIES', '100000'))
+
+    # Recurring scheduler (batch sweep of due rules; off by default, see `flask run-recurring`)
+    RECURRING_SCHEDULER_ENABLED = os.getenv('RECURRING_SCHEDULER_ENABLED', 'False') == 'True'
+    RECURRING_SCHEDULER_INTERVAL = int(os.getenv('RECURRING_SCHEDULER_INTERVAL', '3600'))
+    RECURRING_BATCH_SIZE = int(os.getenv('RECURRING_BATCH_SIZE', '500'))
+    RECURRING_MAX_CATCHUP = int(os.getenv('RECURRING_MAX_CATCHUP', '400'))
+
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -134,6 +238,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # In-memory SQLite uses a single static connection
     WTF_CSRF_ENABLED = False
 
 
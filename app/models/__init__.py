@@ -5,6 +5,7 @@ from app.models.user import User
 from app.models.project import Project, ProjectMember, ProjectInvite, ProjectSettings
 from app.models.category import Category
 from app.models.transaction import Transaction, Attachment
+from app.models.transaction_rollup import TransactionMonthlyRollup
 from app.models.budget import Budget
 from app.models.recurring import RecurringRule
 from app.models.security import BotNonce, IdempotencyKey
@@ -28,6 +29,7 @@ __all__ = [
     'Category',
     'Transaction',
     'Attachment',
+    'TransactionMonthlyRollup',
     'Budget',
     'RecurringRule',
     'BotNonce',
@@ -33,61 +33,28 @@ class AnalyticsCache(db.Model):
             'expires_at': self.expires_at.isoformat() if self.expires_at else None
         }
 
+    # The table is kept for existing databases; reads and writes now go
+    # through the in-process cache (app.services.cache_service)
+
     @staticmethod
     def get_cached(cache_key, project_id):
         """Get cached data if not expired"""
-        from datetime import datetime
-
-        cache = AnalyticsCache.query.filter_by(
-            cache_key=cache_key,
-            project_id=project_id
-        ).first()
+        from app.services.cache_service import analytics_cache, MISS
 
-        if cache and cache.expires_at > datetime.utcnow():
-            import json
-            return json.loads(cache.cache_data)
-
-        return None
+        data = analytics_cache.get(project_id, cache_key)
+        return None if data is MISS else data
 
     @staticmethod
     def set_cached(cache_key, project_id, data, ttl_minutes=60):
         """Set cached data with TTL"""
-        from datetime import timedelta
-        import json
-
-        # Delete existing cache
-        existing = AnalyticsCache.query.filter_by(
-            cache_key=cache_key,
-            project_id=project_id
-        ).first()
+        from app.services.cache_service import analytics_cache
 
-        if existing:
-            db.session.delete(existing)
-
-        # Create new cache entry
-        expires_at = datetime.utcnow() + timedelta(minutes=ttl_minutes)
-        cache = AnalyticsCache(
-            project_id=project_id,
-            cache_key=cache_key,
-            cache_data=json.dumps(data),
-            expires_at=expires_at
-        )
-        db.session.add(cache)
-        db.session.commit()
-
-        return cache
+        analytics_cache.set(project_id, cache_key, data, ttl=ttl_minutes * 60)
+        return data
 
     @staticmethod
     def clear_expired():
         """Clear expired cache entries"""
-        from datetime import datetime
-
-        expired = AnalyticsCache.query.filter(
-            AnalyticsCache.expires_at < datetime.utcnow()
-        ).all()
-
-        for cache in expired:
-            db.session.delete(cache)
+        from app.services.cache_service import analytics_cache
 
-        db.session.commit()
-        return len(expired)
+        return analytics_cache.clear_expired()
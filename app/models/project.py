@@ -18,6 +18,8 @@ class Project(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
+    # Bumped with every transaction/budget/goal/category write (see data_version service)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     owner = db.relationship('User', back_populates='owned_projects', foreign_keys=[owner_user_id])
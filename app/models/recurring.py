@@ -40,6 +40,7 @@ class RecurringRule(db.Model):
     # Indexes
     __table_args__ = (
         db.Index('idx_recurring_next_run', 'next_run_date', 'is_active'),
+        db.Index('idx_recurring_project', 'project_id', 'next_run_date'),
     )
 
     def __init__(self, project_id, type, category_id, amount, freq, start_date,
@@ -35,6 +35,22 @@ class Transaction(db.Model):
         db.Index('idx_transaction_occurred', 'project_id', 'occurred_at'),
         db.Index('idx_transaction_category', 'category_id', 'occurred_at'),
         db.Index('idx_transaction_type', 'type', 'occurred_at'),
+        # One transaction per recurring run (rule, run date)
+        db.Index('idx_transaction_recurring_run', 'recurring_rule_id', 'occurred_at', unique=True,
+                 sqlite_where=db.text('recurring_rule_id IS NOT NULL')),
+        # Live rows only (deleted_at IS NULL); amount last so period totals never touch the table
+        db.Index('idx_transaction_live_type', 'project_id', 'type', 'occurred_at', 'amount',
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        db.Index('idx_transaction_live_category', 'project_id', 'category_id', 'occurred_at', 'amount',
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        # Transaction listing keyset (occurred_at, id)
+        db.Index('idx_transaction_live_listing', 'project_id', 'occurred_at', 'id',
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        # Note suggestions / frequent templates (GROUP BY note)
+        db.Index('idx_transaction_live_note', 'project_id', 'note',
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        # AI endpoints window on created_at
+        db.Index('idx_transaction_created', 'project_id', 'created_at'),
     )
 
     def __init__(self, project_id, type, category_id, amount, occurred_at=None, note=None, member_id=None):
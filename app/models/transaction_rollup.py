@@ -0,0 +1,52 @@
+"""
+Transaction rollup model - Pre-aggregated monthly totals per category
+"""
+from datetime import datetime
+from app import db
+from app.utils.helpers import generate_id
+
+
+class TransactionMonthlyRollup(db.Model):
+    """Per-(project, month, type, category) running totals of live transactions"""
+
+    __tablename__ = 'transaction_monthly_rollup'
+
+    id = db.Column(db.String(50), primary_key=True)
+    project_id = db.Column(db.String(50), db.ForeignKey('project.id'), nullable=False)
+    month_yyyymm = db.Column(db.String(7), nullable=False)  # Format: "2025-01"
+    type = db.Column(db.String(20), nullable=False)  # 'income' or 'expense'
+    category_id = db.Column(db.String(50), db.ForeignKey('category.id'), nullable=False)
+    total_amount = db.Column(db.Integer, nullable=False, default=0)  # Amount in satang
+    tx_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Unique constraint and indexes
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'month_yyyymm', 'type', 'category_id', name='uq_rollup_key'),
+        db.Index('idx_rollup_month', 'project_id', 'month_yyyymm', 'type'),
+    )
+
+    def __init__(self, project_id, month_yyyymm, type, category_id, total_amount=0, tx_count=0):
+        self.id = generate_id('rlp')
+        self.project_id = project_id
+        self.month_yyyymm = month_yyyymm
+        self.type = type
+        self.category_id = category_id
+        self.total_amount = total_amount
+        self.tx_count = tx_count
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'month_yyyymm': self.month_yyyymm,
+            'type': self.type,
+            'category_id': self.category_id,
+            'total_amount': self.total_amount,
+            'tx_count': self.tx_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<TransactionMonthlyRollup {self.month_yyyymm} {self.type} {self.total_amount/100}>'
@@ -2,10 +2,10 @@
 Core API routes - CRUD operations for web and bot
 """
 import re
+import csv
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from sqlalchemy.orm import joinedload
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from app.services.transaction_service import TransactionService
 from app.services.analytics_service import AnalyticsService
 from app.services.budget_service import BudgetService
@@ -18,6 +18,9 @@ from app.models.category import Category
 from app.models.budget import Budget
 from app.models.savings_goal import SavingsGoal
 from app.models.analytics_cache import AnalyticsCache
+from app.services.cache_service import analytics_cache
+from app.services.ai_stream import wants_stream, sse_response
+from app.services.prompt_compactor import PromptCompactor
 from app.models.report_template import ReportTemplate
 from app.models.scheduled_report import ScheduledReport
 from app.models.share_link import ShareLink
@@ -135,7 +138,13 @@ def create_project():
 # Transactions
 @bp.route('/projects/<project_id>/transactions', methods=['GET'])
 def get_transactions(project_id):
-    """Get transactions for project"""
+    """
+    Get transactions for project
+
+    Paged by default (page, per_page). Passing cursor (empty for the first
+    page) switches to keyset pagination: follow next_cursor until it is null.
+    count=1 adds the total in cursor mode; count=0 skips it in page mode.
+    """
     auth_error = require_auth()
     if auth_error:
         return auth_error
@@ -151,8 +160,32 @@ def get_transactions(project_id):
         'page': int(request.args.get('page', 1)),
         'per_page': int(request.args.get('per_page', 50))
     }
+    count_arg = request.args.get('count')
 
     try:
+        if 'cursor' in request.args:
+            try:
+                limit = int(request.args.get('limit', filters['per_page']))
+            except ValueError:
+                raise ValueError("limit must be an integer")
+            limit = max(1, min(limit, 200))
+            result = TransactionService.list_transactions(
+                project_id, user.id, filters,
+                cursor=request.args.get('cursor') or None,
+                limit=limit,
+                with_count=count_arg in ('1', 'true')
+            )
+            return jsonify({
+                'transactions': result['items'],
+                'pagination': {
+                    'limit': limit,
+                    'next_cursor': result['next_cursor'],
+                    'has_more': result['has_more'],
+                    'total': result['total']
+                }
+            })
+
+        filters['count'] = count_arg not in ('0', 'false')
         pagination = TransactionService.get_transactions(project_id, user.id, filters)
 
         return jsonify({
@@ -161,7 +194,7 @@ def get_transactions(project_id):
                 'page': pagination.page,
                 'per_page': pagination.per_page,
                 'total': pagination.total,
-                'pages': pagination.pages
+                'pages': pagination.pages if pagination.total is not None else None
             }
         })
     except PermissionError as e:
@@ -171,6 +204,13 @@ def get_transactions(project_id):
                 'message': str(e)
             }
         }), 403
+    except ValueError as e:
+        return jsonify({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }), 400
 
 
 @bp.route('/projects/<project_id>/transactions', methods=['POST'])
@@ -208,6 +248,133 @@ def create_transaction(project_id):
         }), 400
 
 
+@bp.route('/projects/<project_id>/transactions/batch', methods=['POST'])
+def batch_transactions(project_id):
+    """
+    Create/update/delete several transactions atomically
+
+    Body: {"operations": [{"op": "create"|"update"|"delete", ...}, ...]}.
+    Either all operations are applied in one DB transaction or none is;
+    the response has one result per operation. An Idempotency-Key header
+    binds the key to the first attempt: its response (success or
+    validation error) is replayed for retries, and a retry that arrives
+    while the first attempt is still running gets 409.
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    import json
+    from app.services.replay_store import replay_store, IDEMPOTENCY_LEASE_SECONDS
+
+    user = get_current_user()
+    key = request.headers.get('Idempotency-Key')
+    event_id = f"web:{user.id}:{project_id}:{key}" if key else None
+    if event_id:
+        stored = replay_store.get_response(event_id)
+        if stored is None and not replay_store.claim_nonce(f"{event_id}:lease", 'web',
+                                                           ttl=IDEMPOTENCY_LEASE_SECONDS):
+            # Another request holds the key; it may have finished in between
+            stored = replay_store.get_response(event_id)
+            if stored is None:
+                return jsonify({
+                    'error': {
+                        'code': 'CONFLICT',
+                        'message': 'A request with this Idempotency-Key is still in progress'
+                    }
+                }), 409
+        if stored:
+            status, body = stored
+            return current_app.response_class(body, status=status, mimetype='application/json')
+
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+
+    try:
+        if not isinstance(data, dict):
+            raise ValueError('Request body must be a JSON object with an "operations" list')
+        ok, results = TransactionService.apply_batch(project_id, user.id, data.get('operations'))
+    except PermissionError as e:
+        response, status = {
+            'error': {
+                'code': 'FORBIDDEN',
+                'message': str(e)
+            }
+        }, 403
+    except ValueError as e:
+        response, status = {
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }, 400
+    else:
+        if ok:
+            response = {'success': True, 'results': results}
+            status = 201 if any(result['op'] == 'create' for result in results) else 200
+        else:
+            response, status = {'success': False, 'results': results}, 400
+
+    if event_id:
+        replay_store.put_response(event_id, request.path, status, json.dumps(response))
+    return jsonify(response), status
+
+
+@bp.route('/projects/<project_id>/transactions/import', methods=['POST'])
+def import_transactions(project_id):
+    """
+    Bulk import transactions from CSV, JSON or JSON Lines
+
+    Send the file as multipart field "file", or as the raw request body
+    with a text/csv, application/json or application/x-ndjson content type.
+    dry_run=1 validates and counts without writing. Rows already in the
+    project (same occurred_at, amount and note) are skipped. Unparseable
+    JSON lines count as invalid rows; if the file becomes unreadable part
+    way through, the rows before it are kept and reported with "aborted".
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    from app.services.import_service import ImportService, IMPORT_CHUNK_SIZE
+
+    user = get_current_user()
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        format = ImportService.detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        format = ImportService.detect_format(content_type=request.content_type)
+    format = request.args.get('format', format)
+
+    try:
+        chunk_size = min(max(int(request.args.get('chunk_size', IMPORT_CHUNK_SIZE)), 1), 5000)
+        report = ImportService.import_transactions(
+            project_id, user.id,
+            ImportService.iter_records(stream, format),
+            chunk_size=chunk_size,
+            dry_run=request.args.get('dry_run') in ('1', 'true')
+        )
+        return jsonify({'import': report}), 200 if report['dry_run'] else 201
+
+    except PermissionError as e:
+        return jsonify({
+            'error': {
+                'code': 'FORBIDDEN',
+                'message': str(e)
+            }
+        }), 403
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': f'Unreadable {format} file: {e}'
+            }
+        }), 400
+
+
 @bp.route('/projects/<project_id>/transactions/<transaction_id>', methods=['PUT'])
 def update_transaction(project_id, transaction_id):
     """Update transaction"""
@@ -1206,7 +1373,10 @@ def get_analytics_by_category(project_id):
             }), 400
 
         # Get breakdown
-        data = AnalyticsService.get_category_breakdown(project_id, month, type)
+        data = analytics_cache.get_or_compute(
+            project_id, f'by-category:{month}:{type}',
+            lambda: AnalyticsService.get_category_breakdown(project_id, month, type)
+        )
 
         return jsonify(data), 200
 
@@ -1233,7 +1403,10 @@ def get_analytics_trends(project_id):
             }), 400
 
         # Get trends
-        data = AnalyticsService.get_trends(project_id, months)
+        data = analytics_cache.get_or_compute(
+            project_id, f'trends:{datetime.now():%Y-%m}:{months}',
+            lambda: AnalyticsService.get_trends(project_id, months)
+        )
 
         return jsonify(data), 200
 
@@ -1533,7 +1706,8 @@ def export_transactions_csv(project_id):
     try:
         import csv
         import io
-        from flask import make_response
+        from app.models.transaction import Transaction
+        from app.services.export_service import ExportService, EXPORT_BATCH_SIZE
 
         # Get filters from query params
         start_date = request.args.get('start_date')
@@ -1541,55 +1715,55 @@ def export_transactions_csv(project_id):
         category_id = request.args.get('category_id')
         tx_type = request.args.get('type')
 
-        # Query transactions
-        query = Transaction.query.filter_by(
-            project_id=project_id,
-            deleted_at=None
-        )
-
+        filters = [Transaction.deleted_at.is_(None)]
         if start_date:
-            query = query.filter(Transaction.occurred_at >= start_date)
+            filters.append(Transaction.occurred_at >= start_date)
         if end_date:
-            query = query.filter(Transaction.occurred_at <= end_date)
+            filters.append(Transaction.occurred_at <= end_date)
         if category_id:
-            query = query.filter_by(category_id=category_id)
+            filters.append(Transaction.category_id == category_id)
         if tx_type:
-            query = query.filter_by(type=tx_type)
-
-        transactions = query.order_by(Transaction.occurred_at.desc()).all()
-
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow([
-            'วันที่',
-            'เวลา',
-            'ประเภท',
-            'หมวดหมู่',
-            'จำนวนเงิน (บาท)',
-            'หมายเหตุ',
-            'สร้างเมื่อ'
-        ])
-
-        # Write data
-        for tx in transactions:
+            filters.append(Transaction.type == tx_type)
+
+        rows = ExportService.iter_transaction_rows(project_id, extra_filters=filters)
+
+        def generate():
+            output = io.StringIO()
+            writer = csv.writer(output)
+
+            # Write header
             writer.writerow([
-                tx.occurred_at.strftime('%Y-%m-%d') if tx.occurred_at else '',
-                tx.occurred_at.strftime('%H:%M:%S') if tx.occurred_at else '',
-                'รายรับ' if tx.type == 'income' else 'รายจ่าย',
-                tx.category.name_th if tx.category else '',
-                f"{tx.amount / 100:.2f}",
-                tx.note or '',
-                tx.created_at.strftime('%Y-%m-%d %H:%M:%S') if tx.created_at else ''
+                'วันที่',
+                'เวลา',
+                'ประเภท',
+                'หมวดหมู่',
+                'จำนวนเงิน (บาท)',
+                'หมายเหตุ',
+                'สร้างเมื่อ'
             ])
 
-        # Create response
-        output.seek(0)
-        response = make_response(output.getvalue())
+            # Write data, flushing one chunk per fetched batch
+            for i, tx in enumerate(rows, 1):
+                writer.writerow([
+                    tx.occurred_at.strftime('%Y-%m-%d') if tx.occurred_at else '',
+                    tx.occurred_at.strftime('%H:%M:%S') if tx.occurred_at else '',
+                    'รายรับ' if tx.type == 'income' else 'รายจ่าย',
+                    tx.category_name or '',
+                    f"{tx.amount / 100:.2f}",
+                    tx.note or '',
+                    tx.created_at.strftime('%Y-%m-%d %H:%M:%S') if tx.created_at else ''
+                ])
+                if i % EXPORT_BATCH_SIZE == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+
+            yield output.getvalue()
+
+        response = ExportService.create_streaming_response(
+            generate(), f'transactions_{project_id}.csv', 'text/csv', gzip=ExportService.wants_gzip()
+        )
         response.headers['Content-Type'] = 'text/csv; charset=utf-8-sig'  # UTF-8 with BOM for Excel
-        response.headers['Content-Disposition'] = f'attachment; filename=transactions_{project_id}.csv'
 
         return response
 
@@ -1620,9 +1794,10 @@ def get_dashboard_widgets(project_id):
         prev_year = now.year if now.month > 1 else now.year - 1
         prev_month = f"{prev_year}-{str(prev_month_num).zfill(2)}"
         
-        # Get data in parallel
-        current_summary = AnalyticsService.get_monthly_summary(project_id, current_month)
-        prev_summary = AnalyticsService.get_monthly_summary(project_id, prev_month)
+        # Both months come from one rollup query
+        summaries = AnalyticsService.get_monthly_summaries(project_id, [current_month, prev_month])
+        current_summary = summaries[current_month]
+        prev_summary = summaries[prev_month]
         top_budgets = BudgetService.get_dashboard_budgets(project_id, current_month, limit=3)
         
         # Calculate comparison
@@ -1740,11 +1915,13 @@ def get_insights_alerts(project_id):
     
     try:
         month = request.args.get('month', None)
-        alerts = InsightsService.get_budget_alerts(project_id, month)
+        insights, freshness = _stored_insights(project_id, month)
+        alerts = insights['alerts'] if insights else InsightsService.get_budget_alerts(project_id, month)
         
         return jsonify({
             'alerts': alerts,
-            'count': len(alerts)
+            'count': len(alerts),
+            'freshness': freshness
         }), 200
     except Exception as e:
         return jsonify({
@@ -1760,10 +1937,12 @@ def get_insights_trends(project_id):
         return auth_error
     
     try:
-        trends = InsightsService.get_spending_trends(project_id)
+        insights, freshness = _stored_insights(project_id)
+        trends = insights['trends'] if insights else InsightsService.get_spending_trends(project_id)
         
         return jsonify({
-            'trends': trends
+            'trends': trends,
+            'freshness': freshness
         }), 200
     except Exception as e:
         return jsonify({
@@ -1780,11 +1959,14 @@ def get_insights_reminders(project_id):
     
     try:
         days_ahead = int(request.args.get('days_ahead', 7))
-        reminders = InsightsService.get_recurring_reminders(project_id, days_ahead)
+        insights, freshness = _stored_insights(project_id, days_ahead=days_ahead)
+        reminders = insights['reminders'] if insights else \
+            InsightsService.get_recurring_reminders(project_id, days_ahead)
         
         return jsonify({
             'reminders': reminders,
-            'count': len(reminders)
+            'count': len(reminders),
+            'freshness': freshness
         }), 200
     except Exception as e:
         return jsonify({
@@ -1801,11 +1983,14 @@ def get_insights_recommendations(project_id):
     
     try:
         month = request.args.get('month', None)
-        recommendations = InsightsService.get_smart_recommendations(project_id, month)
+        insights, freshness = _stored_insights(project_id, month)
+        recommendations = insights['recommendations'] if insights else \
+            InsightsService.get_smart_recommendations(project_id, month)
         
         return jsonify({
             'recommendations': recommendations,
-            'count': len(recommendations)
+            'count': len(recommendations),
+            'freshness': freshness
         }), 200
     except Exception as e:
         return jsonify({
@@ -1821,26 +2006,39 @@ def get_all_insights(project_id):
         return auth_error
     
     try:
-        month = request.args.get('month', None)
+        from app.services.insight_precompute import insight_precompute
+        month = request.args.get('month', None) or datetime.now().strftime('%Y-%m')
         days_ahead = int(request.args.get('days_ahead', 7))
         
-        alerts = InsightsService.get_budget_alerts(project_id, month)
-        trends = InsightsService.get_spending_trends(project_id)
-        reminders = InsightsService.get_recurring_reminders(project_id, days_ahead)
-        recommendations = InsightsService.get_smart_recommendations(project_id, month)
+        insights, freshness = insight_precompute.read(project_id, 'insights_all', {
+            'month': month, 'days_ahead': days_ahead, 'day': datetime.now().strftime('%Y-%m-%d')
+        })
         
-        return jsonify({
-            'alerts': alerts,
-            'trends': trends,
-            'reminders': reminders,
-            'recommendations': recommendations
-        }), 200
+        return jsonify(dict(insights, freshness=freshness)), 200
     except Exception as e:
         return jsonify({
             'error': {'message': str(e)}
         }), 500
 
 
+def _stored_insights(project_id, month=None, days_ahead=7):
+    """
+    Precomputed insight bundle for the default parameters
+
+    Returns (bundle, freshness), or (None, None) for other parameters so
+    the caller computes just the part it needs.
+    """
+    from app.services.insight_precompute import insight_precompute, JOBS
+    params = {
+        'month': month or datetime.now().strftime('%Y-%m'),
+        'days_ahead': days_ahead,
+        'day': datetime.now().strftime('%Y-%m-%d')
+    }
+    if params != JOBS['insights_all'].defaults():
+        return None, None
+    return insight_precompute.read(project_id, 'insights_all', params)
+
+
 # ===== NOTIFICATION ROUTES =====
 
 @bp.route('/notifications', methods=['GET'])
@@ -2056,11 +2254,13 @@ def export_csv():
     # Get month filter
     month_yyyymm = request.args.get('month')
     
-    # Export to CSV
-    csv_data = ExportService.export_to_csv(project.id, month_yyyymm)
+    # Stream CSV (constant memory, download starts immediately)
     filename = ExportService.generate_filename(project.name, 'csv', month_yyyymm)
 
-    return ExportService.create_csv_response(csv_data, filename)
+    return ExportService.create_streaming_response(
+        ExportService.iter_csv(project.id, month_yyyymm), filename, 'text/csv',
+        gzip=ExportService.wants_gzip()
+    )
 
 
 @bp.route('/export/json', methods=['GET'])
@@ -2087,19 +2287,13 @@ def export_json():
     # Get month filter
     month_yyyymm = request.args.get('month')
     
-    # Export to JSON
-    json_data = ExportService.export_to_json(project.id, month_yyyymm)
-    if not json_data:
-        return jsonify({
-            'error': {
-                'code': 'EXPORT_FAILED',
-                'message': 'Failed to export data'
-            }
-        }), 500
-    
+    # Stream JSON (transactions written batch by batch)
     filename = ExportService.generate_filename(project.name, 'json', month_yyyymm)
 
-    return ExportService.create_json_response(json_data, filename)
+    return ExportService.create_streaming_response(
+        ExportService.iter_json(project.id, month_yyyymm), filename, 'application/json',
+        gzip=ExportService.wants_gzip()
+    )
 
 
 # ============================================================================
@@ -2119,10 +2313,20 @@ def get_daily_averages(project_id):
 
         if not start_date or not end_date:
             from datetime import timedelta
-            end_date = datetime.now()
-            start_date = (end_date - timedelta(days=30)).strftime('%Y-%m-%d')
+            today = datetime.now()
+            start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+            end_date = today.strftime('%Y-%m-%d')
+            # Through the end of today (the cache entry is per day, writes invalidate it)
+            end_bound = datetime.combine(today.date(), datetime.max.time())
+        else:
+            start_date = datetime.strptime(start_date[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+            end_date = datetime.strptime(end_date[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+            end_bound = end_date
 
-        data = AnalyticsService.get_daily_averages(project_id, start_date, end_date)
+        data = analytics_cache.get_or_compute(
+            project_id, f'daily-averages:{start_date}:{end_date}',
+            lambda: AnalyticsService.get_daily_averages(project_id, start_date, end_bound)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2140,7 +2344,10 @@ def get_spending_velocity(project_id):
 
     try:
         days = int(request.args.get('days', 30))
-        data = AnalyticsService.get_spending_velocity(project_id, days)
+        data = analytics_cache.get_or_compute(
+            project_id, f'spending-velocity:{datetime.now():%Y-%m-%d}:{days}',
+            lambda: AnalyticsService.get_spending_velocity(project_id, days)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2158,7 +2365,10 @@ def get_savings_rate(project_id):
 
     try:
         months = int(request.args.get('months', 6))
-        data = AnalyticsService.get_savings_rate(project_id, months)
+        data = analytics_cache.get_or_compute(
+            project_id, f'savings-rate:{datetime.now():%Y-%m}:{months}',
+            lambda: AnalyticsService.get_savings_rate(project_id, months)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2176,7 +2386,10 @@ def get_financial_health(project_id):
 
     try:
         months = int(request.args.get('months', 3))
-        data = AnalyticsService.get_financial_health_score(project_id, months)
+        data = analytics_cache.get_or_compute(
+            project_id, f'financial-health:{datetime.now():%Y-%m-%d}:{months}',
+            lambda: AnalyticsService.get_financial_health_score(project_id, months)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2194,7 +2407,10 @@ def get_category_growth(project_id):
 
     try:
         months = int(request.args.get('months', 6))
-        data = AnalyticsService.get_category_growth_rates(project_id, months)
+        data = analytics_cache.get_or_compute(
+            project_id, f'category-growth:{datetime.now():%Y-%m}:{months}',
+            lambda: AnalyticsService.get_category_growth_rates(project_id, months)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2212,7 +2428,10 @@ def get_seasonal_patterns(project_id):
 
     try:
         years = int(request.args.get('years', 2))
-        data = AnalyticsService.get_seasonal_patterns(project_id, years)
+        data = analytics_cache.get_or_compute(
+            project_id, f'seasonal-patterns:{datetime.now():%Y-%m}:{years}',
+            lambda: AnalyticsService.get_seasonal_patterns(project_id, years)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2230,7 +2449,10 @@ def get_heatmap_data(project_id):
 
     try:
         days = int(request.args.get('days', 30))
-        data = AnalyticsService.get_heatmap_data(project_id, days)
+        data = analytics_cache.get_or_compute(
+            project_id, f'heatmap:{datetime.now():%Y-%m-%d}:{days}',
+            lambda: AnalyticsService.get_heatmap_data(project_id, days)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2248,7 +2470,10 @@ def get_scatter_data(project_id):
 
     try:
         days = int(request.args.get('days', 30))
-        data = AnalyticsService.get_scatter_data(project_id, days)
+        data = analytics_cache.get_or_compute(
+            project_id, f'scatter:{datetime.now():%Y-%m-%d}:{days}',
+            lambda: AnalyticsService.get_scatter_data(project_id, days)
+        )
         return jsonify(data), 200
 
     except Exception as e:
@@ -2275,9 +2500,12 @@ def compare_periods(project_id):
                 "error": {"message": "All period parameters are required"}
             }), 400
 
-        data = AnalyticsService.compare_periods(
-            project_id, period1_start, period1_end,
-            period2_start, period2_end
+        data = analytics_cache.get_or_compute(
+            project_id, f'compare:{period1_start}:{period1_end}:{period2_start}:{period2_end}',
+            lambda: AnalyticsService.compare_periods(
+                project_id, period1_start, period1_end,
+                period2_start, period2_end
+            )
         )
         return jsonify(data), 200
 
@@ -2287,6 +2515,24 @@ def compare_periods(project_id):
         }), 500
 
 
+@bp.route('/analytics/cache-stats', methods=['GET'])
+def get_analytics_cache_stats():
+    """Get analytics cache hit/miss/eviction counters for this worker"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    from app.services.data_version import ai_memo
+    from app.services.insight_precompute import insight_precompute
+    from app.services.single_flight import single_flight
+    return jsonify({
+        "data": analytics_cache.stats(),
+        "ai_memo": ai_memo.stats(),
+        "insight_precompute": insight_precompute.stats(),
+        "single_flight": single_flight.stats()
+    }), 200
+
+
 # ============================================================================
 # PREDICTION ENDPOINTS
 # ============================================================================
@@ -3386,7 +3632,13 @@ def ai_suggest_category(project_id):
                 })
         
         # Get AI suggestion
-        suggestion = gemini_nlp.suggest_category(note, cat_list, history)
+        from app.services.category_index import category_index
+        from app.services.category_classifier import category_classifier
+        suggestion = gemini_nlp.suggest_category(
+            note, cat_list, history,
+            index=category_index.get(project_id),
+            classifier=category_classifier.get(project_id)
+        )
         
         return jsonify({
             "suggestion": suggestion
@@ -3406,47 +3658,22 @@ def ai_financial_coach(project_id):
         return auth_error
 
     try:
-        from app.services.gemini_nlp_service import gemini_nlp
-        from app.services.analytics_service import AnalyticsService
-        from app.models.savings_goal import SavingsGoal
+        from app.services.insight_precompute import insight_precompute
         from datetime import datetime
         
         month = request.args.get('month', datetime.now().strftime('%Y-%m'))
         
-        # Get monthly summary
-        summary = AnalyticsService.get_monthly_summary(project_id, month)
+        if wants_stream():
+            return sse_response(_stream_financial_coach(project_id, month))
         
-        # Get category breakdown
-        category_data = AnalyticsService.get_category_breakdown(project_id, month, 'expense')
-        spending_data = category_data.get('categories', [])
-        
-        # Get goals progress
-        goals = SavingsGoal.query.filter_by(
-            project_id=project_id,
-            is_active=True
-        ).all()
-        
-        goals_data = []
-        for g in goals:
-            progress_pct = (g.current_amount / g.target_amount * 100) if g.target_amount > 0 else 0
-            goals_data.append({
-                'name': g.name,
-                'current': g.current_amount / 100,  # satang to baht
-                'target': g.target_amount / 100,
-                'progress': progress_pct
-            })
-        
-        # Get AI insights
-        insights = gemini_nlp.generate_financial_insights(
-            summary.get('summary', {}),
-            spending_data,
-            goals_data
-        )
+        # Stored by the background precompute (computed inline on a miss)
+        result, freshness = insight_precompute.read(project_id, 'financial_coach', {'month': month})
         
         return jsonify({
-            "coach": insights,
-            "summary": summary.get('summary', {}),
-            "month": month
+            "coach": result['coach'],
+            "summary": result['summary'],
+            "month": month,
+            "freshness": freshness
         }), 200
 
     except Exception as e:
@@ -3455,98 +3682,92 @@ def ai_financial_coach(project_id):
         }), 500
 
 
-@bp.route('/projects/<project_id>/ai/weekly-summary', methods=['GET'])
-def ai_weekly_summary(project_id):
-    """AI Weekly Summary - Get weekly financial summary with insights"""
+def _stream_financial_coach(project_id, month):
+    """SSE events for the financial coach: the stored result, or a live streamed one"""
+    from app.services.gemini_nlp_service import gemini_nlp
+    from app.services.insight_precompute import insight_precompute, financial_coach_inputs
+    from app.services.data_version import get_data_version
+    
+    params = {'month': month}
+    version = get_data_version(project_id)
+    stored = insight_precompute.peek(project_id, 'financial_coach', params, version)
+    if stored is not None:
+        result, freshness = stored
+        yield 'done', {"coach": result['coach'], "summary": result['summary'],
+                       "month": month, "freshness": freshness}
+        return
+    
+    summary, spending_data, goals_data = financial_coach_inputs(project_id, month)
+    yield 'summary', {"summary": summary, "month": month}
+    for event, data in gemini_nlp.stream_financial_insights(summary, spending_data, goals_data):
+        if event == 'token':
+            yield 'token', {'text': data}
+            continue
+        freshness = insight_precompute.store(
+            project_id, 'financial_coach', params, {'coach': data, 'summary': summary}, version
+        )
+        yield 'done', {"coach": data, "summary": summary, "month": month, "freshness": freshness}
+
+
+@bp.route('/ai/chat', methods=['POST'])
+def ai_chat():
+    """Ask the AI assistant anything (the web counterpart of the /ai chat command)"""
     auth_error = require_auth()
     if auth_error:
         return auth_error
 
     try:
         from app.services.gemini_nlp_service import gemini_nlp
-        from app.models.transaction import Transaction
-        from datetime import datetime, timedelta
-        from sqlalchemy import func
-        from app.utils.helpers import satang_to_baht
+        from app.services.ai_stream import chat_context
         
-        # Get date range (last 7 days)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
+        user = get_current_user()
+        data = request.get_json(silent=True) or {}
+        question = (data.get('message') or '').strip()
         
-        # Get transactions for the week
-        transactions = Transaction.query.filter(
-            Transaction.project_id == project_id,
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            Transaction.deleted_at.is_(None)
-        ).all()
+        if not question:
+            return jsonify({"error": {"message": "message is required"}}), 400
         
-        # Calculate totals
-        total_income = sum(t.amount for t in transactions if t.type == 'income')
-        total_expense = sum(t.amount for t in transactions if t.type == 'expense')
-        
-        # Get daily breakdown
-        daily_data = {}
-        for t in transactions:
-            day_key = t.occurred_at.strftime('%Y-%m-%d')
-            if day_key not in daily_data:
-                daily_data[day_key] = {'income': 0, 'expense': 0}
-            if t.type == 'income':
-                daily_data[day_key]['income'] += t.amount
-            else:
-                daily_data[day_key]['expense'] += t.amount
-        
-        # Get top spending categories
-        category_totals = {}
-        for t in transactions:
-            if t.type == 'expense' and t.category:
-                cat_name = t.category.name_th
-                category_totals[cat_name] = category_totals.get(cat_name, 0) + t.amount
-        
-        top_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        # Format data
-        summary_data = {
-            'income': {'formatted': satang_to_baht(total_income)},
-            'expense': {'formatted': satang_to_baht(total_expense)},
-            'balance': {'formatted': satang_to_baht(total_income - total_expense)}
-        }
+        project_id = user.current_project_id
         
-        spending_data = [
-            {
-                'category_name': cat,
-                'formatted': satang_to_baht(amount),
-                'percentage': (amount / total_expense * 100) if total_expense > 0 else 0
-            }
-            for cat, amount in top_categories
-        ]
+        if wants_stream():
+            def events():
+                context = chat_context(project_id) if project_id else None
+                chunks = []
+                for text in gemini_nlp.chat_stream(question, context):
+                    chunks.append(text)
+                    yield 'token', {'text': text}
+                yield 'done', {'success': True, 'message': ''.join(chunks)}
+            return sse_response(events())
         
-        # Get AI insights
-        insights = gemini_nlp.generate_financial_insights(summary_data, spending_data)
+        context = chat_context(project_id) if project_id else None
+        return jsonify({
+            "success": True,
+            "message": gemini_nlp.chat(question, context)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@bp.route('/projects/<project_id>/ai/weekly-summary', methods=['GET'])
+def ai_weekly_summary(project_id):
+    """AI Weekly Summary - Get weekly financial summary with insights"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    try:
+        from app.services.insight_precompute import insight_precompute
         
-        # Add weekly specific data
-        insights['period'] = {
-            'start': start_date.strftime('%Y-%m-%d'),
-            'end': end_date.strftime('%Y-%m-%d'),
-            'days': 7
-        }
-        insights['totals'] = {
-            'income': satang_to_baht(total_income),
-            'expense': satang_to_baht(total_expense),
-            'balance': satang_to_baht(total_income - total_expense),
-            'transaction_count': len(transactions)
-        }
-        insights['daily_breakdown'] = [
-            {
-                'date': day,
-                'income': satang_to_baht(data['income']),
-                'expense': satang_to_baht(data['expense'])
-            }
-            for day, data in sorted(daily_data.items())
-        ]
+        # Stored by the background precompute (computed inline on a miss)
+        insights, freshness = insight_precompute.read(project_id, 'weekly_summary')
         
         return jsonify({
-            "weekly_summary": insights
+            "weekly_summary": insights,
+            "freshness": freshness
         }), 200
 
     except Exception as e:
@@ -4011,10 +4232,8 @@ def generate_monthly_plan():
 
     try:
         from app.services.ai_planner_service import ai_planner
-        from app.models.transaction import Transaction
         from app.models.category import Category
         from app.models.budget import Budget
-        from app.models.goal import Goal
         
         user = get_current_user()
         project_id = user.current_project_id
@@ -4022,38 +4241,36 @@ def generate_monthly_plan():
         if not project_id:
             return jsonify({"error": {"message": "No project selected"}}), 400
         
-        # Get last 3 months of transactions
-        three_months_ago = datetime.now() - timedelta(days=90)
-        transactions = Transaction.query.options(
-            joinedload(Transaction.category)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.created_at >= three_months_ago
-        ).order_by(Transaction.created_at.desc()).limit(500).all()
-        
-        tx_list = [{
-            "amount": tx.amount / 100,
-            "type": tx.type,
-            "category_name": tx.category.name if tx.category else "Unknown",
-            "note": tx.note or "",
-            "date": tx.created_at.strftime("%Y-%m-%d")
-        } for tx in transactions]
-        
-        # Get categories
-        categories = Category.query.filter_by(project_id=project_id).all()
-        cat_list = [{"id": c.id, "name": c.name, "icon": c.icon} for c in categories]
-        
-        # Get current budgets
-        budgets = Budget.query.filter_by(project_id=project_id).all()
-        budget_list = [{"category_id": b.category_id, "amount": b.amount / 100} for b in budgets]
-        
-        # Get goals
-        goals = Goal.query.filter_by(project_id=project_id).all()
-        goal_list = [{"name": g.name, "target": g.target_amount / 100, 
-                      "current": g.current_amount / 100} for g in goals]
+        def load_inputs():
+            # Last 3 months as a compact digest (aggregates, not rows)
+            digest = PromptCompactor.build_digest(project_id, months=3)
+            
+            # Get categories
+            categories = Category.query.filter_by(project_id=project_id).all()
+            cat_list = [{"id": c.id, "name": c.name_th, "icon": c.icon} for c in categories]
+            
+            # Get current budgets
+            budgets = Budget.query.filter_by(project_id=project_id).all()
+            budget_list = [{"category_id": b.category_id, "amount": b.limit_amount / 100} for b in budgets]
+            
+            # Get goals
+            goals = SavingsGoal.query.filter_by(project_id=project_id).all()
+            goal_list = [{"name": g.name, "target": g.target_amount / 100, 
+                          "current": g.current_amount / 100} for g in goals]
+            return digest, cat_list, budget_list, goal_list
+        
+        if wants_stream():
+            # SSE: tokens as the model writes them, then the parsed plan
+            def events():
+                for event, data in ai_planner.stream_monthly_plan(user, *load_inputs()):
+                    if event == 'token':
+                        yield 'token', {'text': data}
+                    else:
+                        yield 'done', {'success': True, 'plan': data}
+            return sse_response(events())
         
         # Generate plan
-        plan = ai_planner.generate_monthly_plan(user, tx_list, cat_list, budget_list, goal_list)
+        plan = ai_planner.generate_monthly_plan(user, *load_inputs())
         
         return jsonify({
             "success": True,
@@ -4076,7 +4293,6 @@ def get_recurring_expenses():
 
     try:
         from app.services.ai_planner_service import ai_planner
-        from app.models.transaction import Transaction
         
         user = get_current_user()
         project_id = user.current_project_id
@@ -4084,24 +4300,10 @@ def get_recurring_expenses():
         if not project_id:
             return jsonify({"error": {"message": "No project selected"}}), 400
         
-        # Get last 6 months of transactions
-        six_months_ago = datetime.now() - timedelta(days=180)
-        transactions = Transaction.query.options(
-            joinedload(Transaction.category)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.created_at >= six_months_ago
-        ).order_by(Transaction.created_at.desc()).limit(500).all()
-        
-        tx_list = [{
-            "amount": tx.amount / 100,
-            "note": tx.note or "",
-            "date": tx.created_at.strftime("%Y-%m-%d"),
-            "category": getattr(tx.category, 'name', 'Unknown') if tx.category else "Unknown"
-        } for tx in transactions]
+        # Last 6 months of expenses, as note statistics and recurrence candidates
+        digest = PromptCompactor.build_digest(project_id, months=6, tx_type='expense')
         
-        recurring = ai_planner.detect_recurring_expenses(user, tx_list)
+        recurring = ai_planner.detect_recurring_expenses(user, digest)
         
         return jsonify({
             "success": True,
@@ -4224,8 +4426,7 @@ def get_spending_patterns():
         return auth_error
 
     try:
-        from app.services.gemini_nlp_service import gemini_nlp
-        from app.models.transaction import Transaction
+        from app.services.insight_precompute import insight_precompute
         
         user = get_current_user()
         project_id = user.current_project_id
@@ -4235,27 +4436,16 @@ def get_spending_patterns():
         
         # Get period from query
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.now() - timedelta(days=days)
-        
-        transactions = Transaction.query.options(
-            joinedload(Transaction.category)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.created_at >= start_date
-        ).all()
-        
-        tx_list = [{
-            "amount": tx.amount / 100,
-            "type": tx.type,
-            "category_name": getattr(tx.category, 'name', 'Other') if tx.category else "Other",
-            "date": tx.created_at.strftime("%Y-%m-%d")
-        } for tx in transactions]
         
-        patterns = gemini_nlp.analyze_spending_patterns(tx_list, days)
+        # Stored by the background precompute for the default period (the window moves daily)
+        patterns, freshness = insight_precompute.read(
+            project_id, 'spending_patterns', {'days': days, 'day': datetime.now().strftime('%Y-%m-%d')}
+        )
         
         return jsonify({
             "success": True,
-            "patterns": patterns
+            "patterns": patterns,
+            "freshness": freshness
         }), 200
 
     except Exception as e:
@@ -4273,9 +4463,7 @@ def get_auto_insights():
         return auth_error
 
     try:
-        from app.services.gemini_nlp_service import gemini_nlp
-        from app.models.transaction import Transaction
-        from app.models.budget import Budget
+        from app.services.insight_precompute import insight_precompute
         
         user = get_current_user()
         project_id = user.current_project_id
@@ -4283,44 +4471,13 @@ def get_auto_insights():
         if not project_id:
             return jsonify({"success": True, "insights": {"cards": [], "alerts": [], "tips": []}}), 200
         
-        # Get current month transactions
-        now = datetime.now()
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        transactions = Transaction.query.options(
-            joinedload(Transaction.category)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.created_at >= start_of_month
-        ).all()
-        
-        tx_list = [{
-            "amount": tx.amount / 100,
-            "type": tx.type,
-            "category_name": getattr(tx.category, 'name', 'Other') if tx.category else "Other",
-            "date": tx.created_at.strftime("%Y-%m-%d")
-        } for tx in transactions]
-        
-        # Get budgets
-        budgets = Budget.query.filter_by(project_id=project_id).all()
-        budget_list = []
-        for b in budgets:
-            # Calculate used amount for this budget
-            used_amount = sum(
-                tx.amount / 100 for tx in transactions 
-                if tx.category_id == b.category_id and tx.type == 'expense'
-            )
-            budget_list.append({
-                "category": b.category.name if b.category else "Unknown",
-                "limit": b.amount / 100,
-                "used": used_amount
-            })
-        
-        insights = gemini_nlp.generate_auto_insights(tx_list, budget_list)
+        # Stored by the background precompute (computed inline on a miss)
+        insights, freshness = insight_precompute.read(project_id, 'auto_insights')
         
         return jsonify({
             "success": True,
-            "insights": insights
+            "insights": insights,
+            "freshness": freshness
         }), 200
 
     except Exception as e:
@@ -4391,7 +4548,6 @@ def simulate_what_if():
 
     try:
         from app.services.ai_forecast_service import ai_forecast
-        from app.models.transaction import Transaction
         
         user = get_current_user()
         project_id = user.current_project_id
@@ -4402,24 +4558,11 @@ def simulate_what_if():
         
         changes = data.get('changes', {})  # {"category": percent_change}
         
-        # Get current month transactions
-        now = datetime.now()
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        transactions = Transaction.query.options(
-            joinedload(Transaction.category)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.created_at >= start_of_month
-        ).all()
-        
-        tx_list = [{
-            "amount": tx.amount / 100,
-            "type": tx.type,
-            "category_name": getattr(tx.category, 'name', 'Other') if tx.category else "Other"
-        } for tx in transactions]
+        # Current month totals per category (every category, so any change can apply)
+        digest = PromptCompactor.build_digest(project_id, months=1, max_categories=None,
+                                              include_notes=False)
         
-        simulation = ai_forecast.simulate_what_if(tx_list, changes)
+        simulation = ai_forecast.simulate_what_if(digest, changes)
         
         return jsonify({
             "success": True,
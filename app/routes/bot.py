@@ -6,6 +6,11 @@ from app import db
 from app.models.user import User
 from app.models.project import Project, ProjectSettings
 from app.services.transaction_service import TransactionService
+from app.services.category_service import CategoryService
+from app.services.bot_context import bot_context
+from app.services.category_index import category_index
+from app.services.category_classifier import category_classifier
+from app.services.aggregation_service import AggregationService
 from app.utils.security import require_bot_auth, store_idempotency_response
 from app.models.transaction import Transaction
 from app.models.budget import Budget
@@ -35,13 +40,11 @@ def resolve_context():
         }), 400
 
     # Try to find user by multiple methods
-    user = None
-    if line_user_id:
-        user = User.query.filter_by(line_user_id=line_user_id).first()
-    if not user and botpress_user_id:
-        user = User.query.filter_by(botpress_user_id=botpress_user_id).first()
+    ctx = bot_context.resolve(line_user_id, prefer_line=True) if line_user_id else None
+    if not ctx and botpress_user_id:
+        ctx = bot_context.resolve(botpress_user_id)
 
-    if not user:
+    if not ctx:
         return jsonify({
             'error': {
                 'code': 'USER_NOT_FOUND',
@@ -50,7 +53,7 @@ def resolve_context():
         }), 404
 
     # Get current project
-    project_id = user.current_project_id
+    project_id = ctx.project_id
     project = None
     settings = None
 
@@ -60,7 +63,7 @@ def resolve_context():
             settings = ProjectSettings.query.filter_by(project_id=project_id).first()
 
     return jsonify({
-        'user': user.to_dict(),
+        'user': ctx.user.to_dict(),
         'current_project': project.to_dict() if project else None,
         'settings': settings.to_dict() if settings else None
     })
@@ -154,8 +157,6 @@ def create_transaction():
     Supports both category_id and category_name
     Supports botpress_user_id with auto-mapping to LINE user
     """
-    from app.models.category import Category
-    
     data = request.json
 
     line_user_id = data.get('line_user_id')  # Can be LINE ID or Botpress ID
@@ -166,21 +167,10 @@ def create_transaction():
     note = data.get('note')
     occurred_at = data.get('occurred_at')
 
-    # Find user - try multiple methods
-    user = None
-    
-    # Method 1: Try as LINE user ID first
-    if line_user_id:
-        user = User.query.filter_by(line_user_id=line_user_id).first()
-    
-    # Method 2: Try as Botpress user ID
-    if not user and line_user_id:
-        user = User.query.filter_by(botpress_user_id=line_user_id).first()
-    
-    # Method 3: If user found by LINE ID but no botpress mapping, auto-update
-    # (This handles future cases where we know the LINE ID)
+    # Find user - LINE user ID first, then Botpress user ID
+    ctx = bot_context.resolve(line_user_id, prefer_line=True)
 
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         # Provide helpful error message with link instructions
         return jsonify({
             'error': {
@@ -191,35 +181,14 @@ def create_transaction():
 
     # Auto-lookup category if category_name is provided
     if not category_id and category_name:
-        # Map common names to English names
-        name_mapping = {
-            'อาหาร': 'food', 'food': 'food', 'กินข้าว': 'food',
-            'เดินทาง': 'transport', 'transport': 'transport',
-            'ช้อปปิ้ง': 'shopping', 'shopping': 'shopping',
-            'บันเทิง': 'entertainment', 'entertainment': 'entertainment',
-            'สุขภาพ': 'health', 'health': 'health',
-            'บิล': 'bills', 'bills': 'bills', 'ค่าใช้จ่าย': 'bills',
-            'เงินเดือน': 'salary', 'salary': 'salary',
-            'โบนัส': 'bonus', 'bonus': 'bonus',
-            'อื่นๆ': 'other_income', 'other': 'other_income'
-        }
-        
-        lookup_name = name_mapping.get(category_name.lower(), category_name.lower())
-        
-        # Find category by name_en or name_th
-        category = Category.query.filter(
-            Category.project_id == user.current_project_id,
-            (Category.name_en == lookup_name) | (Category.name_th == category_name)
-        ).first()
+        # Names, aliases ("กินข้าว", "food") and learned synonyms from the project index
+        category = category_index.find_category(ctx.project_id, category_name, type=type)
         
         if category:
             category_id = category.id
         else:
             # Use default category based on type
-            default_cat = Category.query.filter(
-                Category.project_id == user.current_project_id,
-                Category.type == type
-            ).first()
+            default_cat = ctx.find_category(type=type)
             if default_cat:
                 category_id = default_cat.id
 
@@ -243,8 +212,8 @@ def create_transaction():
     try:
         # Create transaction
         transaction = TransactionService.create_transaction(
-            project_id=user.current_project_id,
-            user_id=user.id,
+            project_id=ctx.project_id,
+            user_id=ctx.user_id,
             type=type,
             category_id=category_id,
             amount=amount,
@@ -256,7 +225,7 @@ def create_transaction():
         budget_status = None
         if type == 'expense':
             budget_status = _check_budget_status(
-                user.current_project_id,
+                ctx.project_id,
                 category_id,
                 transaction.occurred_at
             )
@@ -287,6 +256,65 @@ def create_transaction():
         }), 400
 
 
+@bp.route('/transactions/batch', methods=['POST'])
+@require_bot_auth(require_idempotency=True)
+def batch_transactions():
+    """
+    Create/update/delete up to MAX_BATCH_OPERATIONS transactions in one call
+
+    One signature, one event_id and one DB transaction for the whole
+    batch: either every operation is applied or none is, and the response
+    carries one result per operation (see TransactionService.apply_batch).
+    Multi-item chat messages and offline sync use this instead of N calls
+    to /transactions/create.
+    """
+    data = request.json
+    ctx = bot_context.resolve(data.get('line_user_id'), prefer_line=True)
+
+    if not ctx or not ctx.project_id:
+        return jsonify({
+            'error': {
+                'code': 'USER_NO_PROJECT',
+                'message': 'ยังไม่ได้เชื่อมต่อบัญชี กรุณาเข้าเว็บแล้วพิมพ์ "เชื่อมต่อ" หรือ "link" ในแชทนี้'
+            }
+        }), 400
+
+    try:
+        ok, results = TransactionService.apply_batch(ctx.project_id, ctx.user_id, data.get('operations'))
+    except (ValueError, PermissionError) as e:
+        return jsonify({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': str(e)
+            }
+        }), 400
+
+    if not ok:
+        return jsonify({'success': False, 'results': results}), 400
+
+    # Budget status once per expense category and month touched
+    budget_status = {}
+    for result in results:
+        transaction = result.get('transaction')
+        if transaction and transaction['type'] == 'expense':
+            occurred_at = datetime.fromisoformat(transaction['occurred_at'])
+            key = f"{transaction['category_id']}:{occurred_at.strftime('%Y-%m')}"
+            if key not in budget_status:
+                budget_status[key] = _check_budget_status(ctx.project_id, transaction['category_id'], occurred_at)
+
+    response = {
+        'success': True,
+        'results': results,
+        'budget_status': {key: status for key, status in budget_status.items() if status}
+    }
+    status = 201 if any(result['op'] == 'create' for result in results) else 200
+
+    if hasattr(g, 'event_id'):
+        store_idempotency_response(g.event_id, request.path, status, json.dumps(response))
+
+    return jsonify(response), status
+
+
 @bp.route('/insights/export', methods=['POST'])
 @require_bot_auth(require_idempotency=True)
 def export_insights_dataset():
@@ -300,9 +328,9 @@ def export_insights_dataset():
     fields_level = data.get('fields_level', 'minimal')
 
     # Find user
-    user = User.query.filter_by(line_user_id=line_user_id).first()
+    ctx = bot_context.resolve(line_user_id, prefer_line=True)
 
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         return jsonify({
             'error': {
                 'code': 'USER_NO_PROJECT',
@@ -311,7 +339,7 @@ def export_insights_dataset():
         }), 400
 
     # Get project settings
-    settings = ProjectSettings.query.filter_by(project_id=user.current_project_id).first()
+    settings = ProjectSettings.query.filter_by(project_id=ctx.project_id).first()
 
     if not settings or not settings.insight_enabled:
         return jsonify({
@@ -329,13 +357,14 @@ def export_insights_dataset():
     from_date = datetime.utcnow() - timedelta(days=max_days)
 
     transactions = Transaction.query.filter(
-        Transaction.project_id == user.current_project_id,
+        Transaction.project_id == ctx.project_id,
         Transaction.occurred_at >= from_date,
         Transaction.deleted_at.is_(None)
     ).order_by(Transaction.occurred_at.desc()).limit(max_records).all()
 
     # Build dataset based on fields_level
     dataset = []
+    categories = CategoryService.get_category_map(ctx.project_id)
     for txn in transactions:
         item = {
             'type': txn.type,
@@ -345,7 +374,8 @@ def export_insights_dataset():
         }
 
         if fields_level in ['standard', 'full']:
-            item['category_name'] = txn.category.name_th if txn.category else None
+            cat = categories.get(txn.category_id)
+            item['category_name'] = cat.name_th if cat else None
 
         if fields_level == 'full':
             item['note'] = txn.note
@@ -358,7 +388,7 @@ def export_insights_dataset():
             'count': len(dataset),
             'from_date': from_date.isoformat(),
             'fields_level': fields_level,
-            'project_id': user.current_project_id
+            'project_id': ctx.project_id
         }
     }
 
@@ -440,11 +470,9 @@ def get_summary():
         }), 400
     
     # Find user
-    user = User.query.filter_by(botpress_user_id=botpress_user_id).first()
-    if not user:
-        user = User.query.filter_by(line_user_id=botpress_user_id).first()
+    ctx = bot_context.resolve(botpress_user_id)
     
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         return jsonify({
             'success': False,
             'message': 'ยังไม่ได้เชื่อมต่อบัญชี กรุณาพิมพ์ "เชื่อมต่อ" เพื่อลงทะเบียน'
@@ -485,25 +513,13 @@ def get_summary():
             end_date = datetime(today.year, today.month + 1, 1)
         period_name = 'เดือนนี้'
     
-    project_id = user.current_project_id
-    
-    # Get income summary
-    income_total = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.project_id == project_id,
-        Transaction.type == 'income',
-        Transaction.occurred_at >= start_date,
-        Transaction.occurred_at < end_date,
-        Transaction.deleted_at.is_(None)
-    ).scalar() or 0
+    project_id = ctx.project_id
     
-    # Get expense summary
-    expense_total = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.project_id == project_id,
-        Transaction.type == 'expense',
-        Transaction.occurred_at >= start_date,
-        Transaction.occurred_at < end_date,
-        Transaction.deleted_at.is_(None)
-    ).scalar() or 0
+    # Get income/expense totals and transaction count in one query
+    totals = AggregationService.get_period_totals(project_id, start_date, end_date)
+    income_total = totals['income']
+    expense_total = totals['expense']
+    transaction_count = totals['count']
     
     # Get top expense categories
     top_categories = db.session.query(
@@ -517,14 +533,6 @@ def get_summary():
         Transaction.deleted_at.is_(None)
     ).group_by(Category.id).order_by(db.desc('total')).limit(5).all()
     
-    # Get transaction count
-    transaction_count = Transaction.query.filter(
-        Transaction.project_id == project_id,
-        Transaction.occurred_at >= start_date,
-        Transaction.occurred_at < end_date,
-        Transaction.deleted_at.is_(None)
-    ).count()
-    
     # Convert satang to baht
     income_baht = income_total / 100
     expense_baht = expense_total / 100
@@ -595,17 +603,15 @@ def universal_query():
         }), 400
     
     # Find user
-    user = User.query.filter_by(botpress_user_id=botpress_user_id).first()
-    if not user:
-        user = User.query.filter_by(line_user_id=botpress_user_id).first()
+    ctx = bot_context.resolve(botpress_user_id)
     
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         return jsonify({
             'success': False,
             'message': 'ยังไม่ได้เชื่อมต่อบัญชี กรุณาพิมพ์ "เชื่อมต่อ" เพื่อลงทะเบียน'
         }), 400
     
-    project_id = user.current_project_id
+    project_id = ctx.project_id
     today = date.today()
     
     # ============================================
@@ -632,9 +638,10 @@ def universal_query():
             })
         
         lines = [f"📝 รายการล่าสุด ({len(transactions)} รายการ):", ""]
+        categories = CategoryService.get_category_map(project_id)
         
         for t in transactions:
-            cat = Category.query.get(t.category_id)
+            cat = categories.get(t.category_id)
             cat_name = cat.name_th if cat else "ไม่ระบุ"
             amount = t.amount / 100
             icon = "💸" if t.type == 'expense' else "💰"
@@ -705,9 +712,10 @@ def universal_query():
             })
         
         lines = [f"📊 งบประมาณ {month}:", ""]
+        categories = CategoryService.get_category_map(project_id)
         
         for b in budgets:
-            cat = Category.query.get(b.category_id)
+            cat = categories.get(b.category_id)
             cat_name = cat.name_th if cat else "ไม่ระบุ"
             limit_baht = b.limit_amount / 100
             
@@ -862,28 +870,10 @@ def universal_query():
             end_date = datetime(today.year + 1, 1, 1) if today.month == 12 else datetime(today.year, today.month + 1, 1)
             period_name = 'เดือนนี้'
         
-        income = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'income',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-        
-        expense = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-        
-        count = Transaction.query.filter(
-            Transaction.project_id == project_id,
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).count()
+        totals = AggregationService.get_period_totals(project_id, start_date, end_date)
+        income = totals['income']
+        expense = totals['expense']
+        count = totals['count']
         
         income_baht = income / 100
         expense_baht = expense / 100
@@ -942,17 +932,15 @@ def universal_action():
         }), 400
     
     # Find user
-    user = User.query.filter_by(botpress_user_id=botpress_user_id).first()
-    if not user:
-        user = User.query.filter_by(line_user_id=botpress_user_id).first()
+    ctx = bot_context.resolve(botpress_user_id)
     
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         return jsonify({
             'success': False,
             'message': 'ยังไม่ได้เชื่อมต่อบัญชี กรุณาพิมพ์ "เชื่อมต่อ" เพื่อลงทะเบียน'
         }), 400
     
-    project_id = user.current_project_id
+    project_id = ctx.project_id
     
     # ============================================
     # ACTION: update_transaction
@@ -978,8 +966,9 @@ def universal_action():
                 
                 if len(transactions) > 1:
                     lines = ["พบหลายรายการ กรุณาระบุให้ชัดเจน:", ""]
+                    categories = CategoryService.get_category_map(project_id)
                     for i, t in enumerate(transactions, 1):
-                        cat = Category.query.get(t.category_id)
+                        cat = categories.get(t.category_id)
                         cat_name = cat.name_th if cat else "ไม่ระบุ"
                         amount = t.amount / 100
                         lines.append(f"{i}. {cat_name}: {amount:,.2f}฿ - {t.note or 'ไม่มีหมายเหตุ'}")
@@ -1012,10 +1001,7 @@ def universal_action():
             updated.append(f"หมายเหตุ: {params['note']}")
         
         if 'category_name' in params:
-            cat = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f"%{params['category_name']}%")
-            ).first()
+            cat = category_index.find_category(project_id, params['category_name'])
             if cat:
                 transaction.category_id = cat.id
                 updated.append(f"หมวดหมู่: {cat.name_th}")
@@ -1138,10 +1124,7 @@ def universal_action():
                 'message': 'กรุณาระบุชื่อหมวดหมู่ที่ต้องการลบ'
             })
         
-        category = Category.query.filter(
-            Category.project_id == project_id,
-            Category.name_th.ilike(f'%{name}%')
-        ).first()
+        category = category_index.find_category(project_id, name, aliases=False)
         
         if not category:
             return jsonify({
@@ -1348,20 +1331,7 @@ def universal_action():
             amount = int(amount * 100)
         
         # Find category
-        category = None
-        if category_name:
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%'),
-                Category.type == trans_type
-            ).first()
-        
-        if not category:
-            # Find first category of that type
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.type == trans_type
-            ).first()
+        category = category_index.find_category(project_id, category_name, type=trans_type, fallback=True)
         
         if not category:
             return jsonify({
@@ -1579,10 +1549,7 @@ def universal_action():
         
         # Update category
         if 'category_name' in params:
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{params["category_name"]}%')
-            ).first()
+            category = category_index.find_category(project_id, params["category_name"])
             if category:
                 rule.category_id = category.id
                 changes.append(f"หมวดหมู่: {category.name_th}")
@@ -1640,17 +1607,15 @@ def analyze_finances():
         }), 400
     
     # Find user
-    user = User.query.filter_by(botpress_user_id=botpress_user_id).first()
-    if not user:
-        user = User.query.filter_by(line_user_id=botpress_user_id).first()
+    ctx = bot_context.resolve(botpress_user_id)
     
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         return jsonify({
             'success': False,
             'message': 'ยังไม่ได้เชื่อมต่อบัญชี กรุณาพิมพ์ "เชื่อมต่อ" เพื่อลงทะเบียน'
         }), 400
     
-    project_id = user.current_project_id
+    project_id = ctx.project_id
     
     try:
         # ============================================
@@ -1811,6 +1776,22 @@ def analyze_finances():
         }), 500
 
 
+@bp.route('/nlp/stats', methods=['GET'])
+@require_bot_auth()
+def nlp_stats():
+    """NLP statistics: parse cache hit rate and intent routing report (per worker)"""
+    from app.services.gemini_nlp_service import gemini_nlp
+    from app.services.intent_router import intent_router
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'parse_cache': gemini_nlp.parse_cache_stats(),
+            'intent_router': intent_router.report()
+        }
+    })
+
+
 @bp.route('/smart', methods=['POST'])
 def smart_message():
     """
@@ -1824,6 +1805,7 @@ def smart_message():
     """
     import os
     from app.services.gemini_nlp_service import gemini_nlp
+    from app.services.intent_router import intent_router
     from app.models.recurring import RecurringRule
     from app.models.category import Category
     from app.models.savings_goal import SavingsGoal
@@ -1865,29 +1847,20 @@ def smart_message():
         }), 400
     
     # Find user
-    user = User.query.filter_by(botpress_user_id=botpress_user_id).first()
-    if not user:
-        user = User.query.filter_by(line_user_id=botpress_user_id).first()
+    ctx = bot_context.resolve(botpress_user_id)
     
-    if not user or not user.current_project_id:
+    if not ctx or not ctx.project_id:
         return jsonify({
             'success': False,
             'message': 'ยังไม่ได้เชื่อมต่อบัญชี กรุณาพิมพ์ \"เชื่อมต่อ\" เพื่อลงทะเบียน'
         })
     
-    project_id = user.current_project_id
+    project_id = ctx.project_id
     
     # Context Memory - store last transactions for reference
     context = data.get('context', {})
     last_transactions = context.get('last_transactions', [])
     
-    # Parse message using Gemini NLP
-    parsed = gemini_nlp.parse_message(message)
-    intent = parsed.get('intent', 'general')
-    entities = parsed.get('entities', {})
-    missing_fields = parsed.get('missing_fields', [])
-    fallback_question = parsed.get('fallback_question')
-    
     # ========================
     # /AI COMMAND - Ask Gemini anything
     # ========================
@@ -1909,38 +1882,20 @@ def smart_message():
             })
         
         # Build financial context for the user
-        from datetime import date
-        today = date.today()
+        from app.services.ai_stream import chat_context
+        from app.services.line_push import line_push
+        context = chat_context(project_id)
         
-        # Get recent summary
-        try:
-            month_start = datetime(today.year, today.month, 1)
-            if today.month == 12:
-                month_end = datetime(today.year + 1, 1, 1)
-            else:
-                month_end = datetime(today.year, today.month + 1, 1)
-            
-            income_total = db.session.query(db.func.sum(Transaction.amount)).filter(
-                Transaction.project_id == project_id,
-                Transaction.type == 'income',
-                Transaction.occurred_at >= month_start,
-                Transaction.occurred_at < month_end,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
-            
-            expense_total = db.session.query(db.func.sum(Transaction.amount)).filter(
-                Transaction.project_id == project_id,
-                Transaction.type == 'expense',
-                Transaction.occurred_at >= month_start,
-                Transaction.occurred_at < month_end,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
-            
-            context = f"""รายรับเดือนนี้: {income_total/100:,.0f} บาท
-รายจ่ายเดือนนี้: {expense_total/100:,.0f} บาท
-คงเหลือ: {(income_total-expense_total)/100:,.0f} บาท"""
-        except:
-            context = None
+        # LINE: answer now with a short "thinking" reply, push the answer when ready.
+        # Opt-in (deferred=true or AI_LINE_PUSH_DEFAULT): pushes count against the LINE message quota
+        deferred = data.get('deferred', current_app.config.get('AI_LINE_PUSH_DEFAULT', False))
+        if line_push.enabled and ctx.line_user_id and deferred is True:
+            line_push.defer(ctx.line_user_id, lambda: f"🤖 **AI:**\n\n{gemini_nlp.chat(question, context)}")
+            return jsonify({
+                'success': True,
+                'deferred': True,
+                'message': "🤔 กำลังคิดคำตอบให้อยู่นะคะ เดี๋ยวส่งตามไปค่ะ..."
+            })
         
         # Get AI response
         ai_response = gemini_nlp.chat(question, context)
@@ -1950,6 +1905,14 @@ def smart_message():
             'message': f"🤖 **AI:**\n\n{ai_response}"
         })
     
+    # Parse message: keyword rules first, Gemini only for low-confidence messages
+    # (after /ai, which needs no parse)
+    parsed = intent_router.parse(message)
+    intent = parsed.get('intent', 'general')
+    entities = parsed.get('entities', {})
+    missing_fields = parsed.get('missing_fields', [])
+    fallback_question = parsed.get('fallback_question')
+    
     # Check for missing required fields
     if missing_fields and fallback_question:
         return jsonify({
@@ -1983,19 +1946,7 @@ def smart_message():
                 amount = int(amount * 100)
             
             # Find or create category
-            category = None
-            if category_name:
-                category = Category.query.filter(
-                    Category.project_id == project_id,
-                    Category.name_th.ilike(f'%{category_name}%'),
-                    Category.type == trans_type
-                ).first()
-            
-            if not category:
-                category = Category.query.filter(
-                    Category.project_id == project_id,
-                    Category.type == trans_type
-                ).first()
+            category = category_index.find_category(project_id, category_name, type=trans_type, fallback=True)
             
             if not category:
                 return jsonify({
@@ -2614,10 +2565,7 @@ def smart_message():
                 })
             
             # Find category
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%')
-            ).first()
+            category = category_index.find_category(project_id, category_name)
             
             if not category:
                 return jsonify({
@@ -2662,10 +2610,7 @@ def smart_message():
                 })
             
             # Find category
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%')
-            ).first()
+            category = category_index.find_category(project_id, category_name)
             
             if not category:
                 return jsonify({
@@ -2868,10 +2813,7 @@ def smart_message():
                 })
             
             # Check if exists
-            existing = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%')
-            ).first()
+            existing = category_index.find_category(project_id, category_name, aliases=False)
             
             if existing:
                 return jsonify({
@@ -2915,10 +2857,7 @@ def smart_message():
                 })
             
             # Find category
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%')
-            ).first()
+            category = category_index.find_category(project_id, category_name, aliases=False)
             
             if not category:
                 return jsonify({
@@ -2960,10 +2899,7 @@ def smart_message():
                 })
             
             # Find category
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%')
-            ).first()
+            category = category_index.find_category(project_id, category_name, aliases=False)
             
             if not category:
                 return jsonify({
@@ -3010,20 +2946,12 @@ def smart_message():
             if amount < 1000000:
                 amount = int(amount * 100)
             
-            # Find category
-            category = None
-            if category_name:
-                category = Category.query.filter(
-                    Category.project_id == project_id,
-                    Category.name_th.ilike(f'%{category_name}%'),
-                    Category.type == trans_type
-                ).first()
-            
+            # Find category: typed name, then the learned classifier on the note, then the default
+            category = category_index.find_category(project_id, category_name, type=trans_type)
+            if not category and note:
+                category = category_classifier.find_category(project_id, note, type=trans_type)
             if not category:
-                category = Category.query.filter(
-                    Category.project_id == project_id,
-                    Category.type == trans_type
-                ).first()
+                category = category_index.find_category(project_id, None, type=trans_type, fallback=True)
             
             if not category:
                 return jsonify({
@@ -3373,10 +3301,7 @@ def smart_message():
             
             # Update category
             if new_category_name:
-                new_category = Category.query.filter(
-                    Category.project_id == project_id,
-                    Category.name_th.ilike(f'%{new_category_name}%')
-                ).first()
+                new_category = category_index.find_category(project_id, new_category_name)
                 
                 if new_category:
                     old_cat = old_cat_name
@@ -3505,10 +3430,7 @@ def smart_message():
                 })
             
             # Find category
-            category = Category.query.filter(
-                Category.project_id == project_id,
-                Category.name_th.ilike(f'%{category_name}%')
-            ).first()
+            category = category_index.find_category(project_id, category_name)
             
             if not category:
                 return jsonify({
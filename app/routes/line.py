@@ -3,45 +3,30 @@ LINE webhook handler - Receives messages from LINE and forwards to Botpress
 """
 from flask import Blueprint, request, jsonify, current_app
 import json
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage
-from app.utils.security import require_line_signature
+from app.utils.security import require_line_signature, require_bot_auth
 from app.services.botpress_service import BotpressService
+from app.services.line_queue_service import line_queue
+from app.services.http_client import http_client
 
 bp = Blueprint('line', __name__, url_prefix='/line')
 
+LINE_REPLY_URL = 'https://api.line.me/v2/bot/message/reply'
+
 
 @bp.route('/webhook', methods=['POST'])
 @require_line_signature()
 def webhook():
     """
     LINE webhook endpoint
-    Receives events from LINE and processes them
+    Verifies the signature, queues events and acknowledges immediately.
+    Botpress forwarding and replies run in the line queue worker pool.
     """
     # Get request body
     body = request.get_data(as_text=True)
 
     try:
         events = json.loads(body).get('events', [])
-
-        for event in events:
-            if event.get('type') == 'message' and event['message'].get('type') == 'text':
-                # Process text message
-                line_user_id = event['source']['userId']
-                message_text = event['message']['text']
-                reply_token = event['replyToken']
-
-                # Send to Botpress for processing
-                response = BotpressService.send_message_to_botpress(
-                    line_user_id=line_user_id,
-                    message=message_text,
-                    event_id=event.get('message', {}).get('id')
-                )
-
-                # Reply to LINE
-                if response and response.get('reply'):
-                    _send_line_reply(reply_token, response['reply'])
+        line_queue.enqueue(events)
 
         return jsonify({'success': True})
 
@@ -55,6 +40,38 @@ def webhook():
         }), 500
 
 
+@bp.route('/queue/stats', methods=['GET'])
+@require_bot_auth()
+def queue_stats():
+    """LINE event queue backlog metrics"""
+    return jsonify({'success': True, 'data': line_queue.stats()})
+
+
+def process_event(event):
+    """
+    Process one queued LINE event (runs in a queue worker)
+
+    Args:
+        event: LINE webhook event dict
+    """
+    if event.get('type') == 'message' and event['message'].get('type') == 'text':
+        # Process text message
+        line_user_id = event['source']['userId']
+        message_text = event['message']['text']
+        reply_token = event['replyToken']
+
+        # Send to Botpress for processing
+        response = BotpressService.send_message_to_botpress(
+            line_user_id=line_user_id,
+            message=message_text,
+            event_id=event.get('message', {}).get('id')
+        )
+
+        # Reply to LINE
+        if response and response.get('reply'):
+            _send_line_reply(reply_token, response['reply'])
+
+
 def _send_line_reply(reply_token, text):
     """
     Send reply message to LINE
@@ -64,10 +81,17 @@ def _send_line_reply(reply_token, text):
         text: Message text to send
     """
     try:
-        line_bot_api = LineBotApi(current_app.config['LINE_CHANNEL_ACCESS_TOKEN'])
-        line_bot_api.reply_message(
-            reply_token,
-            TextSendMessage(text=text)
+        response = http_client.post(
+            LINE_REPLY_URL,
+            json={
+                'replyToken': reply_token,
+                'messages': [{'type': 'text', 'text': text}]
+            },
+            headers={'Authorization': f"Bearer {current_app.config['LINE_CHANNEL_ACCESS_TOKEN']}"},
+            retries=1,
+            timeout=10
         )
+        if response.status_code != 200:
+            current_app.logger.error(f"Failed to send LINE reply: {response.status_code} {response.text}")
     except Exception as e:
         current_app.logger.error(f"Failed to send LINE reply: {str(e)}")
@@ -3,7 +3,7 @@ Aggregation Service
 Provides data aggregation for different time periods
 """
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, extract, desc
+from sqlalchemy import func, extract, desc, case
 from app import db
 from app.models.transaction import Transaction
 from app.utils.helpers import satang_to_baht
@@ -12,6 +12,76 @@ from app.utils.helpers import satang_to_baht
 class AggregationService:
     """Service for data aggregation"""
 
+    @staticmethod
+    def totals_columns():
+        """
+        Labeled income/expense/count aggregate columns for a single scan
+
+        Conditional SUM/COUNT by type, so one grouped query yields every
+        total a summary needs instead of one filtered query per figure.
+        Labels: income, expense, income_count, expense_count, count
+        """
+        return [
+            func.coalesce(func.sum(
+                case((Transaction.type == 'income', Transaction.amount), else_=0)
+            ), 0).label('income'),
+            func.coalesce(func.sum(
+                case((Transaction.type == 'expense', Transaction.amount), else_=0)
+            ), 0).label('expense'),
+            func.count(case((Transaction.type == 'income', Transaction.id))).label('income_count'),
+            func.count(case((Transaction.type == 'expense', Transaction.id))).label('expense_count'),
+            func.count(Transaction.id).label('count')
+        ]
+
+    @staticmethod
+    def get_period_totals(project_id, start_date, end_date, end_inclusive=False, extra_columns=None):
+        """
+        Get income, expense and transaction counts for a date range in one query
+
+        Args:
+            project_id: Project ID
+            start_date: Range start (datetime or YYYY-MM-DD string)
+            end_date: Range end (datetime or YYYY-MM-DD string)
+            end_inclusive: Use occurred_at <= end_date instead of < end_date
+            extra_columns: Optional extra labeled aggregates for the same scan
+
+        Returns:
+            dict: {
+                "income": 50000,  # satang
+                "expense": 35000,
+                "balance": 15000,
+                "income_count": 3,
+                "expense_count": 20,
+                "count": 23
+            }
+            plus one key per extra column label
+        """
+        extra_columns = extra_columns or []
+        end_filter = Transaction.occurred_at <= end_date if end_inclusive else Transaction.occurred_at < end_date
+
+        row = db.session.query(
+            *AggregationService.totals_columns(),
+            *extra_columns
+        ).filter(
+            Transaction.project_id == project_id,
+            Transaction.occurred_at >= start_date,
+            end_filter,
+            Transaction.deleted_at.is_(None)
+        ).one()
+
+        totals = {
+            "income": row.income or 0,
+            "expense": row.expense or 0,
+            "income_count": row.income_count or 0,
+            "expense_count": row.expense_count or 0,
+            "count": row.count or 0
+        }
+        totals["balance"] = totals["income"] - totals["expense"]
+        for column in extra_columns:
+            totals[column.name] = getattr(row, column.name) or 0
+
+        return totals
+
     @staticmethod
     def get_weekly_summaries(project_id, weeks=12):
         """
@@ -52,19 +122,7 @@ class AggregationService:
             extract('week', Transaction.occurred_at).label('week'),
             func.min(Transaction.occurred_at).label('week_start'),
             func.max(Transaction.occurred_at).label('week_end'),
-            func.sum(
-                func.case(
-                    (Transaction.type == 'income', Transaction.amount),
-                    else_=0
-                )
-            ).label('income'),
-            func.sum(
-                func.case(
-                    (Transaction.type == 'expense', Transaction.amount),
-                    else_=0
-                )
-            ).label('expense'),
-            func.count(Transaction.id).label('count')
+            *AggregationService.totals_columns()
         ).filter(
             Transaction.project_id == project_id,
             Transaction.occurred_at >= start_date,
@@ -155,19 +213,7 @@ class AggregationService:
             func.ceil(extract('month', Transaction.occurred_at) / 3.0).label('quarter'),
             func.min(Transaction.occurred_at).label('quarter_start'),
             func.max(Transaction.occurred_at).label('quarter_end'),
-            func.sum(
-                func.case(
-                    (Transaction.type == 'income', Transaction.amount),
-                    else_=0
-                )
-            ).label('income'),
-            func.sum(
-                func.case(
-                    (Transaction.type == 'expense', Transaction.amount),
-                    else_=0
-                )
-            ).label('expense'),
-            func.count(Transaction.id).label('count')
+            *AggregationService.totals_columns()
         ).filter(
             Transaction.project_id == project_id,
             Transaction.occurred_at >= start_date,
@@ -269,19 +315,7 @@ class AggregationService:
         # Query yearly data
         results = db.session.query(
             extract('year', Transaction.occurred_at).label('year'),
-            func.sum(
-                func.case(
-                    (Transaction.type == 'income', Transaction.amount),
-                    else_=0
-                )
-            ).label('income'),
-            func.sum(
-                func.case(
-                    (Transaction.type == 'expense', Transaction.amount),
-                    else_=0
-                )
-            ).label('expense'),
-            func.count(Transaction.id).label('count')
+            *AggregationService.totals_columns()
         ).filter(
             Transaction.project_id == project_id,
             Transaction.occurred_at >= start_date,
@@ -389,34 +423,12 @@ class AggregationService:
         days = (end_date - start_date).days + 1
 
         # Get summary
-        income = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'income',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-
-        expense = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-
-        count = db.session.query(
-            func.count(Transaction.id)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
+        totals = AggregationService.get_period_totals(
+            project_id, start_date, end_date, end_inclusive=True
+        )
+        income = totals["income"]
+        expense = totals["expense"]
+        count = totals["count"]
 
         # Get category breakdown
         category_results = db.session.query(
@@ -7,6 +7,7 @@ from app import db
 from app.models.transaction import Transaction
 from app.models.category import Category
 from app.models.budget import Budget
+from app.services.single_flight import coalesced
 from sqlalchemy import func
 import statistics
 
@@ -15,6 +16,7 @@ class AIAnalyticsService:
     """Service for AI-powered financial analytics"""
     
     @staticmethod
+    @coalesced('analytics')
     def get_spending_analysis(project_id, months=3):
         """
         Analyze spending patterns over multiple months
@@ -96,6 +98,7 @@ class AIAnalyticsService:
         }
     
     @staticmethod
+    @coalesced('analytics')
     def predict_next_month(project_id):
         """
         Predict next month's spending using simple moving average
@@ -144,6 +147,7 @@ class AIAnalyticsService:
         }
     
     @staticmethod
+    @coalesced('analytics')
     def calculate_financial_health(project_id):
         """
         Calculate financial health score (0-100) based on multiple factors
@@ -287,6 +291,7 @@ class AIAnalyticsService:
         }
     
     @staticmethod
+    @coalesced('analytics')
     def get_smart_advice(project_id, user_occupation=None):
         """
         Generate personalized financial advice
@@ -7,11 +7,8 @@ import json
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
 
-try:
-    import urllib.request
-    import urllib.error
-except ImportError:
-    pass
+from app.services.http_client import http_client
+from app.services.single_flight import single_flight, prompt_key
 
 
 class AIForecastService:
@@ -33,9 +30,15 @@ class AIForecastService:
         return model or 'openai/gpt-4o-mini'
     
     def _call_ai(self, api_key: str, model: str, system_prompt: str, user_message: str) -> str:
-        """Call OpenRouter API"""
+        """Call OpenRouter API (identical concurrent calls share one request)"""
         if not api_key:
             return None
+        key = prompt_key(type(self).__name__, api_key, model, system_prompt, user_message)
+        return single_flight.do(
+            'openrouter', key, lambda: self._request_ai(api_key, model, system_prompt, user_message)
+        )
+    
+    def _request_ai(self, api_key: str, model: str, system_prompt: str, user_message: str) -> str:
         try:
             payload = json.dumps({
                 "model": model,
@@ -47,14 +50,14 @@ class AIForecastService:
                 "temperature": 0.5
             }).encode('utf-8')
             
-            req = urllib.request.Request(self.api_url, data=payload, method='POST')
-            req.add_header('Authorization', f'Bearer {api_key}')
-            req.add_header('Content-Type', 'application/json')
-            req.add_header('HTTP-Referer', 'https://promptjod.app')
-            
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                result = json.loads(resp.read().decode('utf-8'))
-                return result.get('choices', [{}])[0].get('message', {}).get('content', '')
+            resp = http_client.post(self.api_url, data=payload, timeout=30, headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/json',
+                'HTTP-Referer': 'https://promptjod.app'
+            })
+            resp.raise_for_status()
+            result = resp.json()
+            return result.get('choices', [{}])[0].get('message', {}).get('content', '')
         except Exception as e:
             print(f"AI call error: {e}")
             return None
@@ -146,35 +149,29 @@ class AIForecastService:
             "summary": f"พยากรณ์ {months_ahead} เดือนข้างหน้า: {trend_message}"
         }
     
-    def simulate_what_if(self, transactions: list, changes: dict) -> dict:
+    def simulate_what_if(self, digest: dict, changes: dict) -> dict:
         """
         What-if scenario simulation
         
         Args:
-            transactions: Current transaction history
+            digest: Transaction digest from PromptCompactor.build_digest()
             changes: Dict with category changes, e.g. {"อาหาร": -20, "เดินทาง": -10}
                      Values are percentage changes (-20 = reduce by 20%)
         
         Returns:
             dict with simulation results
         """
-        if not transactions:
+        if not digest or not digest.get('totals', {}).get('transaction_count'):
             return {"error": "No data"}
         
-        # Calculate current totals
+        # Current totals
+        total_income = digest['totals']['income']
+        total_expense = digest['totals']['expense']
         category_totals = {}
-        total_income = 0
-        total_expense = 0
-        
-        for tx in transactions:
-            amount = tx.get('amount', 0)
-            category = tx.get('category_name', 'Other')
-            
-            if tx.get('type') == 'income':
-                total_income += amount
-            else:
-                total_expense += amount
-                category_totals[category] = category_totals.get(category, 0) + amount
+        for category in digest.get('categories', []):
+            if category['type'] == 'expense':
+                name = category['name']
+                category_totals[name] = category_totals.get(name, 0) + category['total']
         
         # Apply changes
         new_expense = 0
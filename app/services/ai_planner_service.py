@@ -7,11 +7,9 @@ import json
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
 
-try:
-    import urllib.request
-    import urllib.error
-except ImportError:
-    pass
+from app.services.http_client import http_client
+from app.services.single_flight import single_flight, prompt_key
+from app.services.prompt_compactor import PromptCompactor
 
 
 class AIPlannerService:
@@ -34,9 +32,15 @@ class AIPlannerService:
         return model or 'openai/gpt-4o-mini'
     
     def _call_ai(self, api_key: str, model: str, system_prompt: str, user_message: str) -> str:
-        """Call OpenRouter API with given prompts"""
+        """Call OpenRouter API with given prompts (identical concurrent calls share one request)"""
         if not api_key:
             return None
+        key = prompt_key(type(self).__name__, api_key, model, system_prompt, user_message)
+        return single_flight.do(
+            'openrouter', key, lambda: self._request_ai(api_key, model, system_prompt, user_message)
+        )
+    
+    def _request_ai(self, api_key: str, model: str, system_prompt: str, user_message: str) -> str:
         
         try:
             payload = json.dumps({
@@ -49,26 +53,64 @@ class AIPlannerService:
                 "temperature": 0.7
             }).encode('utf-8')
             
-            req = urllib.request.Request(self.api_url, data=payload, method='POST')
-            req.add_header('Authorization', f'Bearer {api_key}')
-            req.add_header('Content-Type', 'application/json')
-            req.add_header('HTTP-Referer', 'https://promptjod.app')
-            
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                result = json.loads(resp.read().decode('utf-8'))
-                return result.get('choices', [{}])[0].get('message', {}).get('content', '')
+            resp = http_client.post(self.api_url, data=payload, timeout=30, headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/json',
+                'HTTP-Referer': 'https://promptjod.app'
+            })
+            resp.raise_for_status()
+            result = resp.json()
+            return result.get('choices', [{}])[0].get('message', {}).get('content', '')
         except Exception as e:
             print(f"AI call error: {e}")
             return None
     
-    def generate_monthly_plan(self, user, transactions: list, categories: list, 
+    def _stream_ai(self, api_key: str, model: str, system_prompt: str, user_message: str):
+        """Yield content deltas from the OpenRouter streaming API (server-sent events)"""
+        if not api_key:
+            return
+        
+        try:
+            payload = json.dumps({
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "max_tokens": 2000,
+                "temperature": 0.7,
+                "stream": True
+            }).encode('utf-8')
+            
+            resp = http_client.post(self.api_url, data=payload, timeout=30, stream=True, retries=0, headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'HTTP-Referer': 'https://promptjod.app'
+            })
+            with resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines(decode_unicode=True):
+                    # Lines starting with ':' are keep-alive comments
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    delta = json.loads(data).get('choices', [{}])[0].get('delta', {}).get('content')
+                    if delta:
+                        yield delta
+        except Exception as e:
+            print(f"AI stream error: {e}")
+    
+    def generate_monthly_plan(self, user, digest: dict, categories: list, 
                                current_budgets: list = None, goals: list = None) -> dict:
         """
         Generate a complete monthly financial plan using AI
         
         Args:
             user: User object with API key
-            transactions: List of past transactions [{amount, category, date, type}]
+            digest: Transaction digest from PromptCompactor.build_digest()
             categories: Available categories [{id, name, icon}]
             current_budgets: Existing budgets [{category_id, amount}]
             goals: Savings goals [{name, target, current}]
@@ -80,10 +122,38 @@ class AIPlannerService:
         model = self._get_user_model(user)
         
         if not api_key:
-            return self._fallback_plan(transactions, categories)
+            return self._fallback_plan(digest, categories)
+        
+        system_prompt, user_message = self._monthly_plan_prompts(digest, categories, goals)
+        ai_response = self._call_ai(api_key, model, system_prompt, user_message)
+        return self._parse_plan(ai_response, digest, categories)
+    
+    def stream_monthly_plan(self, user, digest: dict, categories: list,
+                            current_budgets: list = None, goals: list = None):
+        """
+        Streaming variant of generate_monthly_plan()
         
-        # Prepare transaction summary for AI
-        summary = self._summarize_transactions(transactions)
+        Yields:
+            ('token', text) for every chunk the model produces, then exactly
+            one ('done', plan dict) (the rule-based plan when there is no
+            API key or the answer is not valid JSON)
+        """
+        api_key = self._get_user_api_key(user)
+        model = self._get_user_model(user)
+        
+        if not api_key:
+            yield 'done', self._fallback_plan(digest, categories)
+            return
+        
+        system_prompt, user_message = self._monthly_plan_prompts(digest, categories, goals)
+        chunks = []
+        for text in self._stream_ai(api_key, model, system_prompt, user_message):
+            chunks.append(text)
+            yield 'token', text
+        yield 'done', self._parse_plan(''.join(chunks), digest, categories)
+    
+    def _monthly_plan_prompts(self, digest: dict, categories: list, goals: list = None):
+        """(system_prompt, user_message) for the monthly plan"""
         
         system_prompt = """คุณคือที่ปรึกษาการเงินส่วนบุคคล AI ภาษาไทย วิเคราะห์ข้อมูลการใช้จ่ายและสร้างแผนการเงินรายเดือน
 
@@ -116,8 +186,8 @@ class AIPlannerService:
 
         user_message = f"""วิเคราะห์ข้อมูลการเงินและสร้างแผนรายเดือน:
 
-สรุปรายการ (3 เดือนล่าสุด):
-{json.dumps(summary, ensure_ascii=False, indent=2)}
+สรุปรายการ (3 เดือนล่าสุด, ยอดเป็นบาท, monthly เรียงตาม months):
+{PromptCompactor.to_prompt(digest)}
 
 หมวดหมู่ที่มี:
 {json.dumps([c.get('name') for c in categories[:15]], ensure_ascii=False)}
@@ -126,9 +196,10 @@ class AIPlannerService:
 {json.dumps(goals or [], ensure_ascii=False)}
 
 สร้างแผนงบประมาณรายเดือนที่สมจริงตามข้อมูลนี้ โปรดตอบเป็นภาษาไทยทั้งหมด"""
-
-        ai_response = self._call_ai(api_key, model, system_prompt, user_message)
-        
+        return system_prompt, user_message
+    
+    def _parse_plan(self, ai_response: str, digest: dict, categories: list) -> dict:
+        """Plan dict from the model's answer, or the rule-based plan"""
         if ai_response:
             try:
                 # Clean response
@@ -139,44 +210,24 @@ class AIPlannerService:
             except:
                 pass
         
-        return self._fallback_plan(transactions, categories)
+        return self._fallback_plan(digest, categories)
     
-    def _summarize_transactions(self, transactions: list) -> dict:
-        """Summarize transactions for AI analysis"""
-        if not transactions:
-            return {"total_income": 0, "total_expense": 0, "categories": {}}
-        
-        total_income = 0
-        total_expense = 0
-        categories = {}
-        
-        for tx in transactions:
-            amount = tx.get('amount', 0)
-            tx_type = tx.get('type', 'expense')
-            category = tx.get('category_name', 'Unknown')
-            
-            if tx_type == 'income':
-                total_income += amount
-            else:
-                total_expense += amount
-                categories[category] = categories.get(category, 0) + amount
-        
-        # Sort categories by amount
-        sorted_cats = sorted(categories.items(), key=lambda x: x[1], reverse=True)
-        
+    def _monthly_averages(self, digest: dict) -> dict:
+        """Average monthly income, expense and expense per category from a digest"""
+        months = max(len(digest.get('months') or []), 1)
+        totals = digest.get('totals', {})
+        expense_categories = [c for c in digest.get('categories', []) if c['type'] == 'expense']
         return {
-            "total_income": total_income,
-            "total_expense": total_expense,
-            "balance": total_income - total_expense,
-            "top_categories": dict(sorted_cats[:10]),
-            "transaction_count": len(transactions)
+            "income": totals.get('income', 0) / months,
+            "expense": totals.get('expense', 0) / months,
+            "categories": {c['name']: c['total'] / months for c in expense_categories}
         }
     
-    def _fallback_plan(self, transactions: list, categories: list) -> dict:
+    def _fallback_plan(self, digest: dict, categories: list) -> dict:
         """Generate a basic plan without AI"""
-        summary = self._summarize_transactions(transactions)
-        income = summary.get('total_income', 0)
-        expense = summary.get('total_expense', 0)
+        averages = self._monthly_averages(digest)
+        income = averages['income']
+        expense = averages['expense']
         
         # 50/30/20 rule
         needs_budget = income * 0.5
@@ -184,8 +235,7 @@ class AIPlannerService:
         savings_budget = income * 0.2
         
         budgets = []
-        top_cats = summary.get('top_categories', {})
-        for cat_name, amount in list(top_cats.items())[:5]:
+        for cat_name, amount in list(averages['categories'].items())[:5]:
             budgets.append({
                 "category": cat_name,
                 "amount": int(amount * 1.1),  # 10% buffer
@@ -199,7 +249,7 @@ class AIPlannerService:
                 "savings_percentage": 20,
                 "allocation_rule": "50/30/20"
             },
-            "recurring_detected": [],
+            "recurring_detected": self._fallback_recurring(digest)[:5],
             "alerts": [
                 "ยังไม่ได้เชื่อมต่อ AI - แผนนี้เป็นแผนพื้นฐาน"
             ] if not budgets else [],
@@ -210,22 +260,29 @@ class AIPlannerService:
             "summary": f"รายรับ: ฿{income:,.0f} | รายจ่าย: ฿{expense:,.0f} | คงเหลือ: ฿{income-expense:,.0f}"
         }
     
-    def detect_recurring_expenses(self, user, transactions: list) -> list:
+    def detect_recurring_expenses(self, user, digest: dict) -> list:
         """
         Detect recurring expenses from transaction history
         
+        Args:
+            user: User object with API key
+            digest: Expense digest from PromptCompactor.build_digest()
+        
         Returns:
             List of recurring expenses with frequency and next expected date
         """
         api_key = self._get_user_api_key(user)
         model = self._get_user_model(user)
         
-        if not api_key or len(transactions) < 10:
-            return self._fallback_recurring(transactions)
+        if not api_key or digest.get('totals', {}).get('transaction_count', 0) < 10:
+            return self._fallback_recurring(digest)
         
-        # Prepare data - group by note/description
-        tx_notes = [{"note": tx.get('note', ''), "amount": tx.get('amount', 0), 
-                     "date": str(tx.get('date', ''))} for tx in transactions[:100]]
+        # Only the note statistics and candidates matter here
+        summary = {
+            "period": digest.get('period'),
+            "top_notes": digest.get('top_notes', []),
+            "recurring_candidates": digest.get('recurring_candidates', [])
+        }
         
         system_prompt = """วิเคราะห์รายการและระบุรายจ่ายประจำ (recurring expenses)
 
@@ -245,7 +302,9 @@ class AIPlannerService:
 
 ตอบเป็นภาษาไทยทั้งหมด"""
 
-        user_message = f"Find recurring patterns in these transactions:\n{json.dumps(tx_notes, ensure_ascii=False)}"
+        user_message = ("Find recurring patterns in these transaction statistics "
+                        "(per note: count, total, avg; candidates: steady amount and interval):\n"
+                        f"{PromptCompactor.to_prompt(summary)}")
         
         ai_response = self._call_ai(api_key, model, system_prompt, user_message)
         
@@ -259,30 +318,30 @@ class AIPlannerService:
             except:
                 pass
         
-        return self._fallback_recurring(transactions)
+        return self._fallback_recurring(digest)
     
-    def _fallback_recurring(self, transactions: list) -> list:
+    def _fallback_recurring(self, digest: dict) -> list:
         """Basic recurring detection without AI"""
         recurring = []
-        note_counts = {}
-        
-        for tx in transactions:
-            note = tx.get('note', '').lower().strip()
-            if len(note) > 3:
-                if note not in note_counts:
-                    note_counts[note] = {"count": 0, "amounts": [], "dates": []}
-                note_counts[note]["count"] += 1
-                note_counts[note]["amounts"].append(tx.get('amount', 0))
-                note_counts[note]["dates"].append(tx.get('date'))
-        
-        for note, data in note_counts.items():
-            if data["count"] >= 2:
-                avg_amount = sum(data["amounts"]) / len(data["amounts"])
+        
+        for candidate in digest.get('recurring_candidates', []):
+            recurring.append({
+                "name": candidate['note'],
+                "amount": int(candidate['amount']),
+                "frequency": candidate['frequency'],
+                "confidence": min(0.6 + (candidate['count'] * 0.1), 0.95),
+                "next_date": candidate['next_date']
+            })
+        
+        # Repeated notes without a steady interval/amount, as before
+        seen = {r['name'].lower() for r in recurring}
+        for note in digest.get('top_notes', []):
+            if note['count'] >= 2 and len(note['note']) > 3 and note['note'].lower() not in seen:
                 recurring.append({
-                    "name": note.title(),
-                    "amount": int(avg_amount),
+                    "name": note['note'].title(),
+                    "amount": int(note['avg']),
                     "frequency": "monthly",
-                    "confidence": min(0.5 + (data["count"] * 0.1), 0.95),
+                    "confidence": min(0.4 + (note['count'] * 0.1), 0.85),
                     "next_date": (date.today() + timedelta(days=30)).isoformat()
                 })
         
@@ -0,0 +1,69 @@
+"""
+AI Stream
+Server-Sent Events helpers for LLM-backed endpoints: the response starts
+with an immediate 'start' event, then relays model tokens as they arrive
+and ends with a 'done' event carrying the parsed result
+"""
+import json
+from datetime import datetime
+from flask import Response, request, stream_with_context
+
+
+def wants_stream():
+    """True when the client asked for SSE (?stream=1 or Accept: text/event-stream)"""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event, data):
+    """One SSE frame (data is JSON-encoded)"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(events):
+    """
+    Stream (event, data) pairs as text/event-stream
+
+    A 'start' frame is sent before the generator runs, so the client gets
+    its first byte before any database or model work. Errors raised by the
+    generator are reported as an 'error' frame.
+
+    Args:
+        events: Generator of (event, data) tuples (runs in the request context)
+    """
+    def body():
+        yield sse_event('start', {'at': datetime.utcnow().isoformat()})
+        try:
+            for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event('error', {'message': str(e)})
+
+    return Response(stream_with_context(body()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering (nginx)
+    })
+
+
+def chat_context(project_id):
+    """This month's income/expense/balance as context for the /ai chat (None on errors)"""
+    from app.services.aggregation_service import AggregationService
+    try:
+        today = datetime.now()
+        month_start = datetime(today.year, today.month, 1)
+        if today.month == 12:
+            month_end = datetime(today.year + 1, 1, 1)
+        else:
+            month_end = datetime(today.year, today.month + 1, 1)
+
+        totals = AggregationService.get_period_totals(project_id, month_start, month_end)
+        income_total = totals['income']
+        expense_total = totals['expense']
+
+        return f"""รายรับเดือนนี้: {income_total/100:,.0f} บาท
+รายจ่ายเดือนนี้: {expense_total/100:,.0f} บาท
+คงเหลือ: {(income_total-expense_total)/100:,.0f} บาท"""
+    except Exception:
+        return None
@@ -3,18 +3,23 @@ Analytics Service
 Provides analytics and reporting functionality for financial data
 """
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, desc, extract
+from sqlalchemy import func, and_, desc, extract, case
 from app import db
 from app.models.transaction import Transaction
 from app.models.category import Category
 from app.models.budget import Budget
-from app.utils.helpers import satang_to_baht, get_month_range
+from app.models.transaction_rollup import TransactionMonthlyRollup
+from app.services.rollup_service import RollupService
+from app.services.aggregation_service import AggregationService
+from app.services.single_flight import coalesced
+from app.utils.helpers import satang_to_baht
 
 
 class AnalyticsService:
     """Service for analytics and reporting"""
 
     @staticmethod
+    @coalesced('analytics')
     def get_monthly_summary(project_id, month_str):
         """
         Get income, expense, and balance summary for a specific month
@@ -44,63 +49,38 @@ class AnalyticsService:
                 }
             }
         """
-        # Parse month
-        year, month = map(int, month_str.split('-'))
-        start_date, end_date = get_month_range(year, month)
-        
-        # Debug logging
-        print(f"📊 Analytics query: month={month_str}, start_date={start_date}, end_date={end_date}, project_id={project_id}")
+        totals = RollupService.get_month_totals(project_id, month_str)
+        return AnalyticsService._format_monthly_summary(month_str, totals)
 
-        # Query income total
-        income_total = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'income',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
+    @staticmethod
+    @coalesced('analytics')
+    def get_monthly_summaries(project_id, month_strs):
+        """
+        Get monthly summaries for several months with a single rollup query
 
-        # Query income count
-        income_count = db.session.query(
-            func.count(Transaction.id)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'income',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
+        Args:
+            project_id: Project ID
+            month_strs: List of months in format "YYYY-MM"
 
-        # Query expense total
-        expense_total = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
+        Returns:
+            dict: {"YYYY-MM": <same shape as get_monthly_summary>}
+        """
+        totals = RollupService.get_months_totals(project_id, month_strs)
+        return {
+            month_str: AnalyticsService._format_monthly_summary(month_str, totals[month_str])
+            for month_str in month_strs
+        }
 
-        # Query expense count
-        expense_count = db.session.query(
-            func.count(Transaction.id)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
+    @staticmethod
+    def _format_monthly_summary(month_str, totals):
+        """Build the summary payload from rollup totals"""
+        income_total = totals['income']['total']
+        income_count = totals['income']['count']
+        expense_total = totals['expense']['total']
+        expense_count = totals['expense']['count']
 
         # Calculate balance
         balance = income_total - expense_total
-        
-        # Debug logging
-        print(f"📊 Results: income={income_count} transactions (total={income_total}), "
-              f"expense={expense_count} transactions (total={expense_total})")
 
         return {
             "summary": {
@@ -123,6 +103,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_category_breakdown(project_id, month_str, type='expense'):
         """
         Get breakdown by category with budget comparison
@@ -155,41 +136,32 @@ class AnalyticsService:
                 ]
             }
         """
-        # Parse month
-        year, month = map(int, month_str.split('-'))
-        start_date, end_date = get_month_range(year, month)
         month_yyyymm = month_str
 
-        # Query category breakdown with LEFT JOIN to Budget
+        # Read pre-aggregated category totals with LEFT JOIN to Budget
         results = db.session.query(
             Category.id,
             Category.name_th,
             Category.icon,
             Category.color,
-            func.sum(Transaction.amount).label('total'),
-            func.count(Transaction.id).label('count'),
+            TransactionMonthlyRollup.total_amount.label('total'),
+            TransactionMonthlyRollup.tx_count.label('count'),
             Budget.limit_amount
         ).join(
-            Transaction,
-            Transaction.category_id == Category.id
+            TransactionMonthlyRollup,
+            TransactionMonthlyRollup.category_id == Category.id
         ).outerjoin(
             Budget,
             and_(
+                Budget.project_id == project_id,
                 Budget.category_id == Category.id,
                 Budget.month_yyyymm == month_yyyymm
             )
         ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == type,
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at < end_date,
-            Transaction.deleted_at.is_(None)
-        ).group_by(
-            Category.id,
-            Category.name_th,
-            Category.icon,
-            Category.color,
-            Budget.limit_amount
+            TransactionMonthlyRollup.project_id == project_id,
+            TransactionMonthlyRollup.month_yyyymm == month_yyyymm,
+            TransactionMonthlyRollup.type == type,
+            TransactionMonthlyRollup.tx_count > 0
         ).order_by(
             desc('total')
         ).all()
@@ -227,6 +199,7 @@ class AnalyticsService:
         return {"categories": categories}
 
     @staticmethod
+    @coalesced('analytics')
     def get_trends(project_id, months=6):
         """
         Get income/expense trends for last N months
@@ -328,6 +301,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_daily_averages(project_id, start_date, end_date):
         """
         Get daily average spending/income for a date range
@@ -367,55 +341,32 @@ class AnalyticsService:
         # Calculate days in period
         days_in_period = (end_date - start_date).days + 1
 
-        # Query totals
-        income_total = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'income',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-
-        expense_total = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
+        # Income/expense totals and the weekday/weekend expense split in one scan
+        is_expense = Transaction.type == 'expense'
+        dow = extract('dow', Transaction.occurred_at)
+        totals = AggregationService.get_period_totals(
+            project_id, start_date, end_date, end_inclusive=True,
+            extra_columns=[
+                func.sum(case(
+                    (and_(is_expense, dow.in_([1, 2, 3, 4, 5])), Transaction.amount),  # Monday=1, Friday=5
+                    else_=0
+                )).label('weekday_expense'),
+                func.sum(case(
+                    (and_(is_expense, dow.in_([0, 6])), Transaction.amount),  # Sunday=0, Saturday=6
+                    else_=0
+                )).label('weekend_expense')
+            ]
+        )
+        income_total = totals['income']
+        expense_total = totals['expense']
+        weekday_expense = totals['weekday_expense']
+        weekend_expense = totals['weekend_expense']
 
         # Calculate daily averages
         income_avg = income_total / days_in_period if days_in_period > 0 else 0
         expense_avg = expense_total / days_in_period if days_in_period > 0 else 0
         net_avg = income_avg - expense_avg
 
-        # Query weekday vs weekend
-        weekday_expense = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            extract('dow', Transaction.occurred_at).in_([1, 2, 3, 4, 5]),  # Monday=1, Friday=5
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-
-        weekend_expense = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.project_id == project_id,
-            Transaction.type == 'expense',
-            Transaction.occurred_at >= start_date,
-            Transaction.occurred_at <= end_date,
-            extract('dow', Transaction.occurred_at).in_([0, 6]),  # Sunday=0, Saturday=6
-            Transaction.deleted_at.is_(None)
-        ).scalar() or 0
-
         # Calculate weekday/weekend averages (assuming 5 weekdays, 2 weekend days)
         weekday_avg = weekday_expense / 5 if days_in_period > 0 else 0
         weekend_avg = weekend_expense / 2 if days_in_period > 0 else 0
@@ -439,6 +390,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_spending_velocity(project_id, days=30):
         """
         Get spending velocity (rate of spending over time)
@@ -535,6 +487,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_savings_rate(project_id, months=6):
         """
         Get savings rate over a period
@@ -635,6 +588,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_financial_health_score(project_id, months=3):
         """
         Calculate financial health score based on multiple factors
@@ -782,6 +736,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_category_growth_rates(project_id, months=6):
         """
         Get category growth rates over time
@@ -893,6 +848,7 @@ class AnalyticsService:
         return {"categories": categories}
 
     @staticmethod
+    @coalesced('analytics')
     def get_seasonal_patterns(project_id, years=2):
         """
         Analyze seasonal spending patterns
@@ -1006,6 +962,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_heatmap_data(project_id, days=30):
         """
         Get spending heatmap data (day of week vs time of day)
@@ -1075,6 +1032,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_scatter_data(project_id, days=30):
         """
         Get scatter plot data (amount vs frequency)
@@ -1147,6 +1105,7 @@ class AnalyticsService:
         return {"scatter": scatter}
 
     @staticmethod
+    @coalesced('analytics')
     def compare_periods(project_id, period1_start, period1_end, period2_start, period2_end):
         """
         Compare two date ranges
@@ -1181,30 +1140,13 @@ class AnalyticsService:
             }
         """
         def get_period_totals(start_date, end_date):
-            income = db.session.query(
-                func.sum(Transaction.amount)
-            ).filter(
-                Transaction.project_id == project_id,
-                Transaction.type == 'income',
-                Transaction.occurred_at >= start_date,
-                Transaction.occurred_at <= end_date,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
-
-            expense = db.session.query(
-                func.sum(Transaction.amount)
-            ).filter(
-                Transaction.project_id == project_id,
-                Transaction.type == 'expense',
-                Transaction.occurred_at >= start_date,
-                Transaction.occurred_at <= end_date,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
-
+            totals = AggregationService.get_period_totals(
+                project_id, start_date, end_date, end_inclusive=True
+            )
             return {
-                "income": income,
-                "expense": expense,
-                "balance": income - expense
+                "income": totals["income"],
+                "expense": totals["expense"],
+                "balance": totals["balance"]
             }
 
         period1 = get_period_totals(period1_start, period1_end)
@@ -1233,6 +1175,7 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @coalesced('analytics')
     def get_amount_suggestions(project_id, category_id=None, type='expense'):
         """
         Get smart amount suggestions based on spending history
@@ -0,0 +1,248 @@
+"""
+Bot Context Resolver
+Maps a bot identity (Botpress or LINE user ID) to the user, current
+project and a snapshot of the project's categories, with a bounded TTL
+cache so chat messages skip the repeated user/category lookups
+"""
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy import or_
+from app import db
+
+CategorySnapshot = namedtuple('CategorySnapshot', 'id type name_th name_en is_active')
+
+
+class BotContext:
+    """Resolved identity: plain values only, safe to share across requests"""
+
+    __slots__ = ('user_id', 'line_user_id', 'botpress_user_id', 'display_name', 'project_id', 'categories')
+
+    def __init__(self, user_id, line_user_id, botpress_user_id, display_name, project_id, categories):
+        self.user_id = user_id
+        self.line_user_id = line_user_id
+        self.botpress_user_id = botpress_user_id
+        self.display_name = display_name
+        self.project_id = project_id
+        self.categories = categories
+
+    @property
+    def user(self):
+        """The User row (identity-map lookup; only for handlers that need the ORM object)"""
+        from app.models.user import User
+        return db.session.get(User, self.user_id)
+
+    def find_category(self, name_en=None, name_th=None, type=None):
+        """
+        First category matching name_en or name_th (and type, when given)
+
+        Without names, returns the first category of the given type.
+        """
+        for category in self.categories:
+            if type and category.type != type:
+                continue
+            if name_en is None and name_th is None:
+                return category
+            if (name_en is not None and category.name_en == name_en) or \
+                    (name_th is not None and category.name_th == name_th):
+                return category
+        return None
+
+
+class BotContextResolver:
+    """
+    Bounded LRU + TTL cache of bot identity -> BotContext
+
+    Entries are dropped when the user's identity or current project
+    changes, or when a category of the project is created, edited or
+    deleted (see register_context_listeners). Invalidation is per process; in a
+    multi-worker deployment other workers catch up within the TTL.
+    Unknown identities are never cached, so a fresh link works at once.
+    """
+
+    def __init__(self, max_entries=5000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = True
+        self._data = OrderedDict()  # identity -> (expires_at, BotContext)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.enabled = app.config.get('BOT_CONTEXT_CACHE_ENABLED', True)
+        self.max_entries = app.config.get('BOT_CONTEXT_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('BOT_CONTEXT_CACHE_TTL_SECONDS', self.ttl)
+        self.clear()
+        app.extensions['bot_context'] = self
+
+    def resolve(self, identity, prefer_line=False):
+        """
+        Resolve a Botpress or LINE user ID
+
+        Args:
+            identity: Botpress user ID or LINE user ID
+            prefer_line: When both columns match different users, take the
+                         LINE match (default: the Botpress match)
+
+        Returns:
+            BotContext, or None when no user has this identity
+        """
+        if not identity:
+            return None
+
+        if self.enabled:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._data.get(identity)
+                if entry is not None and entry[0] > now:
+                    self._data.move_to_end(identity)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+                generation = self._generation
+
+        context = self._load(identity, prefer_line)
+
+        if context is not None and self.enabled:
+            with self._lock:
+                # Skip the store if an invalidation ran while we were loading
+                if generation == self._generation:
+                    self._data[identity] = (time.monotonic() + self.ttl, context)
+                    self._data.move_to_end(identity)
+                    while len(self._data) > self.max_entries:
+                        self._data.popitem(last=False)
+        return context
+
+    @staticmethod
+    def _load(identity, prefer_line):
+        from app.models.user import User
+        from app.models.category import Category
+
+        # One query for both identity columns instead of lookup + fallback
+        users = User.query.filter(
+            or_(User.botpress_user_id == identity, User.line_user_id == identity)
+        ).limit(2).all()
+        if not users:
+            return None
+
+        def rank(user):
+            by_line = user.line_user_id == identity
+            return 0 if by_line == prefer_line else 1
+
+        user = min(users, key=rank)
+
+        categories = ()
+        if user.current_project_id:
+            categories = tuple(
+                CategorySnapshot(*row) for row in db.session.query(
+                    Category.id, Category.type, Category.name_th, Category.name_en, Category.is_active
+                ).filter(
+                    Category.project_id == user.current_project_id
+                ).order_by(Category.sort_order, Category.created_at)
+            )
+
+        return BotContext(
+            user_id=user.id,
+            line_user_id=user.line_user_id,
+            botpress_user_id=user.botpress_user_id,
+            display_name=user.display_name,
+            project_id=user.current_project_id,
+            categories=categories
+        )
+
+    def invalidate_users(self, user_ids):
+        """Drop every cached identity of these users"""
+        self._invalidate(lambda context: context.user_id in user_ids)
+
+    def invalidate_projects(self, project_ids):
+        """Drop every cached context whose current project is one of these"""
+        self._invalidate(lambda context: context.project_id in project_ids)
+
+    def _invalidate(self, predicate):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            doomed = [identity for identity, (_, context) in self._data.items() if predicate(context)]
+            for identity in doomed:
+                del self._data[identity]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+bot_context = BotContextResolver()
+
+
+USER_CONTEXT_FIELDS = ('line_user_id', 'botpress_user_id', 'current_project_id', 'display_name')
+
+
+def _collect_context_changes(session, flush_context):
+    from sqlalchemy import inspect as sa_inspect
+    from app.models.user import User
+    from app.models.category import Category
+
+    users = session.info.setdefault('bot_context_users', set())
+    projects = session.info.setdefault('bot_context_projects', set())
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = sa_inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in USER_CONTEXT_FIELDS):
+                users.add(obj.id)
+        elif isinstance(obj, Category):
+            projects.add(obj.project_id)
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, User):
+            users.add(obj.id)
+        elif isinstance(obj, Category):
+            projects.add(obj.project_id)
+
+
+def _invalidate_contexts(session):
+    users = session.info.pop('bot_context_users', None)
+    projects = session.info.pop('bot_context_projects', None)
+    if users:
+        bot_context.invalidate_users(users)
+    if projects:
+        bot_context.invalidate_projects(projects)
+
+
+def _discard_context_changes(session, previous_transaction):
+    session.info.pop('bot_context_users', None)
+    session.info.pop('bot_context_projects', None)
+
+
+def register_context_listeners(db):
+    """
+    Invalidate bot contexts after commits that change what they snapshot
+
+    Users whose line/botpress ID or current project changed (link, unlink,
+    project switch) and projects whose categories changed are collected
+    during flush and dropped once the transaction commits.
+    """
+    from sqlalchemy import event
+
+    if event.contains(db.session, 'after_flush', _collect_context_changes):
+        return
+    event.listen(db.session, 'after_flush', _collect_context_changes)
+    event.listen(db.session, 'after_commit', _invalidate_contexts)
+    event.listen(db.session, 'after_soft_rollback', _discard_context_changes)
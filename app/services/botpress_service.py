@@ -6,6 +6,7 @@ import hmac
 import hashlib
 from datetime import datetime
 from flask import current_app
+from app.services.http_client import http_client
 
 
 class BotpressService:
@@ -35,7 +36,7 @@ class BotpressService:
         }
 
         try:
-            response = requests.post(
+            response = http_client.post(
                 webhook_url,
                 json=payload,
                 timeout=10
@@ -103,11 +104,11 @@ class BotpressService:
 
         try:
             if method == 'POST':
-                response = requests.post(url, json=payload, headers=headers, timeout=10)
+                response = http_client.post(url, json=payload, headers=headers, timeout=10)
             elif method == 'GET':
-                response = requests.get(url, headers=headers, timeout=10)
+                response = http_client.get(url, headers=headers, timeout=10)
             else:
-                response = requests.request(method, url, json=payload, headers=headers, timeout=10)
+                response = http_client.request(method, url, json=payload, headers=headers, timeout=10)
 
             return response.json() if response.status_code < 400 else None
 
@@ -8,7 +8,7 @@ from app import db
 from app.models.budget import Budget
 from app.models.category import Category
 from app.models.transaction import Transaction
-from app.utils.helpers import generate_id, baht_to_satang, satang_to_baht
+from app.utils.helpers import generate_id, baht_to_satang, satang_to_baht, get_month_range
 
 
 class BudgetService:
@@ -73,31 +73,94 @@ class BudgetService:
         return budget
 
     @staticmethod
-    def get_budgets(project_id, month_yyyymm=None):
+    def get_budget_statuses(project_id, month_yyyymm=None):
         """
-        Get budgets for a project, optionally filtered by month
+        Compute spending status for every budget of a project in one query
+
+        Budgets are joined to their category and to the month's expense
+        transactions and grouped per budget, so the cost does not grow
+        with the number of budgets. Shared by budgets, insights alerts,
+        notifications and projections.
 
         Args:
             project_id: Project ID
             month_yyyymm: Optional month filter in "YYYY-MM"
 
         Returns:
-            List of budget dicts with spending information
+            List of dicts: budget (Budget), category (Category or None),
+            spent, remaining (satang) and usage (percent, unrounded)
         """
-        query = Budget.query.filter_by(project_id=project_id)
+        spending_filter = and_(
+            Transaction.project_id == Budget.project_id,
+            Transaction.category_id == Budget.category_id,
+            Transaction.type == 'expense',
+            Transaction.deleted_at.is_(None)
+        )
 
         if month_yyyymm:
-            query = query.filter_by(month_yyyymm=month_yyyymm)
+            # Sargable month range (uses the transaction category/date index)
+            year, month = map(int, month_yyyymm.split('-'))
+            start_date, end_date = get_month_range(year, month)
+            spending_filter = and_(
+                spending_filter,
+                Transaction.occurred_at >= start_date,
+                Transaction.occurred_at < end_date
+            )
+        else:
+            spending_filter = and_(
+                spending_filter,
+                func.strftime('%Y-%m', Transaction.occurred_at) == Budget.month_yyyymm
+            )
+
+        query = db.session.query(
+            Budget,
+            Category,
+            func.coalesce(func.sum(Transaction.amount), 0).label('spent')
+        ).outerjoin(
+            Category, Category.id == Budget.category_id
+        ).outerjoin(
+            Transaction, spending_filter
+        ).filter(
+            Budget.project_id == project_id
+        )
+
+        if month_yyyymm:
+            query = query.filter(Budget.month_yyyymm == month_yyyymm)
+
+        rows = query.group_by(Budget.id, Category.id).order_by(Budget.month_yyyymm, Budget.created_at).all()
+
+        statuses = []
+        for budget, category, spent in rows:
+            statuses.append({
+                'budget': budget,
+                'category': category,
+                'spent': spent,
+                'remaining': budget.limit_amount - spent,
+                'usage': (spent / budget.limit_amount) * 100 if budget.limit_amount > 0 else 0
+            })
+
+        return statuses
+
+    @staticmethod
+    def get_budgets(project_id, month_yyyymm=None):
+        """
+        Get budgets for a project, optionally filtered by month
 
-        budgets = query.all()
+        Args:
+            project_id: Project ID
+            month_yyyymm: Optional month filter in "YYYY-MM"
 
-        # Enrich with spending data
+        Returns:
+            List of budget dicts with spending information
+        """
         result = []
-        for budget in budgets:
+        for status in BudgetService.get_budget_statuses(project_id, month_yyyymm):
+            budget = status['budget']
+            category = status['category']
+            spent_total = status['spent']
+
             budget_dict = budget.to_dict()
 
-            # Get category info
-            category = Category.query.get(budget.category_id)
             if category:
                 budget_dict['category'] = {
                     'id': category.id,
@@ -107,39 +170,11 @@ class BudgetService:
                     'type': category.type
                 }
 
-            # Calculate spending for this month
-            year, month = map(int, budget.month_yyyymm.split('-'))
-            start_date = datetime(year, month, 1)
-
-            # Calculate end date (first day of next month)
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1)
-            else:
-                end_date = datetime(year, month + 1, 1)
-
-            # Get total spending in this category for this month
-            spent_total = db.session.query(
-                func.sum(Transaction.amount)
-            ).filter(
-                Transaction.project_id == project_id,
-                Transaction.category_id == budget.category_id,
-                Transaction.type == 'expense',
-                Transaction.occurred_at >= start_date,
-                Transaction.occurred_at < end_date,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
-
             budget_dict['spent'] = spent_total
             budget_dict['spent_formatted'] = satang_to_baht(spent_total)
-            budget_dict['remaining'] = budget.limit_amount - spent_total
-            budget_dict['remaining_formatted'] = satang_to_baht(budget.limit_amount - spent_total)
-
-            # Calculate percentage
-            if budget.limit_amount > 0:
-                usage_pct = (spent_total / budget.limit_amount) * 100
-                budget_dict['usage_percentage'] = round(usage_pct, 1)
-            else:
-                budget_dict['usage_percentage'] = 0
+            budget_dict['remaining'] = status['remaining']
+            budget_dict['remaining_formatted'] = satang_to_baht(status['remaining'])
+            budget_dict['usage_percentage'] = round(status['usage'], 1)
 
             # Status flags
             budget_dict['is_over_budget'] = spent_total > budget.limit_amount
@@ -0,0 +1,392 @@
+"""
+Cache Service
+In-process LRU + TTL cache for analytics results, with an optional shared
+tier (local files or a SQLite file) for multi-worker deployments
+"""
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Sentinel for "not cached" (None is a valid cached value)
+MISS = object()
+
+
+class LRUTTLCache:
+    """Bounded in-memory LRU cache with per-key TTL"""
+
+    def __init__(self, max_entries=2048, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return cached value or MISS"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value, evicting least recently used entries when full"""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every key matching predicate, returns number removed"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class SQLiteCacheTier:
+    """Shared cache tier stored in a standalone SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            " cache_key TEXT PRIMARY KEY, project_id TEXT, value TEXT, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entry_project ON cache_entry(project_id)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_generation ("
+            " project_id TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, cache_key, project_id=None):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache_entry WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if not row or row[1] <= time.time():
+            return MISS
+        return json.loads(row[0])
+
+    def set(self, cache_key, project_id, value, ttl):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache_entry (cache_key, project_id, value, expires_at) VALUES (?, ?, ?, ?)",
+            (cache_key, project_id, json.dumps(value), time.time() + ttl)
+        )
+
+    def generation(self, project_id):
+        row = self._conn().execute(
+            "SELECT generation FROM cache_generation WHERE project_id = ?", (project_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def invalidate_project(self, project_id):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entry WHERE project_id = ?", (project_id,))
+        conn.execute(
+            "INSERT INTO cache_generation (project_id, generation) VALUES (?, 1) "
+            "ON CONFLICT(project_id) DO UPDATE SET generation = generation + 1",
+            (project_id,)
+        )
+
+    def clear_expired(self):
+        cursor = self._conn().execute("DELETE FROM cache_entry WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+
+class FileCacheTier:
+    """Shared cache tier stored as JSON files, one directory per project"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _project_dir(self, project_id):
+        return os.path.join(self.directory, hashlib.sha1(str(project_id).encode()).hexdigest()[:16])
+
+    def _entry_path(self, cache_key, project_id):
+        name = hashlib.sha1(cache_key.encode('utf-8')).hexdigest() + '.json'
+        return os.path.join(self._project_dir(project_id), name)
+
+    def _generation_path(self, project_id):
+        return self._project_dir(project_id) + '.gen'
+
+    def get(self, cache_key, project_id=None):
+        try:
+            with open(self._entry_path(cache_key, project_id), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return MISS
+        if entry['expires_at'] <= time.time():
+            return MISS
+        return entry['value']
+
+    def set(self, cache_key, project_id, value, ttl):
+        path = self._entry_path(cache_key, project_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'expires_at': time.time() + ttl, 'value': value}, f)
+        os.replace(tmp_path, path)
+
+    def generation(self, project_id):
+        try:
+            with open(self._generation_path(project_id), 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def invalidate_project(self, project_id):
+        shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+        path = self._generation_path(project_id)
+        generation = self.generation(project_id) + 1
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(generation))
+        os.replace(tmp_path, path)
+
+    def clear_expired(self):
+        removed = 0
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        if json.load(f)['expires_at'] <= now:
+                            os.remove(path)
+                            removed += 1
+                except (OSError, ValueError, KeyError):
+                    continue
+        return removed
+
+
+class AnalyticsCacheService:
+    """
+    Project-scoped analytics cache
+
+    Entries live in a bounded in-process LRU. When a shared tier is
+    configured, values are also written there so other workers can reuse
+    them, and a per-project generation counter stored in the shared tier
+    makes invalidation visible to every worker's local LRU.
+    """
+
+    def __init__(self):
+        self.memory = LRUTTLCache()
+        self.shared = None
+        self.default_ttl = 300
+        self.enabled = True
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.invalidations = 0
+        self.shared_hits = 0
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.enabled = app.config.get('ANALYTICS_CACHE_ENABLED', True)
+        self.default_ttl = app.config.get('ANALYTICS_CACHE_TTL_SECONDS', 300)
+        self.memory = LRUTTLCache(
+            max_entries=app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', 2048),
+            default_ttl=self.default_ttl
+        )
+
+        backend = app.config.get('ANALYTICS_CACHE_SHARED_BACKEND', 'none')
+        path = app.config.get('ANALYTICS_CACHE_SHARED_PATH')
+        if backend == 'sqlite':
+            self.shared = SQLiteCacheTier(path or os.path.join(app.instance_path, 'analytics_cache.db'))
+        elif backend == 'file':
+            self.shared = FileCacheTier(path or os.path.join(app.instance_path, 'analytics_cache'))
+        else:
+            self.shared = None
+
+        app.extensions['analytics_cache'] = self
+
+    def _generation(self, project_id):
+        if self.shared is not None:
+            return self.shared.generation(project_id)
+        with self._lock:
+            return self._generations.get(project_id, 0)
+
+    def generation(self, project_id):
+        """Invalidation counter of a project (changes after every committed write)"""
+        return self._generation(project_id)
+
+    @staticmethod
+    def _key(project_id, key):
+        return f"{project_id}:{key}"
+
+    def get(self, project_id, key):
+        """Return cached value or MISS"""
+        if not self.enabled:
+            return MISS
+
+        cache_key = self._key(project_id, key)
+        generation = self._generation(project_id)
+
+        entry = self.memory.get(cache_key)
+        if entry is not MISS:
+            entry_generation, value = entry
+            if entry_generation == generation:
+                return value
+            self.memory.delete(cache_key)
+
+        if self.shared is not None:
+            value = self.shared.get(cache_key, project_id)
+            if value is not MISS:
+                self.shared_hits += 1
+                self.memory.set(cache_key, (generation, value))
+                return value
+
+        return MISS
+
+    def set(self, project_id, key, value, ttl=None, generation=None):
+        """Store a JSON-serializable value for a project"""
+        if not self.enabled:
+            return
+
+        ttl = self.default_ttl if ttl is None else ttl
+        current = self._generation(project_id)
+        if generation is not None and generation != current:
+            # Data changed while the value was being computed
+            return
+
+        cache_key = self._key(project_id, key)
+        self.memory.set(cache_key, (current, value), ttl)
+        if self.shared is not None:
+            self.shared.set(cache_key, project_id, value, ttl)
+
+    def get_or_compute(self, project_id, key, compute, ttl=None):
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(project_id, key)
+        if value is not MISS:
+            return value
+
+        # Concurrent misses on the same entry share one computation
+        from app.services.single_flight import single_flight
+        generation = self._generation(project_id)
+        value = single_flight.do('analytics', (self._key(project_id, key), generation), compute)
+        self.set(project_id, key, value, ttl, generation=generation)
+        return value
+
+    def invalidate_project(self, project_id):
+        """Drop every cached entry of a project (all tiers, all workers)"""
+        prefix = f"{project_id}:"
+        with self._lock:
+            self._generations[project_id] = self._generations.get(project_id, 0) + 1
+            self.invalidations += 1
+        self.memory.delete_where(lambda k: k.startswith(prefix))
+        if self.shared is not None:
+            self.shared.invalidate_project(project_id)
+
+    def clear(self):
+        self.memory.clear()
+
+    def clear_expired(self):
+        if self.shared is not None:
+            return self.shared.clear_expired()
+        return 0
+
+    def stats(self):
+        data = self.memory.stats()
+        data.update({
+            'enabled': self.enabled,
+            'default_ttl': self.default_ttl,
+            'shared_backend': type(self.shared).__name__ if self.shared is not None else None,
+            'shared_hits': self.shared_hits,
+            'invalidations': self.invalidations
+        })
+        return data
+
+
+analytics_cache = AnalyticsCacheService()
+
+
+def register_invalidation_listeners(db):
+    """
+    Invalidate project caches after commits that touch cached data
+
+    Project IDs are collected during flush and only invalidated once the
+    transaction commits, so readers never re-cache uncommitted state.
+    """
+    from sqlalchemy import event
+    from app.models.transaction import Transaction
+    from app.models.budget import Budget
+    from app.models.category import Category
+
+    tracked = (Transaction, Budget, Category)
+
+    def collect(session, flush_context):
+        projects = session.info.setdefault('cache_dirty_projects', set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, tracked) and obj.project_id:
+                projects.add(obj.project_id)
+
+    def invalidate(session):
+        for project_id in session.info.pop('cache_dirty_projects', set()):
+            analytics_cache.invalidate_project(project_id)
+
+    def discard(session):
+        session.info.pop('cache_dirty_projects', None)
+
+    if event.contains(db.session, 'after_flush', collect):
+        return
+    event.listen(db.session, 'after_flush', collect)
+    event.listen(db.session, 'after_commit', invalidate)
+    event.listen(db.session, 'after_soft_rollback', lambda session, previous_transaction: discard(session))
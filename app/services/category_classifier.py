@@ -0,0 +1,381 @@
+"""
+Category Classifier
+Per-project character n-gram naive Bayes over transaction notes, trained
+from Transaction history and updated online as transactions are committed,
+so category suggestions are answered locally and the LLM is only asked
+when the local model is unsure
+"""
+import math
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict, Counter, defaultdict
+from app import db
+
+_NOISE = re.compile(r'[\d.,:/฿]+|บาท')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_note(text):
+    """Normalize a note for feature extraction (NFC, casefold, no amounts, single spaces)"""
+    text = unicodedata.normalize('NFC', text or '').casefold()
+    return _SPACES.sub(' ', _NOISE.sub(' ', text)).strip()
+
+
+def note_features(text, min_n=2, max_n=3):
+    """
+    Character n-gram counts of a note
+
+    Thai is written without spaces, so character n-grams (padded with a
+    space at each end so word starts/ends get their own grams) work for both
+    Thai and English notes without a tokenizer.
+    """
+    key = normalize_note(text)
+    if not key:
+        return Counter()
+    padded = f' {key} '
+    grams = Counter()
+    for n in range(min_n, max_n + 1):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            if gram.strip():
+                grams[gram] += 1
+    return grams
+
+
+class NaiveBayesCategorizer:
+    """
+    Incremental multinomial naive Bayes: note -> category_id
+
+    learn()/forget() adjust counts in O(note length); predict() costs one
+    dict lookup per (n-gram, candidate category), i.e. tens of microseconds
+    for a short note.
+    """
+
+    def __init__(self, alpha=0.5, min_samples=20, min_confidence=0.6):
+        """
+        Args:
+            alpha: Additive smoothing
+            min_samples: Notes needed before predictions are trusted
+            min_confidence: Posterior above which callers may skip the LLM
+        """
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.min_confidence = min_confidence
+        self._docs = Counter()                  # category_id -> notes
+        self._totals = Counter()                # category_id -> n-gram count
+        self._grams = defaultdict(Counter)      # category_id -> n-gram -> count
+        self._vocabulary = Counter()            # n-gram -> categories using it
+        self._lock = threading.Lock()
+
+    @property
+    def samples(self):
+        return sum(self._docs.values())
+
+    @property
+    def ready(self):
+        return self.samples >= self.min_samples
+
+    def learn(self, note, category_id, weight=1):
+        """Add (weight > 0) or remove (weight < 0) one labelled note"""
+        features = note_features(note)
+        if not features or not category_id:
+            return False
+        with self._lock:
+            if weight < 0 and self._docs[category_id] <= 0:
+                return False
+            self._docs[category_id] += weight
+            grams = self._grams[category_id]
+            for gram, count in features.items():
+                before = grams[gram]
+                # Never go below zero (the note may predate the training window)
+                delta = max(weight * count, -before)
+                if not delta:
+                    continue
+                grams[gram] = before + delta
+                self._totals[category_id] += delta
+                if not before:
+                    self._vocabulary[gram] += 1
+                elif not grams[gram]:
+                    del grams[gram]
+                    self._vocabulary[gram] -= 1
+                    if self._vocabulary[gram] <= 0:
+                        del self._vocabulary[gram]
+            if self._docs[category_id] <= 0:
+                del self._docs[category_id]
+                del self._totals[category_id]
+                del self._grams[category_id]
+        return True
+
+    def forget(self, note, category_id):
+        """Remove a note learned earlier (edited or deleted transaction)"""
+        return self.learn(note, category_id, weight=-1)
+
+    def predict(self, note, ids=None):
+        """
+        Most likely category for a note
+
+        Args:
+            note: Transaction note
+            ids: Optional set of allowed category IDs
+
+        Returns:
+            tuple: (category_id, confidence) or (None, 0.0) when the model
+            has too few samples or knows none of the candidates; confidence
+            is the posterior times the share of the note's n-grams seen
+        """
+        features = note_features(note)
+        if not features:
+            return None, 0.0
+
+        with self._lock:
+            total_docs = sum(self._docs.values())
+            if total_docs < self.min_samples:
+                return None, 0.0
+            candidates = [c for c in self._docs if ids is None or c in ids]
+            if not candidates:
+                return None, 0.0
+            known = [(gram, count) for gram, count in features.items() if gram in self._vocabulary]
+            if not known:
+                return None, 0.0
+            # Share of the note the model has seen before: scales the posterior
+            # so unfamiliar notes fall through to the LLM
+            coverage = len(known) / len(features)
+            log, alpha = math.log, self.alpha
+            log_alpha = log(alpha)
+            vocabulary = len(self._vocabulary)
+            length = sum(count for _, count in known)
+            scores = {}
+            for category_id in candidates:
+                grams = self._grams[category_id]
+                score = log(self._docs[category_id] / total_docs) - \
+                    length * log(self._totals[category_id] + alpha * vocabulary)
+                for gram, count in known:
+                    seen = grams.get(gram)
+                    score += count * (log(seen + alpha) if seen else log_alpha)
+                scores[category_id] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        posterior = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, posterior * coverage
+
+    def stats(self):
+        with self._lock:
+            return {
+                'samples': sum(self._docs.values()),
+                'categories': len(self._docs),
+                'vocabulary': len(self._vocabulary)
+            }
+
+
+class CategoryClassifierRegistry:
+    """
+    Lazily trained NaiveBayesCategorizer per project (bounded LRU)
+
+    A project's model is trained from its most recent max_training_rows
+    noted transactions on first use, then kept current by the commit
+    listeners (see register_listeners). Rows written with Core inserts skip
+    the listeners; models are retrained after ttl seconds to pick those up.
+    """
+
+    def __init__(self, max_projects=200, ttl=3600, max_training_rows=5000,
+                 min_samples=20, min_confidence=0.6):
+        self.max_projects = max_projects
+        self.ttl = ttl
+        self.max_training_rows = max_training_rows
+        self.min_samples = min_samples
+        self.min_confidence = min_confidence
+        self.enabled = True
+        self._models = OrderedDict()  # project_id -> (expires_at, NaiveBayesCategorizer)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.trainings = 0
+        self.hits = 0
+        self.updates = 0
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.enabled = app.config.get('CATEGORY_CLASSIFIER_ENABLED', True)
+        self.max_projects = app.config.get('CATEGORY_CLASSIFIER_MAX_PROJECTS', self.max_projects)
+        self.ttl = app.config.get('CATEGORY_CLASSIFIER_TTL_SECONDS', self.ttl)
+        self.max_training_rows = app.config.get('CATEGORY_CLASSIFIER_MAX_TRAINING_ROWS', self.max_training_rows)
+        self.min_samples = app.config.get('CATEGORY_CLASSIFIER_MIN_SAMPLES', self.min_samples)
+        self.min_confidence = app.config.get('CATEGORY_CLASSIFIER_MIN_CONFIDENCE', self.min_confidence)
+        self.clear()
+        app.extensions['category_classifier'] = self
+
+    def get(self, project_id):
+        """The project's model, trained on first use (None when disabled)"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._models.get(project_id)
+            if entry is not None and entry[0] > now:
+                self._models.move_to_end(project_id)
+                self.hits += 1
+                return entry[1]
+            generation = self._generation
+
+        model = self._train(project_id)
+
+        with self._lock:
+            self.trainings += 1
+            # Skip the store if commits landed while training; the next call retrains
+            if generation == self._generation:
+                self._models[project_id] = (time.monotonic() + self.ttl, model)
+                self._models.move_to_end(project_id)
+                while len(self._models) > self.max_projects:
+                    self._models.popitem(last=False)
+        return model
+
+    def _train(self, project_id):
+        from app.models.transaction import Transaction
+        rows = db.session.query(
+            Transaction.note, Transaction.category_id
+        ).filter(
+            Transaction.project_id == project_id,
+            Transaction.deleted_at.is_(None),
+            Transaction.note.isnot(None)
+        ).order_by(
+            Transaction.occurred_at.desc()
+        ).limit(self.max_training_rows).all()
+
+        model = NaiveBayesCategorizer(min_samples=self.min_samples, min_confidence=self.min_confidence)
+        for note, category_id in rows:
+            model.learn(note, category_id)
+        return model
+
+    def predict(self, project_id, note, ids=None):
+        """(category_id, confidence) for a note (see NaiveBayesCategorizer.predict)"""
+        model = self.get(project_id)
+        if model is None:
+            return None, 0.0
+        return model.predict(note, ids)
+
+    def find_category(self, project_id, note, type=None):
+        """
+        Category row the model confidently predicts for a note
+
+        Args:
+            project_id: Project ID
+            note: Transaction note
+            type: Optional 'income'/'expense' restriction
+
+        Returns:
+            Category or None when the model is unsure
+        """
+        from app.models.category import Category
+        from app.services.category_index import category_index
+        model = self.get(project_id)
+        if model is None or not note:
+            return None
+        ids = {e.id for e in category_index.get(project_id).entries
+               if e.is_active and (type is None or e.type == type)}
+        category_id, confidence = model.predict(note, ids)
+        if category_id is None or confidence < model.min_confidence:
+            return None
+        return db.session.get(Category, category_id)
+
+    def apply(self, changes):
+        """
+        Apply committed label changes to the models already in memory
+
+        Args:
+            changes: Iterable of (project_id, note, category_id, weight)
+        """
+        with self._lock:
+            self._generation += 1
+            models = {pid: entry[1] for pid, entry in self._models.items()}
+        for project_id, note, category_id, weight in changes:
+            model = models.get(project_id)
+            if model is not None and model.learn(note, category_id, weight):
+                self.updates += 1
+
+    def invalidate_project(self, project_id):
+        with self._lock:
+            self._generation += 1
+            self._models.pop(project_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._models.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'projects': len(self._models),
+                'max_projects': self.max_projects,
+                'ttl': self.ttl,
+                'trainings': self.trainings,
+                'hits': self.hits,
+                'updates': self.updates
+            }
+
+
+category_classifier = CategoryClassifierRegistry()
+
+
+def _label(state, field):
+    """(old, new) value of an attribute in this flush"""
+    history = state.attrs[field].history
+    new = getattr(state.object, field)
+    old = history.deleted[0] if history.deleted else new
+    return old, new
+
+
+def _collect_label_changes(session, flush_context):
+    from sqlalchemy import inspect as sa_inspect
+    from app.models.transaction import Transaction
+
+    changes = session.info.setdefault('category_classifier_changes', [])
+    for obj in session.new:
+        if isinstance(obj, Transaction) and obj.note and obj.deleted_at is None:
+            changes.append((obj.project_id, obj.note, obj.category_id, 1))
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        state = sa_inspect(obj)
+        old_note, new_note = _label(state, 'note')
+        old_category, new_category = _label(state, 'category_id')
+        old_deleted, new_deleted = _label(state, 'deleted_at')
+        if (old_note, old_category, old_deleted is None) == (new_note, new_category, new_deleted is None):
+            continue
+        if old_note and old_deleted is None:
+            changes.append((obj.project_id, old_note, old_category, -1))
+        if new_note and new_deleted is None:
+            changes.append((obj.project_id, new_note, new_category, 1))
+    for obj in session.deleted:
+        if isinstance(obj, Transaction) and obj.note and obj.deleted_at is None:
+            changes.append((obj.project_id, obj.note, obj.category_id, -1))
+
+
+def _apply_label_changes(session):
+    changes = session.info.pop('category_classifier_changes', None)
+    if changes:
+        category_classifier.apply(changes)
+
+
+def _discard_label_changes(session, previous_transaction):
+    session.info.pop('category_classifier_changes', None)
+
+
+def register_listeners(db):
+    """
+    Keep in-memory models current with committed transactions
+
+    New noted transactions are learned, edits forget the old (note,
+    category) and learn the new one, and (soft) deletes are forgotten,
+    once the transaction commits.
+    """
+    from sqlalchemy import event
+
+    if event.contains(db.session, 'after_flush', _collect_label_changes):
+        return
+    event.listen(db.session, 'after_flush', _collect_label_changes)
+    event.listen(db.session, 'after_commit', _apply_label_changes)
+    event.listen(db.session, 'after_soft_rollback', _discard_label_changes)
@@ -0,0 +1,425 @@
+"""
+Category Index
+Per-project in-memory index for resolving chat category names: normalized
+Thai/English names, built-in aliases, prefix and trigram substring lookup,
+and synonyms learned from past transaction notes
+"""
+import re
+import time
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple, defaultdict
+from app import db
+from app.utils.keyword_matcher import KeywordAutomaton
+
+# Alias keywords per category group (group name = usual category name_th)
+CATEGORY_ALIASES = {
+    'อาหาร': ['กิน', 'ข้าว', 'อาหาร', 'กาแฟ', 'ชา', 'เครื่องดื่ม', 'ร้านอาหาร', 'อร่อย', 'มื้อ', 'breakfast', 'lunch', 'dinner', 'food', 'กินข้าว'],
+    'เดินทาง': ['รถ', 'taxi', 'grab', 'น้ำมัน', 'เดินทาง', 'ค่าเดินทาง', 'bts', 'mrt', 'ตั๋ว', 'ค่าทางด่วน', 'transport'],
+    'ช้อปปิ้ง': ['ซื้อ', 'ช้อป', 'shopping', 'lazada', 'shopee', 'เสื้อผ้า', 'รองเท้า'],
+    'ความบันเทิง': ['หนัง', 'netflix', 'spotify', 'game', 'เกม', 'ดูหนัง', 'คอนเสิร์ต', 'บันเทิง', 'entertainment'],
+    'สุขภาพ': ['หมอ', 'ยา', 'โรงพยาบาล', 'คลินิก', 'ฟิตเนส', 'gym', 'สุขภาพ', 'health'],
+    'ค่าใช้จ่าย': ['ค่าเช่า', 'ค่าน้ำ', 'ค่าไฟ', 'อินเทอร์เน็ต', 'โทรศัพท์', 'ค่าบ้าน', 'บิล', 'bills'],
+    'ค่าสาธารณูปโภค': ['ค่าน้ำ', 'ค่าไฟ', 'อินเทอร์เน็ต', 'บิล', 'bills', 'utilities'],
+    'การศึกษา': ['เรียน', 'คอร์ส', 'หนังสือ', 'udemy', 'course'],
+    'สังคม': ['งานแต่ง', 'บวช', 'ซอง', 'ของขวัญ', 'gift'],
+    'เงินเดือน': ['เงินเดือน', 'salary', 'bonus', 'โบนัส'],
+    'รายได้เสริม': ['freelance', 'ขาย', 'รายได้', 'ปันผล', 'other']
+}
+
+# Thai "cost of" prefix: "ค่าเดินทาง" and "เดินทาง" name the same thing
+_COST_PREFIX = 'ค่า'
+_SPACES = re.compile(r'\s+')
+
+CategoryEntry = namedtuple('CategoryEntry', 'id type name_th name_en icon is_active sort_order')
+
+
+def normalize_name(text):
+    """Normalize a category name or query (NFC, casefold, no whitespace)"""
+    text = unicodedata.normalize('NFC', text or '').casefold()
+    return _SPACES.sub('', text)
+
+
+def _name_keys(name):
+    key = normalize_name(name)
+    if not key:
+        return []
+    keys = [key]
+    if key.startswith(_COST_PREFIX) and len(key) > len(_COST_PREFIX) + 1:
+        keys.append(key[len(_COST_PREFIX):])
+    return keys
+
+
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class CategoryIndex:
+    """
+    Immutable lookup structure over one project's categories
+
+    lookup() tries, in order: exact name, alias, learned synonym, name
+    prefix, name substring (trigram candidates), then alias keywords
+    contained in the query. Ties go to active categories, then sort_order.
+    """
+
+    def __init__(self, categories, synonyms=None):
+        """
+        Args:
+            categories: Iterable of Category objects or dicts
+                (id, type, name_th, name_en, icon, is_active, sort_order)
+            synonyms: Optional {note: category_id} learned from history
+        """
+        entries = []
+        for i, c in enumerate(categories):
+            get = c.get if isinstance(c, dict) else (lambda field, default=None, c=c: getattr(c, field, default))
+            entries.append(CategoryEntry(
+                id=get('id'),
+                type=get('type'),
+                name_th=get('name_th') or get('name') or '',
+                name_en=get('name_en'),
+                icon=get('icon'),
+                is_active=get('is_active', True) is not False,
+                sort_order=get('sort_order') if get('sort_order') is not None else i
+            ))
+        entries.sort(key=lambda e: (not e.is_active, e.sort_order))
+        self.entries = entries
+        self._by_id = {e.id: e for e in entries}
+
+        # Names (Thai and English, with and without the ค่า prefix)
+        self._names = defaultdict(list)
+        for entry in entries:
+            for name in (entry.name_th, entry.name_en):
+                for key in _name_keys(name):
+                    if entry not in self._names[key]:
+                        self._names[key].append(entry)
+        self._sorted_names = sorted(self._names)
+        self._trigram_index = defaultdict(set)
+        for key in self._names:
+            for gram in _trigrams(key):
+                self._trigram_index[gram].add(key)
+
+        # Built-in aliases bound to the categories whose name matches the group
+        self._aliases = defaultdict(list)
+        for group, aliases in CATEGORY_ALIASES.items():
+            group_key = normalize_name(group)
+            targets = [
+                e for e in entries
+                if any(group_key == key or group_key in key or (len(key) > 2 and key in group_key)
+                       for key in _name_keys(e.name_th))
+            ]
+            for alias in aliases:
+                alias_key = normalize_name(alias)
+                for entry in targets:
+                    if entry not in self._aliases[alias_key]:
+                        self._aliases[alias_key].append(entry)
+
+        # Learned synonyms (note -> category), only for categories that still exist
+        self._synonyms = {}
+        for note, category_id in (synonyms or {}).items():
+            key = normalize_name(note)
+            if key and category_id in self._by_id:
+                self._synonyms[key] = self._by_id[category_id]
+
+        self._name_matcher = KeywordAutomaton((key, key) for key in self._names if len(key) > 1)
+        self._alias_matcher = KeywordAutomaton((key, key) for key in self._aliases)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, category_id):
+        return self._by_id.get(category_id)
+
+    @staticmethod
+    def _pick(candidates, type=None, ids=None):
+        for entry in candidates:
+            if (type is None or entry.type == type) and (ids is None or entry.id in ids):
+                return entry
+        return None
+
+    def _substring_keys(self, key):
+        """Name keys containing key (same result as LIKE '%key%' on the names)"""
+        if len(key) < 3:
+            return [k for k in self._sorted_names if key in k]
+        grams = iter(sorted(_trigrams(key), key=lambda g: len(self._trigram_index.get(g, ()))))
+        candidates = set(self._trigram_index.get(next(grams), ()))
+        for gram in grams:
+            if not candidates:
+                break
+            candidates &= self._trigram_index.get(gram, set())
+        return sorted(k for k in candidates if key in k)
+
+    def lookup(self, name, type=None, aliases=True):
+        """
+        Resolve a user-typed category name
+
+        Args:
+            name: Category name as typed (Thai or English)
+            type: Optional 'income'/'expense' restriction
+            aliases: Also use built-in aliases and learned synonyms
+                (turn off for edits/deletes, which must name the category)
+
+        Returns:
+            CategoryEntry or None
+        """
+        keys = _name_keys(name)
+        if not keys:
+            return None
+
+        for key in keys:
+            entry = self._pick(self._names.get(key, ()), type)
+            if entry:
+                return entry
+
+        if aliases:
+            for key in keys:
+                entry = self._pick(self._aliases.get(key, ()), type) or \
+                    self._pick([self._synonyms[key]] if key in self._synonyms else (), type)
+                if entry:
+                    return entry
+
+        for key in keys:
+            start = bisect.bisect_left(self._sorted_names, key)
+            prefixed = []
+            for k in self._sorted_names[start:]:
+                if not k.startswith(key):
+                    break
+                prefixed.extend(self._names[k])
+            entry = self._pick(sorted(prefixed, key=self.entries.index), type)
+            if entry:
+                return entry
+
+        for key in keys:
+            contained = [e for k in self._substring_keys(key) for e in self._names[k]]
+            entry = self._pick(sorted(contained, key=self.entries.index), type)
+            if entry:
+                return entry
+
+        if aliases:
+            matched = self._alias_matcher.find_all(keys[0])
+            candidates = [e for k in sorted(matched, key=len, reverse=True) for e in self._aliases[k]]
+            return self._pick(candidates, type)
+        return None
+
+    def default_for_type(self, type):
+        """First category of a type (active first, by sort_order)"""
+        return self._pick(self.entries, type)
+
+    def match_text(self, text, type=None, ids=None):
+        """
+        Best category for free text such as a transaction note
+
+        Scores: a category name inside the text 0.9, the whole text is a
+        learned synonym 0.85, an alias keyword inside the text 0.7.
+
+        Args:
+            text: Free text
+            type: Optional type restriction
+            ids: Optional set of allowed category IDs
+
+        Returns:
+            tuple: (CategoryEntry, score, source) or (None, 0, None)
+        """
+        key = normalize_name(text)
+        if not key:
+            return None, 0, None
+
+        names = self._name_matcher.find_all(key)
+        entry = self._pick(
+            sorted((e for k in names for e in self._names[k]), key=self.entries.index), type, ids
+        )
+        if entry:
+            return entry, 0.9, 'name'
+
+        if key in self._synonyms:
+            entry = self._pick([self._synonyms[key]], type, ids)
+            if entry:
+                return entry, 0.85, 'learned'
+
+        matched = self._alias_matcher.find_all(key)
+        entry = self._pick(
+            sorted((e for k in matched for e in self._aliases[k]), key=self.entries.index), type, ids
+        )
+        if entry:
+            return entry, 0.7, 'alias'
+        return None, 0, None
+
+
+class CategoryIndexRegistry:
+    """
+    Lazily built CategoryIndex per project (bounded LRU)
+
+    Indexes are dropped when a category of the project changes (see
+    register_listeners) and rebuilt after ttl seconds so synonyms learned
+    from new transactions are picked up.
+    """
+
+    def __init__(self, max_projects=500, ttl=600, synonym_min_count=2, synonym_limit=2000):
+        self.max_projects = max_projects
+        self.ttl = ttl
+        self.synonym_min_count = synonym_min_count
+        self.synonym_limit = synonym_limit
+        self._indexes = OrderedDict()  # project_id -> (expires_at, CategoryIndex)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.builds = 0
+        self.hits = 0
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.max_projects = app.config.get('CATEGORY_INDEX_MAX_PROJECTS', self.max_projects)
+        self.ttl = app.config.get('CATEGORY_INDEX_TTL_SECONDS', self.ttl)
+        self.synonym_min_count = app.config.get('CATEGORY_SYNONYM_MIN_COUNT', self.synonym_min_count)
+        self.clear()
+        app.extensions['category_index'] = self
+
+    def get(self, project_id):
+        """The project's CategoryIndex, built on first use"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._indexes.get(project_id)
+            if entry is not None and entry[0] > now:
+                self._indexes.move_to_end(project_id)
+                self.hits += 1
+                return entry[1]
+            generation = self._generation
+
+        index = self._build(project_id)
+
+        with self._lock:
+            self.builds += 1
+            if generation == self._generation:
+                self._indexes[project_id] = (time.monotonic() + self.ttl, index)
+                self._indexes.move_to_end(project_id)
+                while len(self._indexes) > self.max_projects:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def _build(self, project_id):
+        from app.models.category import Category
+        categories = db.session.query(
+            Category.id, Category.type, Category.name_th, Category.name_en,
+            Category.icon, Category.is_active, Category.sort_order
+        ).filter(Category.project_id == project_id).all()
+        return CategoryIndex(
+            [row._asdict() for row in categories],
+            self.learned_synonyms(project_id)
+        )
+
+    def learned_synonyms(self, project_id):
+        """
+        {note: category_id} for notes the user keeps filing under one category
+
+        A note counts when it was used at least synonym_min_count times and
+        at least 60% of those uses went to the same category.
+        """
+        from app.models.transaction import Transaction
+        count = db.func.count(Transaction.id)
+        rows = db.session.query(
+            Transaction.note, Transaction.category_id, count
+        ).filter(
+            Transaction.project_id == project_id,
+            Transaction.deleted_at.is_(None),
+            Transaction.note.isnot(None)
+        ).group_by(
+            Transaction.note, Transaction.category_id
+        ).having(
+            count >= self.synonym_min_count
+        ).order_by(count.desc()).limit(self.synonym_limit).all()
+
+        per_note = defaultdict(dict)
+        for note, category_id, uses in rows:
+            key = normalize_name(note)
+            if key:
+                per_note[key][category_id] = per_note[key].get(category_id, 0) + uses
+
+        synonyms = {}
+        for key, counts in per_note.items():
+            category_id, uses = max(counts.items(), key=lambda item: item[1])
+            if uses / sum(counts.values()) >= 0.6:
+                synonyms[key] = category_id
+        return synonyms
+
+    def lookup(self, project_id, name, type=None, aliases=True):
+        """Resolve a category name to a CategoryEntry (see CategoryIndex.lookup)"""
+        if not name:
+            return None
+        return self.get(project_id).lookup(name, type, aliases)
+
+    def find_category(self, project_id, name, type=None, aliases=True, fallback=False):
+        """
+        Resolve a category name to the Category row
+
+        Args:
+            project_id: Project ID
+            name: Category name as typed
+            type: Optional 'income'/'expense' restriction
+            aliases: Use aliases and learned synonyms
+            fallback: When nothing matches, return the first category of type
+
+        Returns:
+            Category or None
+        """
+        from app.models.category import Category
+        index = self.get(project_id)
+        entry = index.lookup(name, type, aliases) if name else None
+        if entry is None and fallback and type:
+            entry = index.default_for_type(type)
+        return db.session.get(Category, entry.id) if entry else None
+
+    def invalidate_projects(self, project_ids):
+        with self._lock:
+            self._generation += 1
+            for project_id in project_ids:
+                self._indexes.pop(project_id, None)
+
+    def invalidate_project(self, project_id):
+        self.invalidate_projects((project_id,))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._indexes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'projects': len(self._indexes),
+                'max_projects': self.max_projects,
+                'ttl': self.ttl,
+                'builds': self.builds,
+                'hits': self.hits
+            }
+
+
+category_index = CategoryIndexRegistry()
+
+
+def _collect_category_changes(session, flush_context):
+    from app.models.category import Category
+    projects = session.info.setdefault('category_index_projects', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Category) and obj.project_id:
+            projects.add(obj.project_id)
+
+
+def _invalidate_indexes(session):
+    projects = session.info.pop('category_index_projects', None)
+    if projects:
+        category_index.invalidate_projects(projects)
+
+
+def _discard_category_changes(session, previous_transaction):
+    session.info.pop('category_index_projects', None)
+
+
+def register_listeners(db):
+    """Drop a project's index after commits that create, edit or delete its categories"""
+    from sqlalchemy import event
+
+    if event.contains(db.session, 'after_flush', _collect_category_changes):
+        return
+    event.listen(db.session, 'after_flush', _collect_category_changes)
+    event.listen(db.session, 'after_commit', _invalidate_indexes)
+    event.listen(db.session, 'after_soft_rollback', _discard_category_changes)
@@ -1,6 +1,7 @@
 """
 Category service - Business logic for categories
 """
+from flask import g, has_app_context
 from app import db
 from app.models.category import Category
 from app.models.transaction import Transaction
@@ -149,6 +150,29 @@ class CategoryService:
 
         return result
 
+    @staticmethod
+    def get_category_map(project_id):
+        """
+        All categories of a project keyed by ID, loaded once per request
+
+        Listing code resolves names through this map instead of one
+        Category.query.get() per row. The map lives on flask.g, so it never
+        outlives the request that loaded it.
+
+        Args:
+            project_id: Project ID
+
+        Returns:
+            dict: {category_id: Category}
+        """
+        maps = g.setdefault('category_maps', {}) if has_app_context() else {}
+        category_map = maps.get(project_id)
+        if category_map is None:
+            category_map = maps[project_id] = {
+                c.id: c for c in Category.query.filter_by(project_id=project_id).all()
+            }
+        return category_map
+
     @staticmethod
     def _check_project_access(project_id, user_id):
         """
@@ -0,0 +1,139 @@
+"""
+Data Version
+Per-project monotonically increasing data version, bumped inside the same
+DB transaction as every transaction/budget/goal/category/recurring-rule
+write, and a memo for AI outputs keyed on (project, data version, prompt
+version)
+"""
+import json
+from sqlalchemy import update
+from app import db
+from app.services.cache_service import LRUTTLCache, MISS
+
+
+def bump_data_versions(connection, project_ids):
+    """
+    Increment data_version of these projects on the given connection
+
+    Runs inside the caller's transaction, so the new version becomes
+    visible together with the data that caused it. Core writers (bulk
+    import, recurring scheduler) call this directly; ORM writes are
+    covered by register_listeners.
+    """
+    from app.models.project import Project
+    project_ids = [pid for pid in set(project_ids) if pid]
+    if not project_ids:
+        return
+    table = Project.__table__
+    connection.execute(
+        update(table).where(table.c.id.in_(project_ids)).values(
+            data_version=table.c.data_version + 1,
+            updated_at=table.c.updated_at  # Keep the project's own timestamp (skips onupdate)
+        )
+    )
+
+
+def get_data_version(project_id):
+    """Current data version of a project (0 for unknown projects)"""
+    from app.models.project import Project
+    return db.session.query(Project.data_version).filter(Project.id == project_id).scalar() or 0
+
+
+class AIMemo:
+    """
+    Memo of AI/insight outputs keyed on (project, data version, prompt version)
+
+    An entry is only ever reused for the exact data it was computed from:
+    any write bumps the project's version, so stale entries are never hit
+    and simply age out of the LRU. Versions live in the database, so every
+    worker agrees on them.
+    """
+
+    def __init__(self, max_entries=2048, ttl=86400):
+        self.cache = LRUTTLCache(max_entries=max_entries, default_ttl=ttl)
+        self.enabled = True
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.enabled = app.config.get('AI_MEMO_ENABLED', True)
+        self.cache = LRUTTLCache(
+            max_entries=app.config.get('AI_MEMO_MAX_ENTRIES', 2048),
+            default_ttl=app.config.get('AI_MEMO_TTL_SECONDS', 86400)
+        )
+        app.extensions['ai_memo'] = self
+
+    @staticmethod
+    def key(project_id, version, name, prompt_version, params=None):
+        return (project_id, version, name, prompt_version,
+                json.dumps(params or {}, sort_keys=True, default=str))
+
+    def get_or_compute(self, project_id, name, prompt_version, compute, params=None, cache_if=None):
+        """
+        Return the memoized output, computing it on a miss
+
+        Args:
+            project_id: Project ID
+            name: Output name (e.g. 'financial_insights')
+            prompt_version: Version of the prompt/post-processing producing it
+            compute: Callable producing the output (aggregates + LLM call)
+            params: Extra JSON-serializable inputs (month, days, ...)
+            cache_if: Optional predicate; outputs failing it are not stored
+                      (e.g. a rule-based fallback after an LLM error)
+
+        Returns:
+            The output of compute (fresh or memoized)
+        """
+        if not self.enabled:
+            return compute()
+
+        key = self.key(project_id, get_data_version(project_id), name, prompt_version, params)
+        value = self.cache.get(key)
+        if value is not MISS:
+            return value
+
+        value = compute()
+        if cache_if is None or cache_if(value):
+            self.cache.set(key, value)
+        return value
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        data = self.cache.stats()
+        data['enabled'] = self.enabled
+        return data
+
+
+ai_memo = AIMemo()
+
+
+def _versioned_models():
+    from app.models.transaction import Transaction
+    from app.models.budget import Budget
+    from app.models.savings_goal import SavingsGoal
+    from app.models.category import Category
+    from app.models.recurring import RecurringRule
+    return Transaction, Budget, SavingsGoal, Category, RecurringRule
+
+
+def _bump_on_flush(session, flush_context):
+    models = _versioned_models()
+    projects = set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, models):
+            projects.add(obj.project_id)
+    for obj in session.dirty:
+        if isinstance(obj, models) and session.is_modified(obj, include_collections=False):
+            projects.add(obj.project_id)
+    if projects:
+        bump_data_versions(session.connection(), projects)
+
+
+def register_listeners(db):
+    """Bump the project data version in every flush that writes versioned rows"""
+    from sqlalchemy import event
+
+    if event.contains(db.session, 'after_flush', _bump_on_flush):
+        return
+    event.listen(db.session, 'after_flush', _bump_on_flush)
@@ -4,129 +4,172 @@ Export Service - Export user data to CSV/JSON
 import csv
 import json
 import io
+import zlib
 from datetime import datetime
-from flask import Response
+from dateutil.relativedelta import relativedelta
+from flask import Response, request, stream_with_context
+from sqlalchemy.orm import joinedload
+from app import db
 from app.models.transaction import Transaction
 from app.models.category import Category
 from app.models.budget import Budget
 from app.models.recurring import RecurringRule
 from app.models.project import Project
-from sqlalchemy import func
+from app.services.aggregation_service import AggregationService
+
+
+# Rows fetched per round trip while streaming an export
+EXPORT_BATCH_SIZE = 1000
+
+CSV_HEADER = [
+    'วันที่เวลา',
+    'ประเภท',
+    'หมวดหมู่',
+    'รายละเอียด',
+    'จำนวนเงิน (บาท)',
+    'ID'
+]
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of str/bytes chunks into a gzip stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 
 class ExportService:
     """Service for exporting user data"""
 
     @staticmethod
-    def export_to_csv(project_id, month_yyyymm=None):
-        """Export transactions to CSV format"""
-        # Get all transactions for project
-        query = Transaction.query.filter_by(project_id=project_id)
-        
+    def _month_range(month_yyyymm):
+        start_date = datetime.strptime(f"{month_yyyymm}-01", '%Y-%m-%d')
+        return start_date, start_date + relativedelta(months=1)
+
+    @staticmethod
+    def _transaction_filters(project_id, month_yyyymm=None):
+        filters = [Transaction.project_id == project_id]
         if month_yyyymm:
-            # Filter by month
-            start_date = datetime.strptime(f"{month_yyyymm}-01", '%Y-%m-%d')
-            if month_yyyymm.endswith('12'):
-                end_date = datetime.strptime(f"{int(month_yyyymm[:4]) + 1}-01-01", '%Y-%m-%d')
-            else:
-                end_date = datetime.strptime(f"{month_yyyymm[:4]}-{int(month_yyyymm[5:]) + 1:02d}-01", '%Y-%m-%d')
-            query = query.filter(Transaction.occurred_at >= start_date, Transaction.occurred_at < end_date)
-        
-        transactions = query.order_by(Transaction.occurred_at.desc()).all()
-        
-        # Create CSV
+            start_date, end_date = ExportService._month_range(month_yyyymm)
+            filters += [Transaction.occurred_at >= start_date, Transaction.occurred_at < end_date]
+        return filters
+
+    @staticmethod
+    def iter_transaction_rows(project_id, month_yyyymm=None, batch_size=EXPORT_BATCH_SIZE, extra_filters=None):
+        """
+        Stream transaction rows with their category name, newest first
+
+        Selects only the exported columns with one outer join to category
+        and fetches them in batches (yield_per), so memory stays flat
+        however many years of data the project holds.
+
+        Args:
+            project_id: Project ID
+            month_yyyymm: Optional month filter
+            batch_size: Rows fetched per batch
+            extra_filters: Optional extra filter expressions on Transaction
+
+        Yields:
+            Row with id, type, occurred_at, category_id, category_name, amount, note, created_at
+        """
+        query = db.session.query(
+            Transaction.id,
+            Transaction.type,
+            Transaction.occurred_at,
+            Transaction.category_id,
+            Category.name_th.label('category_name'),
+            Transaction.amount,
+            Transaction.note,
+            Transaction.created_at
+        ).outerjoin(
+            Category, Category.id == Transaction.category_id
+        ).filter(
+            *ExportService._transaction_filters(project_id, month_yyyymm),
+            *(extra_filters or [])
+        ).order_by(Transaction.occurred_at.desc())
+
+        return query.yield_per(batch_size)
+
+    @staticmethod
+    def iter_csv(project_id, month_yyyymm=None, batch_size=EXPORT_BATCH_SIZE):
+        """Generate the transactions CSV in chunks of about batch_size rows"""
         output = io.StringIO()
         writer = csv.writer(output)
-        
-        # Header
-        writer.writerow([
-            'วันที่เวลา',
-            'ประเภท',
-            'หมวดหมู่',
-            'รายละเอียด',
-            'จำนวนเงิน (บาท)',
-            'ID'
-        ])
-        
-        # Data rows
-        for tx in transactions:
-            category = tx.category
+        writer.writerow(CSV_HEADER)
+
+        for i, tx in enumerate(ExportService.iter_transaction_rows(project_id, month_yyyymm, batch_size), 1):
             writer.writerow([
                 tx.occurred_at.strftime('%Y-%m-%d %H:%M:%S') if tx.occurred_at else '',
                 'รายรับ' if tx.type == 'income' else 'รายจ่าย',
-                category.name_th if category else 'ไม่ระบุ',
+                tx.category_name or 'ไม่ระบุ',
                 tx.note or '',
                 f"{tx.amount / 100:.2f}",
                 tx.id
             ])
-        
-        output.seek(0)
-        return output.getvalue()
+            if i % batch_size == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+
+        yield output.getvalue()
 
     @staticmethod
-    def export_to_json(project_id, month_yyyymm=None):
-        """Export all project data to JSON format"""
-        # Get project
-        project = Project.query.get(project_id)
-        if not project:
-            return None
-        
-        # Get transactions
-        query = Transaction.query.filter_by(project_id=project_id)
-        if month_yyyymm:
-            start_date = datetime.strptime(f"{month_yyyymm}-01", '%Y-%m-%d')
-            if month_yyyymm.endswith('12'):
-                end_date = datetime.strptime(f"{int(month_yyyymm[:4]) + 1}-01-01", '%Y-%m-%d')
-            else:
-                end_date = datetime.strptime(f"{month_yyyymm[:4]}-{int(month_yyyymm[5:]) + 1:02d}-01", '%Y-%m-%d')
-            query = query.filter(Transaction.occurred_at >= start_date, Transaction.occurred_at < end_date)
-        
-        transactions = query.order_by(Transaction.occurred_at.desc()).all()
-        
-        # Get categories
-        categories = Category.query.filter_by(project_id=project_id).order_by(Category.sort_order).all()
-        
-        # Get budgets
-        budgets = Budget.query.filter_by(project_id=project_id).all()
-        
-        # Get recurring rules
-        recurring_rules = RecurringRule.query.filter_by(project_id=project_id).filter_by(is_active=True).all()
-        
-        # Calculate summary
-        total_income = sum(t.amount for t in transactions if t.type == 'income')
-        total_expense = sum(t.amount for t in transactions if t.type == 'expense')
-        balance = total_income - total_expense
-        
-        # Build JSON structure
-        export_data = {
+    def export_to_csv(project_id, month_yyyymm=None):
+        """Export transactions to CSV format"""
+        return ''.join(ExportService.iter_csv(project_id, month_yyyymm))
+
+    @staticmethod
+    def _transaction_json(tx):
+        return {
+            'id': tx.id,
+            'type': tx.type,
+            'occurred_at': tx.occurred_at.isoformat() if tx.occurred_at else None,
+            'category_id': tx.category_id,
+            'category_name': tx.category_name,
+            'amount_satang': tx.amount,
+            'amount_baht': tx.amount / 100,
+            'note': tx.note
+        }
+
+    @staticmethod
+    def _export_header(project, month_yyyymm=None):
+        """export_info and summary, computed with one aggregate query"""
+        totals = db.session.query(*AggregationService.totals_columns()).filter(
+            *ExportService._transaction_filters(project.id, month_yyyymm)
+        ).one()
+        balance = totals.income - totals.expense
+
+        return {
             'export_info': {
                 'project_id': project.id,
                 'project_name': project.name,
                 'exported_at': datetime.utcnow().isoformat(),
                 'month_filter': month_yyyymm,
-                'total_transactions': len(transactions)
+                'total_transactions': totals.count
             },
             'summary': {
-                'total_income_satang': total_income,
-                'total_income_baht': total_income / 100,
-                'total_expense_satang': total_expense,
-                'total_expense_baht': total_expense / 100,
+                'total_income_satang': totals.income,
+                'total_income_baht': totals.income / 100,
+                'total_expense_satang': totals.expense,
+                'total_expense_baht': totals.expense / 100,
                 'balance_satang': balance,
                 'balance_baht': balance / 100
-            },
-            'transactions': [
-                {
-                    'id': tx.id,
-                    'type': tx.type,
-                    'occurred_at': tx.occurred_at.isoformat() if tx.occurred_at else None,
-                    'category_id': tx.category_id,
-                    'category_name': tx.category.name_th if tx.category else None,
-                    'amount_satang': tx.amount,
-                    'amount_baht': tx.amount / 100,
-                    'note': tx.note
-                }
-                for tx in transactions
-            ],
+            }
+        }
+
+    @staticmethod
+    def _export_reference_data(project_id):
+        """Categories, budgets and active recurring rules (small, loaded at once)"""
+        categories = Category.query.filter_by(project_id=project_id).order_by(Category.sort_order).all()
+        budgets = Budget.query.options(joinedload(Budget.category)).filter_by(project_id=project_id).all()
+        recurring_rules = RecurringRule.query.options(joinedload(RecurringRule.category)).filter_by(
+            project_id=project_id, is_active=True
+        ).all()
+
+        return {
             'categories': [
                 {
                     'id': cat.id,
@@ -165,7 +208,55 @@ class ExportService:
                 for rule in recurring_rules
             ]
         }
-        
+
+    @staticmethod
+    def iter_json(project_id, month_yyyymm=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Generate the full JSON export in chunks
+
+        Same document as export_to_json; the transactions array is written
+        batch by batch instead of being built in memory first.
+        """
+        project = Project.query.get(project_id)
+        if not project:
+            return
+
+        def dumps(value):
+            return json.dumps(value, ensure_ascii=False)
+
+        header = ExportService._export_header(project, month_yyyymm)
+        yield '{"export_info": ' + dumps(header['export_info'])
+        yield ',\n"summary": ' + dumps(header['summary'])
+        yield ',\n"transactions": ['
+
+        parts = []
+        for i, tx in enumerate(ExportService.iter_transaction_rows(project_id, month_yyyymm, batch_size)):
+            parts.append(('\n' if i == 0 else ',\n') + dumps(ExportService._transaction_json(tx)))
+            if len(parts) >= batch_size:
+                yield ''.join(parts)
+                parts = []
+        parts.append('\n]')
+        yield ''.join(parts)
+
+        for key, value in ExportService._export_reference_data(project_id).items():
+            yield f',\n"{key}": ' + dumps(value)
+        yield '}\n'
+
+    @staticmethod
+    def export_to_json(project_id, month_yyyymm=None):
+        """Export all project data to JSON format"""
+        # Get project
+        project = Project.query.get(project_id)
+        if not project:
+            return None
+
+        export_data = ExportService._export_header(project, month_yyyymm)
+        export_data['transactions'] = [
+            ExportService._transaction_json(tx)
+            for tx in ExportService.iter_transaction_rows(project_id, month_yyyymm)
+        ]
+        export_data.update(ExportService._export_reference_data(project_id))
+
         return export_data
 
     @staticmethod
@@ -192,6 +283,32 @@ class ExportService:
         )
         return response
 
+    @staticmethod
+    def create_streaming_response(chunks, filename, mimetype, gzip=False):
+        """
+        Create a chunked Flask response from a generator
+
+        Args:
+            chunks: Generator of str chunks
+            filename: Download filename
+            mimetype: Response mimetype
+            gzip: Compress on the fly (Content-Encoding: gzip)
+        """
+        headers = {'Content-Disposition': f'attachment; filename={filename}'}
+        body = stream_with_context(chunks)
+        if gzip:
+            body = gzip_chunks(body)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        return Response(body, mimetype=mimetype, headers=headers)
+
+    @staticmethod
+    def wants_gzip():
+        """True when the client accepts gzip (?gzip=0 disables it)"""
+        if request.args.get('gzip') in ('0', 'false'):
+            return False
+        return 'gzip' in request.accept_encodings
+
     @staticmethod
     def generate_filename(project_name, format_type, month_yyyymm=None):
         """Generate filename for export"""
@@ -5,7 +5,14 @@ Uses Google Gemini API to understand user intent and extract entities
 import os
 import json
 import re
+import copy
+import hashlib
+import unicodedata
 from datetime import datetime, date
+from app.services.cache_service import LRUTTLCache, MISS
+from app.services.single_flight import single_flight, prompt_key
+from app.utils.keyword_matcher import KeywordAutomaton
+from app.services.category_index import CATEGORY_ALIASES, CategoryIndex
 
 try:
     import google.generativeai as genai
@@ -14,9 +21,80 @@ except ImportError:
     GEMINI_AVAILABLE = False
 
 
+# Intents whose parse result depends only on the message text (no amounts,
+# dates or user-specific entities), safe to serve from the parse cache
+CACHEABLE_INTENTS = {
+    'get_summary', 'get_recurring', 'get_transactions', 'get_categories',
+    'get_goals', 'get_budget', 'get_help', 'get_web_link'
+}
+
+# Trailing politeness particles and punctuation that do not change intent
+_TRAILING_NOISE = re.compile(r'(?:\s*(?:ครับ|คับ|ค่ะ|คะ|จ้า|จ้ะ|นะ|หน่อย|[!?.~]+))+$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+# Every keyword _simple_parse checks for, matched in one pass per message
+PARSE_KEYWORDS = KeywordAutomaton([
+    'add', 'budget', 'categories', 'category', 'create', 'dashboard', 'delete', 'goal', 'help',
+    'link', 'pause', 'profile', 'resume', 'update', 'website', 'withdraw', 'year', 'คำสั่ง',
+    'งบ', 'งบประมาณ', 'ช่วยเหลือ', 'ดู', 'ดูรายการ', 'ตั้ง', 'ตั้งงบ', 'ถอน', 'ถอนเงิน',
+    'ทั้งหมด', 'ทำอะไรได้', 'ประจำ', 'ปี', 'พัก', 'มีรายการอะไร', 'ยกเลิก', 'ยอด', 'รับ',
+    'รายการการเงิน', 'รายการทั้งหมด', 'รายการประจำ', 'รายการล่าสุด', 'รายการวันนี้',
+    'รายการเดือน', 'รายงาน', 'รายจ่าย', 'รายรับ', 'ลบ', 'ลบรายการ', 'ลบรายการทั้งหมด', 'ลิงก์',
+    'ล่าสุด', 'วันนี้', 'สรุป', 'สร้าง', 'สัปดาห์', 'หน้าเว็บ', 'หมวดหมู่', 'หยุด', 'ออม',
+    'อะไร', 'อัพเดท', 'เงินเดือน', 'เดือน', 'เดือนก่อน', 'เดือนที่แล้ว', 'เติม', 'เติมเงิน',
+    'เท่าไหร่', 'เปลี่ยน', 'เปลี่ยนรายการ', 'เปิด', 'เป้าหมาย', 'เพิ่ม', 'เพิ่มเงิน', 'เริ่ม',
+    'เว็บ', 'แก้', 'แก้รายการ', 'แก้ไข', 'แก้ไขรายการ', 'แสดง', 'แสดงรายการ', 'โปรไฟล์', 'ได้'
+])
+
+# Category keyword groups now live with the category index (kept importable here)
+CATEGORY_KEYWORD_GROUPS = CATEGORY_ALIASES
+
+_AMOUNT_BAHT = re.compile(r'(\d+(?:,\d+)?)\s*บาท')
+_BUDGET_DELETE_CATEGORY = re.compile(r'(?:ลบงบ|ยกเลิกงบ)\s*(\S+)')
+_BUDGET_UPDATE_CATEGORY = re.compile(r'(?:แก้งบ|เปลี่ยนงบ|อัพเดทงบ)\s*(\S+)')
+_BUDGET_SET_CATEGORY = re.compile(r'(?:ตั้งงบ|งบ)\s*(\S+)')
+_TRANSACTION_UPDATE = re.compile(r'รายการ(?:ที่)?\s*(\d+)\s*(?:เปลี่ยน|แก้)')
+_TRANSACTION_INDEX = re.compile(r'(?:ที่|รายการ)\s*(\d+)')
+_NEW_AMOUNT = re.compile(r'(?:เป็น|เป็น)\s*(\d+(?:,\d+)?)\s*(?:บาท)?')
+_NEW_CATEGORY = re.compile(r'(?:หมวด|เป็นหมวด)\s*(\S+)')
+_NEW_NOTE = re.compile(r'(?:หมายเหตุ|โน้ต|note)\s*(.+?)(?:\s*$|หมวด)', re.IGNORECASE)
+_DAY_OF_MONTH = re.compile(r'วันที่\s*(\d{1,2})')
+_RECURRING_INDEX = re.compile(r'ที่\s*(\d+)|ประจำ\s*(\d+)')
+_DELETE_INDEX = re.compile(r'ที่\s*(\d+)|รายการ\s*(\d+)')
+_MONTHS = re.compile(r'(\d+)\s*เดือน')
+_GOAL_UPDATE_NAME = re.compile(r'(?:แก้ไข|เปลี่ยน|อัพเดท)(?:เป้าหมาย)?\s*(\S+)')
+_GOAL_DELETE_NAME = re.compile(r'(?:ลบ|ยกเลิก)(?:เป้าหมาย)?\s*(\S+)')
+_NOTE_BEFORE_AMOUNT = re.compile(r'^(.+?)\s*\d+')
+
+
+def _word_after(message, keywords):
+    """Return the word following the first word that contains any keyword"""
+    words = message.split()
+    for i, w in enumerate(words):
+        if any(kw in w for kw in keywords) and i + 1 < len(words):
+            return words[i + 1]
+    return None
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a chat message for parse-cache lookup"""
+    text = unicodedata.normalize('NFC', message or '').strip().lower()
+    text = _WHITESPACE.sub(' ', text)
+    return _TRAILING_NOISE.sub('', text).strip()
+
+
 class GeminiNLPService:
     """Service for NLP processing using Gemini API"""
     
+    # Bump when a prompt or its post-processing changes, so outputs memoized
+    # against (project, data version, prompt version) are recomputed
+    PROMPT_VERSIONS = {
+        'financial_insights': 1,
+        'spending_patterns': 1,
+        'auto_insights': 1
+    }
+    
     SYSTEM_PROMPT = """คุณเป็น NLP Parser สำหรับแอปบันทึกรายรับรายจ่าย
     
 วิเคราะห์ข้อความและ return JSON ตามรูปแบบนี้เท่านั้น:
@@ -56,18 +134,76 @@ class GeminiNLPService:
 - "ลบรายการประจำ Netflix" → intent: delete_recurring, keyword: "Netflix"
 """
 
+    MODEL_NAME = 'gemini-2.0-flash-exp'
+
+    # Changes whenever the parser prompt or model changes, so stale parses are never served
+    PROMPT_VERSION = hashlib.sha1(f"{MODEL_NAME}:{SYSTEM_PROMPT}".encode('utf-8')).hexdigest()[:12]
+
     def __init__(self):
         self.api_key = os.environ.get('GEMINI_API_KEY')
         self.model = None
+        self.parse_cache = LRUTTLCache(
+            max_entries=int(os.environ.get('GEMINI_PARSE_CACHE_SIZE', '1000')),
+            default_ttl=int(os.environ.get('GEMINI_PARSE_CACHE_TTL', '3600'))
+        )
+        # Throwaway category indexes for callers that pass a plain category list
+        self.category_indexes = LRUTTLCache(max_entries=256, default_ttl=3600)
         
         if GEMINI_AVAILABLE and self.api_key:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            self.model = genai.GenerativeModel(self.MODEL_NAME)
     
     def is_available(self):
         """Check if Gemini is properly configured"""
         return GEMINI_AVAILABLE and self.api_key and self.model
     
+    def _generate(self, prompt: str, temperature: float, max_output_tokens: int) -> str:
+        """
+        Generate text for a prompt
+        
+        Identical concurrent requests (same prompt and settings) share one
+        Gemini call; errors are raised to every waiting caller.
+        """
+        def call():
+            response = self.model.generate_content(
+                prompt,
+                generation_config={
+                    'temperature': temperature,
+                    'max_output_tokens': max_output_tokens,
+                }
+            )
+            return response.text.strip()
+        
+        key = prompt_key(self.MODEL_NAME, prompt, temperature, max_output_tokens)
+        return single_flight.do('gemini', key, call)
+    
+    def _generate_stream(self, prompt: str, temperature: float, max_output_tokens: int):
+        """Yield text chunks for a prompt as Gemini produces them (not coalesced)"""
+        response = self.model.generate_content(
+            prompt,
+            generation_config={
+                'temperature': temperature,
+                'max_output_tokens': max_output_tokens,
+            },
+            stream=True
+        )
+        for chunk in response:
+            text = getattr(chunk, 'text', '')
+            if text:
+                yield text
+    
+    def _chat_prompt(self, message: str, context: str = None) -> str:
+        system_context = """คุณเป็นผู้ช่วย AI อัจฉริยะที่ช่วยตอบคำถามทุกเรื่อง
+คุณสนทนาเป็นภาษาไทยได้อย่างเป็นธรรมชาติ ใช้น้ำเสียงเป็นมิตรและเป็นกันเอง
+ตอบคำถามอย่างกระชับ ชัดเจน และเป็นประโยชน์
+
+ถ้าคำถามเกี่ยวกับการเงินหรือการจัดการรายรับรายจ่าย คุณมีความเชี่ยวชาญเป็นพิเศษ"""
+        
+        if context:
+            system_context += f"\n\nข้อมูลการเงินของผู้ใช้:\n{context}"
+        
+        return f"{system_context}\n\nคำถาม: {message}\n\nคำตอบ:"
+    
     def chat(self, message: str, context: str = None) -> str:
         """
         Chat with Gemini AI - answer any question
@@ -83,36 +219,36 @@ class GeminiNLPService:
             return "ขออภัยค่ะ ระบบ AI ยังไม่พร้อมใช้งาน กรุณาลองใหม่ภายหลัง"
         
         try:
-            # Build system context
-            system_context = """คุณเป็นผู้ช่วย AI อัจฉริยะที่ช่วยตอบคำถามทุกเรื่อง
-คุณสนทนาเป็นภาษาไทยได้อย่างเป็นธรรมชาติ ใช้น้ำเสียงเป็นมิตรและเป็นกันเอง
-ตอบคำถามอย่างกระชับ ชัดเจน และเป็นประโยชน์
-
-ถ้าคำถามเกี่ยวกับการเงินหรือการจัดการรายรับรายจ่าย คุณมีความเชี่ยวชาญเป็นพิเศษ"""
-            
-            if context:
-                system_context += f"\n\nข้อมูลการเงินของผู้ใช้:\n{context}"
-            
-            prompt = f"{system_context}\n\nคำถาม: {message}\n\nคำตอบ:"
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'max_output_tokens': 1000,
-                }
-            )
-            
-            return response.text.strip()
+            return self._generate(self._chat_prompt(message, context), temperature=0.7, max_output_tokens=1000)
             
         except Exception as e:
             print(f"Gemini chat error: {e}")
             return f"ขออภัยค่ะ เกิดข้อผิดพลาด: {str(e)}"
     
+    def chat_stream(self, message: str, context: str = None):
+        """
+        Streaming variant of chat(): yields the answer in chunks
+        
+        Errors after the first chunk end the stream with an error note.
+        """
+        if not self.is_available():
+            yield "ขออภัยค่ะ ระบบ AI ยังไม่พร้อมใช้งาน กรุณาลองใหม่ภายหลัง"
+            return
+        
+        try:
+            for text in self._generate_stream(self._chat_prompt(message, context), temperature=0.7, max_output_tokens=1000):
+                yield text
+        except Exception as e:
+            print(f"Gemini chat stream error: {e}")
+            yield f"ขออภัยค่ะ เกิดข้อผิดพลาด: {str(e)}"
+    
     def parse_message(self, message: str) -> dict:
         """
         Parse user message using Gemini AI
         
+        Context-free commands ("สรุป", "รายการประจำ", ...) are answered from
+        an in-process cache keyed on the normalized text and PROMPT_VERSION.
+        
         Returns:
             dict with intent, entities, missing_fields, fallback_question
         """
@@ -120,19 +256,16 @@ class GeminiNLPService:
             # Fallback to simple regex parsing
             return self._simple_parse(message)
         
+        cache_key = f"{self.PROMPT_VERSION}:{normalize_message(message)}"
+        cached = self.parse_cache.get(cache_key)
+        if cached is not MISS:
+            return copy.deepcopy(cached)
+        
         try:
             prompt = f"{self.SYSTEM_PROMPT}\n\nข้อความ: {message}\n\nJSON:"
             
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.1,
-                    'max_output_tokens': 500,
-                }
-            )
-            
             # Extract JSON from response
-            text = response.text.strip()
+            text = self._generate(prompt, temperature=0.1, max_output_tokens=500)
             
             # Find JSON block
             if '```json' in text:
@@ -141,15 +274,24 @@ class GeminiNLPService:
                 text = text.split('```')[1].split('```')[0].strip()
             
             result = json.loads(text)
+            if result.get('intent') in CACHEABLE_INTENTS:
+                self.parse_cache.set(cache_key, copy.deepcopy(result))
             return result
             
         except Exception as e:
             print(f"Gemini parse error: {e}")
             return self._simple_parse(message)
     
+    def parse_cache_stats(self) -> dict:
+        """Hit/miss counters of the parse cache"""
+        stats = self.parse_cache.stats()
+        stats['prompt_version'] = self.PROMPT_VERSION
+        return stats
+    
     def _simple_parse(self, message: str) -> dict:
         """Simple regex-based parsing as fallback"""
         message_lower = message.lower()
+        hits = PARSE_KEYWORDS.find_all(message_lower)
         
         result = {
             'intent': 'general',
@@ -160,23 +302,23 @@ class GeminiNLPService:
         }
         
         # Check for budget management (ตั้งงบ/งบประมาณ)
-        if any(x in message_lower for x in ['ตั้งงบ', 'งบประมาณ', 'budget', 'งบ']):
-            if any(x in message_lower for x in ['ดู', 'แสดง', 'เท่าไหร่']):
+        if any(x in hits for x in ['ตั้งงบ', 'งบประมาณ', 'budget', 'งบ']):
+            if any(x in hits for x in ['ดู', 'แสดง', 'เท่าไหร่']):
                 result['intent'] = 'get_budget'
-            elif any(x in message_lower for x in ['ลบ', 'ยกเลิก']):
+            elif any(x in hits for x in ['ลบ', 'ยกเลิก']):
                 result['intent'] = 'delete_budget'
                 # Extract category
-                cat_match = re.search(r'(?:ลบงบ|ยกเลิกงบ)\s*(\S+)', message)
+                cat_match = _BUDGET_DELETE_CATEGORY.search(message)
                 if cat_match:
                     result['entities']['category_name'] = cat_match.group(1)
-            elif any(x in message_lower for x in ['แก้', 'เปลี่ยน', 'อัพเดท']):
+            elif any(x in hits for x in ['แก้', 'เปลี่ยน', 'อัพเดท']):
                 result['intent'] = 'update_budget'
                 # Extract amount
-                amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+                amount_match = _AMOUNT_BAHT.search(message)
                 if amount_match:
                     result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
                 # Extract category
-                cat_match = re.search(r'(?:แก้งบ|เปลี่ยนงบ|อัพเดทงบ)\s*(\S+)', message)
+                cat_match = _BUDGET_UPDATE_CATEGORY.search(message)
                 if cat_match:
                     cat_name = cat_match.group(1)
                     if not cat_name.isdigit() and 'บาท' not in cat_name and 'เป็น' not in cat_name:
@@ -184,11 +326,11 @@ class GeminiNLPService:
             else:
                 result['intent'] = 'set_budget'
                 # Extract amount first
-                amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+                amount_match = _AMOUNT_BAHT.search(message)
                 if amount_match:
                     result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
                 # Extract category (word after ตั้งงบ or งบ, excluding numbers)
-                cat_match = re.search(r'(?:ตั้งงบ|งบ)\s*(\S+)', message)
+                cat_match = _BUDGET_SET_CATEGORY.search(message)
                 if cat_match:
                     cat_name = cat_match.group(1)
                     if not cat_name.isdigit() and 'บาท' not in cat_name:
@@ -196,12 +338,12 @@ class GeminiNLPService:
             return result
         
         # Check for help command
-        if any(x in message_lower for x in ['ช่วยเหลือ', 'help', 'คำสั่ง', 'ทำอะไรได้']):
+        if any(x in hits for x in ['ช่วยเหลือ', 'help', 'คำสั่ง', 'ทำอะไรได้']):
             result['intent'] = 'get_help'
             return result
         
         # Check for resume recurring (เปิด Netflix) - before recurring check
-        if any(x in message_lower for x in ['เปิด', 'resume', 'เริ่ม']) and 'ประจำ' not in message_lower and 'เว็บ' not in message_lower:
+        if any(x in hits for x in ['เปิด', 'resume', 'เริ่ม']) and 'ประจำ' not in hits and 'เว็บ' not in hits:
             result['intent'] = 'resume_recurring'
             words = message.split()
             for i, w in enumerate(words):
@@ -211,7 +353,7 @@ class GeminiNLPService:
             return result
         
         # Check for pause recurring (หยุด/พัก Netflix) - before recurring check
-        if any(x in message_lower for x in ['หยุด', 'พัก', 'pause']) and 'ประจำ' not in message_lower:
+        if any(x in hits for x in ['หยุด', 'พัก', 'pause']) and 'ประจำ' not in hits:
             result['intent'] = 'pause_recurring'
             words = message.split()
             for i, w in enumerate(words):
@@ -221,7 +363,7 @@ class GeminiNLPService:
             return result
         
         # Check for withdraw goal (ถอนเงิน xxx บาท)
-        if any(x in message_lower for x in ['ถอนเงิน', 'ถอน', 'withdraw']) and 'ออม' not in message_lower:
+        if any(x in hits for x in ['ถอนเงิน', 'ถอน', 'withdraw']) and 'ออม' not in hits:
             result['intent'] = 'withdraw_goal'
             # Extract goal name
             words = message.split()
@@ -230,64 +372,64 @@ class GeminiNLPService:
                     result['entities']['goal_name'] = words[i + 1]
                     break
             # Extract amount
-            amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+            amount_match = _AMOUNT_BAHT.search(message)
             if amount_match:
                 result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
             return result
         
         # Check for update transaction (แก้ไขรายการที่ 1, รายการที่ 1 เปลี่ยน)
         # Pattern: "รายการที่ X เปลี่ยน" or "แก้ไขรายการที่ X"
-        update_match = re.search(r'รายการ(?:ที่)?\s*(\d+)\s*(?:เปลี่ยน|แก้)', message_lower)
-        if update_match or any(x in message_lower for x in ['แก้ไขรายการ', 'แก้รายการ', 'เปลี่ยนรายการ']):
-            if 'ประจำ' not in message_lower:
+        update_match = _TRANSACTION_UPDATE.search(message_lower)
+        if update_match or any(x in hits for x in ['แก้ไขรายการ', 'แก้รายการ', 'เปลี่ยนรายการ']):
+            if 'ประจำ' not in hits:
                 result['intent'] = 'update_transaction'
                 
                 # Extract index
-                num_match = re.search(r'(?:ที่|รายการ)\s*(\d+)', message)
+                num_match = _TRANSACTION_INDEX.search(message)
                 if num_match:
                     result['entities']['index'] = int(num_match.group(1))
                 
                 # Extract amount (ถ้ามี)
-                amount_match = re.search(r'(?:เป็น|เป็น)\s*(\d+(?:,\d+)?)\s*(?:บาท)?', message)
+                amount_match = _NEW_AMOUNT.search(message)
                 if amount_match:
                     result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
                 
                 # Extract category (หมวด xxx, เป็นหมวด xxx)
-                cat_match = re.search(r'(?:หมวด|เป็นหมวด)\s*(\S+)', message)
+                cat_match = _NEW_CATEGORY.search(message)
                 if cat_match:
                     result['entities']['category_name'] = cat_match.group(1)
                 
                 # Extract note (หมายเหตุ xxx, โน้ต xxx)
-                note_match = re.search(r'(?:หมายเหตุ|โน้ต|note)\s*(.+?)(?:\s*$|หมวด)', message, re.IGNORECASE)
+                note_match = _NEW_NOTE.search(message)
                 if note_match:
                     result['entities']['note'] = note_match.group(1).strip()
                 
                 return result
         
         # Check for delete all (need clarification: recurring or regular?)
-        if 'ลบรายการทั้งหมด' in message_lower or ('ลบ' in message_lower and 'ทั้งหมด' in message_lower):
-            if 'ประจำ' in message_lower:
+        if 'ลบรายการทั้งหมด' in hits or ('ลบ' in hits and 'ทั้งหมด' in hits):
+            if 'ประจำ' in hits:
                 result['intent'] = 'delete_recurring'
                 result['entities']['delete_all'] = True
-            elif 'เดือน' in message_lower:
+            elif 'เดือน' in hits:
                 result['intent'] = 'delete_all_transactions'
             else:
                 result['intent'] = 'delete_all_confirm'
             return result
         
         # Check for recurring patterns
-        if 'รายการประจำ' in message or 'ประจำ' in message_lower:
-            if any(x in message_lower for x in ['เพิ่ม', 'สร้าง', 'ตั้ง']):
+        if 'รายการประจำ' in hits or 'ประจำ' in hits:
+            if any(x in hits for x in ['เพิ่ม', 'สร้าง', 'ตั้ง']):
                 result['intent'] = 'create_recurring'
                 # Extract amount
-                amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+                amount_match = _AMOUNT_BAHT.search(message)
                 if amount_match:
                     result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
                 else:
                     result['missing_fields'].append('amount')
                 
                 # Extract day
-                day_match = re.search(r'วันที่\s*(\d{1,2})', message)
+                day_match = _DAY_OF_MONTH.search(message)
                 if day_match:
                     result['entities']['day_of_month'] = int(day_match.group(1))
                 else:
@@ -296,16 +438,16 @@ class GeminiNLPService:
                 if result['missing_fields']:
                     result['fallback_question'] = self._generate_fallback_question(result['missing_fields'])
                     
-            elif any(x in message_lower for x in ['ลบ', 'ยกเลิก']):
+            elif any(x in hits for x in ['ลบ', 'ยกเลิก']):
                 result['intent'] = 'delete_recurring'
                 
                 # Check for index (ลบรายการประจำที่ 1)
-                num_match = re.search(r'ที่\s*(\d+)|ประจำ\s*(\d+)', message)
+                num_match = _RECURRING_INDEX.search(message)
                 if num_match:
                     result['entities']['index'] = int(num_match.group(1) or num_match.group(2))
                 
                 # Check for "ทั้งหมด"
-                if 'ทั้งหมด' in message_lower:
+                if 'ทั้งหมด' in hits:
                     result['entities']['delete_all'] = True
                 
                 # Extract keyword
@@ -317,7 +459,7 @@ class GeminiNLPService:
                             if not next_word.isdigit() and next_word not in ['ที่', 'ทั้งหมด']:
                                 result['entities']['keyword'] = next_word
                                 break
-            elif any(x in message_lower for x in ['หยุด', 'pause', 'พัก']):
+            elif any(x in hits for x in ['หยุด', 'pause', 'พัก']):
                 result['intent'] = 'pause_recurring'
                 # Extract keyword
                 words = message.split()
@@ -325,58 +467,50 @@ class GeminiNLPService:
                     if any(kw in w for kw in ['หยุด', 'พัก']) and i + 1 < len(words):
                         result['entities']['keyword'] = words[i + 1]
                         break
-            elif any(x in message_lower for x in ['แก้ไข', 'เปลี่ยน', 'อัพเดท']):
+            elif any(x in hits for x in ['แก้ไข', 'เปลี่ยน', 'อัพเดท']):
                 result['intent'] = 'update_recurring'
             else:
                 result['intent'] = 'get_recurring'
         
         # Check for summary
-        elif any(x in message_lower for x in ['สรุป', 'รายงาน', 'ยอด']):
+        elif any(x in hits for x in ['สรุป', 'รายงาน', 'ยอด']):
             result['intent'] = 'get_summary'
-            if 'วันนี้' in message_lower:
+            if 'วันนี้' in hits:
                 result['entities']['period'] = 'today'
-            elif 'สัปดาห์' in message_lower:
+            elif 'สัปดาห์' in hits:
                 result['entities']['period'] = 'this_week'
-            elif 'ปี' in message_lower or 'year' in message_lower:
+            elif 'ปี' in hits or 'year' in hits:
                 result['entities']['period'] = 'this_year'
-            elif 'เดือนที่แล้ว' in message_lower or 'เดือนก่อน' in message_lower:
+            elif 'เดือนที่แล้ว' in hits or 'เดือนก่อน' in hits:
                 result['entities']['period'] = 'last_month'
             else:
                 result['entities']['period'] = 'this_month'
         
         # Check for categories
-        elif any(x in message_lower for x in ['หมวดหมู่', 'category', 'categories']):
-            # Extract category name helper
-            def extract_category_name(msg, keywords):
-                words = msg.split()
-                for i, w in enumerate(words):
-                    if any(kw in w for kw in keywords) and i + 1 < len(words):
-                        return words[i + 1]
-                return None
-            
-            if any(x in message_lower for x in ['ลบ', 'delete']):
+        elif any(x in hits for x in ['หมวดหมู่', 'category', 'categories']):
+            if any(x in hits for x in ['ลบ', 'delete']):
                 result['intent'] = 'delete_category'
-                result['entities']['category_name'] = extract_category_name(message, ['หมวดหมู่', 'ลบ'])
-            elif any(x in message_lower for x in ['แก้ไข', 'เปลี่ยน', 'update']):
+                result['entities']['category_name'] = _word_after(message, ['หมวดหมู่', 'ลบ'])
+            elif any(x in hits for x in ['แก้ไข', 'เปลี่ยน', 'update']):
                 result['intent'] = 'update_category'
-                result['entities']['category_name'] = extract_category_name(message, ['หมวดหมู่', 'แก้ไข', 'เปลี่ยน'])
+                result['entities']['category_name'] = _word_after(message, ['หมวดหมู่', 'แก้ไข', 'เปลี่ยน'])
                 # Check for type change
-                if 'รายรับ' in message_lower:
+                if 'รายรับ' in hits:
                     result['entities']['new_type'] = 'income'
-                elif 'รายจ่าย' in message_lower:
+                elif 'รายจ่าย' in hits:
                     result['entities']['new_type'] = 'expense'
-            elif any(x in message_lower for x in ['สร้าง', 'เพิ่ม']):
+            elif any(x in hits for x in ['สร้าง', 'เพิ่ม']):
                 result['intent'] = 'create_category'
-                result['entities']['category_name'] = extract_category_name(message, ['หมวดหมู่'])
+                result['entities']['category_name'] = _word_after(message, ['หมวดหมู่'])
                 # Check for type
-                if 'รายรับ' in message_lower:
+                if 'รายรับ' in hits:
                     result['entities']['type'] = 'income'
             else:
                 result['intent'] = 'get_categories'
         
         # Check for goals
-        elif any(x in message_lower for x in ['เป้าหมาย', 'ออม', 'goal']):
-            if any(x in message_lower for x in ['ลบ', 'ยกเลิก', 'delete']):
+        elif any(x in hits for x in ['เป้าหมาย', 'ออม', 'goal']):
+            if any(x in hits for x in ['ลบ', 'ยกเลิก', 'delete']):
                 result['intent'] = 'delete_goal'
                 # Extract goal name
                 words = message.split()
@@ -384,7 +518,7 @@ class GeminiNLPService:
                     if any(kw in w for kw in ['เป้าหมาย', 'ออม', 'ลบ']) and i + 1 < len(words):
                         result['entities']['goal_name'] = words[i + 1]
                         break
-            elif any(x in message_lower for x in ['ตั้ง', 'สร้าง', 'create']):
+            elif any(x in hits for x in ['ตั้ง', 'สร้าง', 'create']):
                 result['intent'] = 'create_goal'
                 # Extract goal name and amount
                 words = message.split()
@@ -393,14 +527,14 @@ class GeminiNLPService:
                         result['entities']['goal_name'] = words[i + 1]
                         break
                 # Extract amount
-                amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+                amount_match = _AMOUNT_BAHT.search(message)
                 if amount_match:
                     result['entities']['target_amount'] = float(amount_match.group(1).replace(',', ''))
                 # Extract months
-                months_match = re.search(r'(\d+)\s*เดือน', message)
+                months_match = _MONTHS.search(message)
                 if months_match:
                     result['entities']['months'] = int(months_match.group(1))
-            elif any(x in message_lower for x in ['เติม', 'เพิ่ม', 'add']):
+            elif any(x in hits for x in ['เติม', 'เพิ่ม', 'add']):
                 result['intent'] = 'contribute_goal'
                 # Extract goal name
                 words = message.split()
@@ -409,42 +543,42 @@ class GeminiNLPService:
                         result['entities']['goal_name'] = words[i + 1]
                         break
                 # Extract amount
-                amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+                amount_match = _AMOUNT_BAHT.search(message)
                 if amount_match:
                     result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
-            elif any(x in message_lower for x in ['แก้ไข', 'เปลี่ยน', 'อัพเดท']):
+            elif any(x in hits for x in ['แก้ไข', 'เปลี่ยน', 'อัพเดท']):
                 result['intent'] = 'update_goal'
                 # Extract goal name (first non-keyword word)
-                name_match = re.search(r'(?:แก้ไข|เปลี่ยน|อัพเดท)(?:เป้าหมาย)?\s*(\S+)', message)
+                name_match = _GOAL_UPDATE_NAME.search(message)
                 if name_match:
                     result['entities']['goal_name'] = name_match.group(1)
                 # Extract new target
-                amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+                amount_match = _AMOUNT_BAHT.search(message)
                 if amount_match:
                     result['entities']['target_amount'] = float(amount_match.group(1).replace(',', ''))
-            elif any(x in message_lower for x in ['ลบ', 'ยกเลิก']):
+            elif any(x in hits for x in ['ลบ', 'ยกเลิก']):
                 result['intent'] = 'delete_goal'
                 # Extract goal name
-                name_match = re.search(r'(?:ลบ|ยกเลิก)(?:เป้าหมาย)?\s*(\S+)', message)
+                name_match = _GOAL_DELETE_NAME.search(message)
                 if name_match:
                     result['entities']['goal_name'] = name_match.group(1)
             else:
                 result['intent'] = 'get_goals'
         
         # Check for web link / profile
-        elif any(x in message_lower for x in ['เว็บ', 'website', 'ลิงก์', 'link', 'profile', 'โปรไฟล์', 'dashboard', 'หน้าเว็บ']):
+        elif any(x in hits for x in ['เว็บ', 'website', 'ลิงก์', 'link', 'profile', 'โปรไฟล์', 'dashboard', 'หน้าเว็บ']):
             result['intent'] = 'get_web_link'
         
         # Check for delete transaction FIRST (ลบรายการ, ลบรายการล่าสุด, ลบรายการที่ 1)
-        elif any(x in message_lower for x in ['ลบรายการ']) and 'ประจำ' not in message_lower:
+        elif any(x in hits for x in ['ลบรายการ']) and 'ประจำ' not in hits:
             result['intent'] = 'delete_transaction'
             
             # Check for "ล่าสุด" - delete latest
-            if 'ล่าสุด' in message_lower:
+            if 'ล่าสุด' in hits:
                 result['entities']['delete_latest'] = True
             
             # Check for number (ลบรายการที่ 1, ลบรายการ 2)
-            num_match = re.search(r'ที่\s*(\d+)|รายการ\s*(\d+)', message)
+            num_match = _DELETE_INDEX.search(message)
             if num_match:
                 result['entities']['index'] = int(num_match.group(1) or num_match.group(2))
             
@@ -459,17 +593,17 @@ class GeminiNLPService:
                             break
         
         # Check for transactions list (ดูรายการ, แสดงรายการ, รายการเดือนนี้) - NO ลบ
-        elif any(x in message_lower for x in ['แสดงรายการ', 'ดูรายการ', 'รายการทั้งหมด', 'รายการล่าสุด', 'รายการวันนี้', 'รายการเดือน', 'มีรายการอะไร', 'รายการการเงิน']) and 'ลบ' not in message_lower:
+        elif any(x in hits for x in ['แสดงรายการ', 'ดูรายการ', 'รายการทั้งหมด', 'รายการล่าสุด', 'รายการวันนี้', 'รายการเดือน', 'มีรายการอะไร', 'รายการการเงิน']) and 'ลบ' not in hits:
             result['intent'] = 'get_transactions'
-            if 'วันนี้' in message_lower:
+            if 'วันนี้' in hits:
                 result['entities']['period'] = 'today'
-            elif 'สัปดาห์' in message_lower:
+            elif 'สัปดาห์' in hits:
                 result['entities']['period'] = 'this_week'
             else:
                 result['entities']['period'] = 'this_month'
         
         # Check for contribute goal (เติมเงิน xxx บาท)
-        elif any(x in message_lower for x in ['เติมเงิน', 'เพิ่มเงิน']) and re.search(r'\d+\s*บาท', message):
+        elif any(x in hits for x in ['เติมเงิน', 'เพิ่มเงิน']) and _AMOUNT_BAHT.search(message):
             result['intent'] = 'contribute_goal'
             # Extract goal name
             words = message.split()
@@ -478,19 +612,19 @@ class GeminiNLPService:
                     result['entities']['goal_name'] = words[i + 1]
                     break
             # Extract amount
-            amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+            amount_match = _AMOUNT_BAHT.search(message)
             if amount_match:
                 result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
         
         # Check for transaction creation (มี บาท แต่ไม่ใช่คำถาม และไม่ใช่ออม/เติม)
-        elif re.search(r'(\d+(?:,\d+)?)\s*บาท', message) and 'อะไร' not in message_lower and 'ออม' not in message_lower:
+        elif _AMOUNT_BAHT.search(message) and 'อะไร' not in hits and 'ออม' not in hits:
             result['intent'] = 'create_transaction'
-            amount_match = re.search(r'(\d+(?:,\d+)?)\s*บาท', message)
+            amount_match = _AMOUNT_BAHT.search(message)
             if amount_match:
                 result['entities']['amount'] = float(amount_match.group(1).replace(',', ''))
-            result['entities']['type'] = 'income' if any(x in message_lower for x in ['รับ', 'เงินเดือน', 'ได้']) else 'expense'
+            result['entities']['type'] = 'income' if any(x in hits for x in ['รับ', 'เงินเดือน', 'ได้']) else 'expense'
             # Extract note (words before บาท)
-            note_match = re.match(r'^(.+?)\s*\d+', message)
+            note_match = _NOTE_BEFORE_AMOUNT.match(message)
             if note_match:
                 result['entities']['note'] = note_match.group(1).strip()
         
@@ -515,14 +649,20 @@ class GeminiNLPService:
             return "กรุณาระบุ:\n" + "\n".join([f"• {q}" for q in questions])
         return None
 
-    def suggest_category(self, note: str, categories: list, history: list = None) -> dict:
+    def suggest_category(self, note: str, categories: list, history: list = None,
+                         index: CategoryIndex = None, classifier=None) -> dict:
         """
         Smart Auto-Categorization using AI
         
+        The project's local classifier answers first; Gemini is only asked
+        when the local confidence is below classifier.min_confidence.
+        
         Args:
             note: Transaction note/description
             categories: List of available categories with id, name, icon
             history: Optional list of past transactions for learning
+            index: Optional project CategoryIndex for the rule-based fallback
+            classifier: Optional project NaiveBayesCategorizer
             
         Returns:
             dict: {
@@ -532,8 +672,12 @@ class GeminiNLPService:
                 "reason": "รายการนี้เกี่ยวกับอาหาร"
             }
         """
+        learned = self._learned_categorize(note, categories, classifier)
+        if learned and learned['confidence'] >= classifier.min_confidence:
+            return learned
+        
         if not self.is_available():
-            return self._rule_based_categorize(note, categories)
+            return self._best_local(learned, self._rule_based_categorize(note, categories, index))
         
         try:
             # Build category list for prompt
@@ -561,15 +705,7 @@ class GeminiNLPService:
 ตอบเป็น JSON:
 {{"category_id": "xxx", "category_name": "xxx", "confidence": 0.0-1.0, "reason": "เหตุผลสั้นๆ"}}"""
             
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.1,
-                    'max_output_tokens': 200,
-                }
-            )
-            
-            text = response.text.strip()
+            text = self._generate(prompt, temperature=0.1, max_output_tokens=200)
             
             # Extract JSON
             if '```json' in text:
@@ -584,59 +720,66 @@ class GeminiNLPService:
             if result.get('category_id') in valid_ids:
                 return result
             else:
-                return self._rule_based_categorize(note, categories)
+                return self._best_local(learned, self._rule_based_categorize(note, categories, index))
             
         except Exception as e:
             print(f"Gemini categorization error: {e}")
-            return self._rule_based_categorize(note, categories)
+            return self._best_local(learned, self._rule_based_categorize(note, categories, index))
     
-    def _rule_based_categorize(self, note: str, categories: list) -> dict:
-        """Fallback rule-based categorization"""
-        note_lower = note.lower()
-        
-        # Category keywords mapping
-        keywords_map = {
-            'อาหาร': ['กิน', 'ข้าว', 'อาหาร', 'กาแฟ', 'ชา', 'เครื่องดื่ม', 'ร้านอาหาร', 'อร่อย', 'มื้อ', 'breakfast', 'lunch', 'dinner', 'food'],
-            'เดินทาง': ['รถ', 'taxi', 'grab', 'น้ำมัน', 'เดินทาง', 'ค่าเดินทาง', 'bts', 'mrt', 'ตั๋ว', 'ค่าทางด่วน'],
-            'ช้อปปิ้ง': ['ซื้อ', 'ช้อป', 'shopping', 'lazada', 'shopee', 'เสื้อผ้า', 'รองเท้า'],
-            'ความบันเทิง': ['หนัง', 'netflix', 'spotify', 'game', 'เกม', 'ดูหนัง', 'คอนเสิร์ต'],
-            'สุขภาพ': ['หมอ', 'ยา', 'โรงพยาบาล', 'คลินิก', 'ฟิตเนส', 'gym', 'สุขภาพ'],
-            'ค่าใช้จ่าย': ['ค่าเช่า', 'ค่าน้ำ', 'ค่าไฟ', 'อินเทอร์เน็ต', 'โทรศัพท์', 'ค่าบ้าน'],
-            'การศึกษา': ['เรียน', 'คอร์ส', 'หนังสือ', 'udemy', 'course'],
-            'สังคม': ['งานแต่ง', 'บวช', 'ซอง', 'ของขวัญ', 'gift'],
-            'เงินเดือน': ['เงินเดือน', 'salary', 'bonus', 'โบนัส'],
-            'รายได้เสริม': ['freelance', 'ขาย', 'รายได้', 'ปันผล']
+    def _learned_categorize(self, note: str, categories: list, classifier) -> dict:
+        """Prediction of the project's local classifier, or None when it has no answer"""
+        if classifier is None:
+            return None
+        names = {c['id']: c.get('name_th', c.get('name', '')) for c in categories}
+        category_id, confidence = classifier.predict(note, ids=names.keys())
+        if category_id is None:
+            return None
+        return {
+            "category_id": category_id,
+            "category_name": names[category_id],
+            "confidence": round(confidence, 4),
+            "reason": "จัดหมวดหมู่จากประวัติการบันทึก"
         }
+    
+    @staticmethod
+    def _best_local(learned: dict, rule_based: dict) -> dict:
+        """The more confident of the classifier and rule-based suggestions"""
+        if learned and learned['confidence'] > rule_based['confidence']:
+            return learned
+        return rule_based
+    
+    def _rule_based_categorize(self, note: str, categories: list, index: CategoryIndex = None) -> dict:
+        """
+        Fallback rule-based categorization
+
+        Args:
+            note: Transaction note
+            categories: Candidate categories (dicts with id, name_th, type)
+            index: Optional prebuilt project CategoryIndex (adds learned synonyms);
+                   a throwaway index over categories is built otherwise
+        """
+        if index is None:
+            key = tuple((c['id'], c.get('name_th', c.get('name', '')), c.get('type')) for c in categories)
+            index = self.category_indexes.get(key)
+            if index is MISS:
+                index = CategoryIndex(categories)
+                self.category_indexes.set(key, index)
+        allowed = {c['id'] for c in categories}
         
-        best_match = None
-        best_score = 0
-        
-        for cat in categories:
-            cat_name = cat.get('name_th', cat.get('name', '')).lower()
-            score = 0
-            
-            # Check if category name in note
-            if cat_name in note_lower:
-                score = 0.9
-            
-            # Check keywords
-            for kw_cat, keywords in keywords_map.items():
-                if kw_cat.lower() in cat_name:
-                    for kw in keywords:
-                        if kw in note_lower:
-                            score = max(score, 0.7)
-                            break
-            
-            if score > best_score:
-                best_score = score
-                best_match = cat
+        # Category name in the note, learned synonym, or alias keyword (single pass each)
+        entry, score, source = index.match_text(note, ids=allowed)
         
-        if best_match and best_score > 0:
+        if entry:
+            reasons = {
+                'name': "จัดหมวดหมู่ด้วย keyword matching",
+                'learned': "จัดหมวดหมู่จากประวัติการบันทึก",
+                'alias': "จัดหมวดหมู่ด้วย keyword matching"
+            }
             return {
-                "category_id": best_match['id'],
-                "category_name": best_match.get('name_th', best_match.get('name', '')),
-                "confidence": best_score,
-                "reason": "จัดหมวดหมู่ด้วย keyword matching"
+                "category_id": entry.id,
+                "category_name": entry.name_th,
+                "confidence": score,
+                "reason": reasons[source]
             }
         
         # Return first expense category as default
@@ -678,24 +821,57 @@ class GeminiNLPService:
             return self._basic_insights(summary_data, spending_data)
         
         try:
-            # Build context
-            income = summary_data.get('income', {}).get('formatted', 0)
-            expense = summary_data.get('expense', {}).get('formatted', 0)
-            balance = summary_data.get('balance', {}).get('formatted', 0)
+            prompt = self._financial_insights_prompt(summary_data, spending_data, goals_data)
+            return self._extract_json(self._generate(prompt, temperature=0.7, max_output_tokens=800))
             
-            top_spending = "\n".join([
-                f"- {s.get('category_name', 'ไม่ระบุ')}: ฿{s.get('formatted', 0):,.0f} ({s.get('percentage', 0):.1f}%)"
-                for s in spending_data[:5]
+        except Exception as e:
+            print(f"Gemini insights error: {e}")
+            # Flagged so callers do not memoize a transient failure
+            return dict(self._basic_insights(summary_data, spending_data), fallback=True)
+    
+    def stream_financial_insights(self, summary_data: dict, spending_data: list, goals_data: list = None):
+        """
+        Streaming variant of generate_financial_insights()
+        
+        Yields:
+            ('token', text) for every chunk Gemini produces, then exactly one
+            ('done', insights dict) (rule-based, flagged fallback, on errors)
+        """
+        if not self.is_available():
+            yield 'done', self._basic_insights(summary_data, spending_data)
+            return
+        
+        chunks = []
+        try:
+            prompt = self._financial_insights_prompt(summary_data, spending_data, goals_data)
+            for text in self._generate_stream(prompt, temperature=0.7, max_output_tokens=800):
+                chunks.append(text)
+                yield 'token', text
+            result = self._extract_json(''.join(chunks))
+        except Exception as e:
+            print(f"Gemini insights stream error: {e}")
+            result = dict(self._basic_insights(summary_data, spending_data), fallback=True)
+        yield 'done', result
+    
+    def _financial_insights_prompt(self, summary_data: dict, spending_data: list, goals_data: list = None) -> str:
+        # Build context
+        income = summary_data.get('income', {}).get('formatted', 0)
+        expense = summary_data.get('expense', {}).get('formatted', 0)
+        balance = summary_data.get('balance', {}).get('formatted', 0)
+        
+        top_spending = "\n".join([
+            f"- {s.get('category_name', 'ไม่ระบุ')}: ฿{s.get('formatted', 0):,.0f} ({s.get('percentage', 0):.1f}%)"
+            for s in spending_data[:5]
+        ])
+        
+        goals_context = ""
+        if goals_data:
+            goals_context = "\n\nเป้าหมายการออม:\n" + "\n".join([
+                f"- {g.get('name', '')}: {g.get('progress', 0):.0f}% (฿{g.get('current', 0):,.0f}/฿{g.get('target', 0):,.0f})"
+                for g in goals_data[:3]
             ])
-            
-            goals_context = ""
-            if goals_data:
-                goals_context = "\n\nเป้าหมายการออม:\n" + "\n".join([
-                    f"- {g.get('name', '')}: {g.get('progress', 0):.0f}% (฿{g.get('current', 0):,.0f}/฿{g.get('target', 0):,.0f})"
-                    for g in goals_data[:3]
-                ])
-            
-            prompt = f"""คุณเป็น AI Financial Coach ช่วยวิเคราะห์การเงินและให้คำแนะนำ
+        
+        prompt = f"""คุณเป็น AI Financial Coach ช่วยวิเคราะห์การเงินและให้คำแนะนำ
 
 สรุปเดือนนี้:
 - รายรับ: ฿{income:,.0f}
@@ -715,28 +891,17 @@ class GeminiNLPService:
   "motivational_message": "ข้อความให้กำลังใจ 1 ประโยค",
   "spending_analysis": "วิเคราะห์รูปแบบการใช้จ่ายสั้นๆ 2-3 ประโยค"
 }}"""
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'max_output_tokens': 800,
-                }
-            )
-            
-            text = response.text.strip()
-            
-            # Extract JSON
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            return json.loads(text)
-            
-        except Exception as e:
-            print(f"Gemini insights error: {e}")
-            return self._basic_insights(summary_data, spending_data)
+        return prompt
+    
+    @staticmethod
+    def _extract_json(text: str):
+        """Parse a JSON answer, tolerating ```json fences around it"""
+        text = text.strip()
+        if '```json' in text:
+            text = text.split('```json')[1].split('```')[0].strip()
+        elif '```' in text:
+            text = text.split('```')[1].split('```')[0].strip()
+        return json.loads(text)
     
     def _basic_insights(self, summary_data: dict, spending_data: list) -> dict:
         """Fallback basic insights without AI"""
@@ -0,0 +1,239 @@
+"""
+HTTP Client
+Shared outbound HTTP layer: pooled keep-alive connections, per-host
+concurrency limits, jittered retries and a per-host circuit breaker
+"""
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Status codes worth retrying (rate limiting and transient upstream errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Rate limiting is per caller (API key / channel token), not a sign the host is down:
+# it is retried after Retry-After but never counts toward the shared circuit breaker
+THROTTLE_STATUS = 429
+
+# Methods that can be resent after the server may have acted on them
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without touching the network while a host's circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one host"""
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """True when a request may go out (one trial request while half-open)"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def _never_sent(error):
+    """True when a request failed before reaching the server (safe to resend any method)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+    return False
+
+
+class HttpClient:
+    """
+    Pooled HTTP client shared by Botpress, LINE and AI provider calls
+
+    A single requests.Session keeps TLS connections alive between calls,
+    so chat round trips stop paying a handshake per request.
+    """
+
+    def __init__(self, pool_maxsize=20, host_concurrency=10, max_retries=2,
+                 backoff_base=0.3, backoff_max=5.0, breaker_threshold=5, breaker_cooldown=30):
+        self.pool_maxsize = pool_maxsize
+        self.host_concurrency = host_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self.session = self._build_session()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.pool_maxsize = app.config.get('HTTP_POOL_MAXSIZE', self.pool_maxsize)
+        self.host_concurrency = app.config.get('HTTP_HOST_CONCURRENCY', self.host_concurrency)
+        self.max_retries = app.config.get('HTTP_MAX_RETRIES', self.max_retries)
+        self.breaker_threshold = app.config.get('HTTP_BREAKER_THRESHOLD', self.breaker_threshold)
+        self.breaker_cooldown = app.config.get('HTTP_BREAKER_COOLDOWN', self.breaker_cooldown)
+        with self._lock:
+            self._hosts = {}
+        self.session.close()
+        self.session = self._build_session()
+        app.extensions['http_client'] = self
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                entry = {
+                    'semaphore': threading.BoundedSemaphore(self.host_concurrency),
+                    'breaker': CircuitBreaker(self.breaker_threshold, self.breaker_cooldown),
+                    'requests': 0,
+                    'retries': 0,
+                    'rejected': 0
+                }
+                self._hosts[host] = entry
+            return host, entry
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff (honours Retry-After when given)"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, retries=None, timeout=10, idempotent=None, **kwargs):
+        """
+        Send a request through the shared pool
+
+        Non-idempotent requests (POST, PATCH) are only retried when the
+        connection could not be made or the server answered 429, never
+        after a read timeout or a 5xx, since the server may already have
+        acted on them. A 429 does not trip the host's circuit breaker.
+
+        Args:
+            method: HTTP method
+            url: Absolute URL
+            retries: Retry budget for connection errors / retryable statuses
+                (default: client max_retries, 0 disables)
+            timeout: Seconds (or (connect, read) tuple)
+            idempotent: Override the method-based default (e.g. True for a
+                POST carrying an idempotency key)
+            **kwargs: Passed to requests.Session.request
+
+        Returns:
+            requests.Response (the last one when retries are exhausted)
+
+        Raises:
+            CircuitOpenError: Host circuit is open
+            requests.RequestException: Network error after all retries
+        """
+        retries = self.max_retries if retries is None else retries
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        host, entry = self._host(url)
+        breaker = entry['breaker']
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                entry['rejected'] += 1
+                raise CircuitOpenError(f"Circuit open for {host}")
+
+            entry['requests'] += 1
+            try:
+                with entry['semaphore']:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                breaker.record_failure()
+                if attempt >= retries or not (idempotent or _never_sent(e)):
+                    raise
+                entry['retries'] += 1
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code == THROTTLE_STATUS:
+                breaker.record_success()
+                if attempt < retries:
+                    entry['retries'] += 1
+                    time.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+                    attempt += 1
+                    continue
+            elif response.status_code in RETRY_STATUSES:
+                breaker.record_failure()
+                if attempt < retries and idempotent:
+                    entry['retries'] += 1
+                    time.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+                    attempt += 1
+                    continue
+            else:
+                breaker.record_success()
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """Per-host counters and circuit state"""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            host: {
+                'requests': entry['requests'],
+                'retries': entry['retries'],
+                'rejected': entry['rejected'],
+                'circuit': entry['breaker'].state,
+                'consecutive_failures': entry['breaker'].failures
+            }
+            for host, entry in hosts.items()
+        }
+
+
+http_client = HttpClient()
@@ -0,0 +1,437 @@
+"""
+Import Service - Bulk transaction import from CSV/JSON (app exports, bank statements)
+"""
+import csv
+import io
+import json
+import re
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert, tuple_
+from app import db
+from app.models.transaction import Transaction
+from app.services.rollup_service import RollupService, _bucket
+from app.services.data_version import bump_data_versions
+from app.utils.helpers import generate_id
+
+
+# Rows validated, deduplicated and inserted per DB transaction
+IMPORT_CHUNK_SIZE = 1000
+
+# Keys per IN (...) query when looking for already imported rows
+DEDUPE_QUERY_SIZE = 500
+
+# Row errors kept in the report (the count is always exact)
+MAX_REPORTED_ERRORS = 100
+
+# Key of the placeholder record iter_records yields for an unreadable item
+INVALID_RECORD = '_invalid'
+
+# Accepted column names per field (casefolded); covers our own CSV exports
+COLUMN_ALIASES = {
+    'occurred_at': ('occurred_at', 'date', 'datetime', 'transaction date', 'วันที่', 'วันที่เวลา', 'วันที่ทำรายการ'),
+    'time': ('time', 'เวลา'),
+    'type': ('type', 'ประเภท'),
+    'category_id': ('category_id',),
+    'category': ('category', 'category_name', 'หมวดหมู่'),
+    'note': ('note', 'description', 'memo', 'details', 'รายละเอียด', 'หมายเหตุ', 'รายการ'),
+    'amount': ('amount', 'จำนวนเงิน', 'จำนวนเงิน (บาท)'),
+    'withdrawal': ('withdrawal', 'debit', 'ถอน', 'ถอนเงิน', 'เงินออก'),
+    'deposit': ('deposit', 'credit', 'ฝาก', 'ฝากเงิน', 'เงินเข้า'),
+}
+
+TYPE_ALIASES = {
+    'income': 'income', 'รายรับ': 'income', 'รับ': 'income',
+    'expense': 'expense', 'รายจ่าย': 'expense', 'จ่าย': 'expense',
+}
+
+DATE_FORMATS = (
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%d-%m-%Y %H:%M', '%d-%m-%Y', '%Y/%m/%d %H:%M', '%Y/%m/%d',
+)
+
+_AMOUNT_NOISE = re.compile(r'[,\s฿]|บาท|THB', re.IGNORECASE)
+
+
+def _column_map(fieldnames):
+    """Map each known field to the source column that holds it"""
+    columns = {}
+    for name in fieldnames or ():
+        key = (name or '').strip().lstrip('﻿').casefold()
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in columns:
+                columns[field] = name
+    return columns
+
+
+def parse_datetime(value, time_value=None):
+    """
+    Parse an import date (ISO, dd/mm/yyyy, Buddhist-era years) to a naive datetime
+
+    Raises:
+        ValueError: If the value is not a recognised date
+    """
+    text = str(value or '').strip()
+    if time_value:
+        text = f"{text} {str(time_value).strip()}"
+    if not text:
+        raise ValueError("Missing date")
+    try:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Invalid date: {text}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None)
+    if parsed.year > 2400:  # Thai statements print Buddhist-era years
+        parsed = parsed.replace(year=parsed.year - 543)
+    return parsed
+
+
+def parse_amount(value):
+    """
+    Parse a baht amount ("1,250.50", "-80", 99.5) to signed satang
+
+    Raises:
+        ValueError: If the value is not a number
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        baht = Decimal(str(value))
+    else:
+        text = _AMOUNT_NOISE.sub('', str(value or ''))
+        if text.startswith('(') and text.endswith(')'):  # accounting negative
+            text = '-' + text[1:-1]
+        try:
+            baht = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {value}")
+    return int((baht * 100).to_integral_value())
+
+
+def dedupe_key(occurred_at, amount, note):
+    """Identity of an imported row: (occurred_at, amount, note)"""
+    return occurred_at, amount, (note or '').strip()
+
+
+class ImportService:
+    """Service for bulk importing transactions"""
+
+    @staticmethod
+    def detect_format(filename=None, content_type=None):
+        """'csv', 'json' or 'jsonl' from a file name or content type (default csv)"""
+        name = (filename or '').lower()
+        content_type = (content_type or '').lower()
+        if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+            return 'jsonl'
+        if name.endswith('.json') or 'json' in content_type:
+            return 'json'
+        return 'csv'
+
+    @staticmethod
+    def iter_records(stream, format='csv'):
+        """
+        Stream source records as dicts keyed by our field names
+
+        CSV and JSON Lines are read row by row. A JSON document (a list, or
+        an object with a "transactions" list) is parsed whole, as the
+        standard library has no incremental JSON parser. A JSON Lines line
+        that does not parse, or an item that is not an object, yields
+        {INVALID_RECORD: reason} so it is reported as one invalid row.
+
+        Args:
+            stream: Binary or text file object
+            format: 'csv', 'json' or 'jsonl'
+
+        Yields:
+            dict with any of occurred_at, time, type, category_id, category,
+            note, amount, withdrawal, deposit
+
+        Raises:
+            ValueError: If a JSON document is not a list or an object with a
+                        "transactions" list
+        """
+        if not isinstance(stream, io.TextIOBase):
+            stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+        if format == 'csv':
+            reader = csv.DictReader(stream)
+            columns = _column_map(reader.fieldnames)
+            for row in reader:
+                yield {field: row.get(column) for field, column in columns.items()}
+            return
+
+        if format == 'jsonl':
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    yield {INVALID_RECORD: f"Invalid JSON: {e}"}
+                    continue
+                yield ImportService._map_item(item)
+            return
+
+        document = json.load(stream)
+        items = document.get('transactions') if isinstance(document, dict) else document
+        if not isinstance(items, list):
+            raise ValueError('expected a list of transactions or an object with a "transactions" list')
+        for item in items:
+            yield ImportService._map_item(item)
+
+    @staticmethod
+    def _map_item(item):
+        """Record from one JSON item (an invalid placeholder when it is not an object)"""
+        if not isinstance(item, dict):
+            return {INVALID_RECORD: 'Record is not an object'}
+        columns = _column_map(item.keys())
+        return {field: item.get(column) for field, column in columns.items()}
+
+    @staticmethod
+    def _resolve_category(record, type, index, classifier, note, memo):
+        """Category entry for a record: explicit ID, name, learned from note, then type default"""
+        category_id = str(record.get('category_id') or '').strip()
+        if category_id:
+            entry = index.get(category_id)
+            if entry is None:
+                raise ValueError(f"Unknown category_id: {category_id}")
+            return entry, 'id'
+
+        name = str(record.get('category') or '').strip()
+        if name:
+            key = (name, type)
+            if key not in memo:
+                memo[key] = index.lookup(name, type)
+            if memo[key] is not None:
+                return memo[key], 'name'
+            named = index.lookup(name, aliases=False) if type else None
+            if named is not None:
+                raise ValueError(f"Category type mismatch: {name} is {named.type}, transaction is {type}")
+
+        if note and classifier is not None:
+            ids_key = ('ids', type)
+            if ids_key not in memo:
+                memo[ids_key] = {e.id for e in index.entries if e.is_active and (type is None or e.type == type)}
+            predicted, confidence = classifier.predict(note, memo[ids_key])
+            if predicted is not None and confidence >= classifier.min_confidence:
+                return index.get(predicted), 'learned'
+
+        entry = index.default_for_type(type or 'expense')
+        if entry is None:
+            raise ValueError(f"No {type or 'expense'} category in this project")
+        return entry, 'default'
+
+    @staticmethod
+    def _parse_record(project_id, record, index, classifier, memo):
+        """
+        Validate one record into transaction column values
+
+        Raises:
+            ValueError: If the record cannot be imported
+        """
+        if INVALID_RECORD in record:
+            raise ValueError(record[INVALID_RECORD])
+        occurred_at = parse_datetime(record.get('occurred_at'), record.get('time'))
+
+        type = None
+        raw_type = str(record.get('type') or '').strip().casefold()
+        if raw_type:
+            type = TYPE_ALIASES.get(raw_type)
+            if type is None:
+                raise ValueError(f"Invalid type: {record.get('type')}")
+
+        withdrawal, deposit = record.get('withdrawal'), record.get('deposit')
+        if record.get('amount') not in (None, ''):
+            amount = parse_amount(record['amount'])
+            if type is None and amount < 0:
+                type = 'expense'
+        elif withdrawal not in (None, '') and parse_amount(withdrawal):
+            amount, type = -abs(parse_amount(withdrawal)), type or 'expense'
+        elif deposit not in (None, '') and parse_amount(deposit):
+            amount, type = abs(parse_amount(deposit)), type or 'income'
+        else:
+            raise ValueError("Missing amount")
+        amount = abs(amount)
+        if amount == 0:
+            raise ValueError("Amount must be greater than 0")
+
+        note = str(record.get('note') or '').strip() or None
+
+        entry, source = ImportService._resolve_category(record, type, index, classifier, note, memo)
+        if type is None:
+            type = entry.type
+        elif entry.type != type:
+            raise ValueError(f"Category type mismatch: category is {entry.type}, transaction is {type}")
+
+        return {
+            'project_id': project_id,
+            'member_id': None,
+            'type': type,
+            'category_id': entry.id,
+            'amount': amount,
+            'currency': 'THB',
+            'occurred_at': occurred_at,
+            'note': note,
+            'recurring_rule_id': None,
+            'deleted_at': None
+        }, source
+
+    @staticmethod
+    def _existing_counts(project_id, keys):
+        """How many live rows already carry each dedupe key"""
+        counts = {}
+        pairs = sorted({(occurred_at, amount) for occurred_at, amount, _ in keys})
+        for i in range(0, len(pairs), DEDUPE_QUERY_SIZE):
+            chunk = pairs[i:i + DEDUPE_QUERY_SIZE]
+            rows = db.session.query(
+                Transaction.occurred_at, Transaction.amount, Transaction.note
+            ).filter(
+                Transaction.project_id == project_id,
+                Transaction.deleted_at.is_(None),
+                tuple_(Transaction.occurred_at, Transaction.amount).in_(chunk)
+            )
+            for occurred_at, amount, note in rows:
+                key = dedupe_key(occurred_at, amount, note)
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    @staticmethod
+    def import_transactions(project_id, user_id, records, chunk_size=IMPORT_CHUNK_SIZE,
+                            dry_run=False, progress=None):
+        """
+        Validate, deduplicate and bulk insert transactions
+
+        Each chunk is one DB transaction: a multi-row INSERT (executemany)
+        plus the matching rollup deltas. A row is a duplicate when the
+        project already holds a live transaction with the same (occurred_at,
+        amount, note); repeats inside the file are kept up to the number of
+        times they occur, so re-running an import (or resuming one that
+        failed half way) never doubles rows.
+
+        Args:
+            project_id: Project ID
+            user_id: User ID for the permission check (None for trusted
+                     callers such as the CLI)
+            records: Iterable of records (see iter_records)
+            chunk_size: Rows per DB transaction
+            dry_run: Validate and count without writing
+            progress: Optional callable(report) invoked after every chunk
+
+        Returns:
+            dict: Report (processed, inserted, duplicates, invalid, categorized,
+                  chunks, errors, aborted, elapsed_ms, rows_per_sec, dry_run);
+                  aborted says why reading stopped early, after rows were
+                  already processed (None when the whole input was read)
+
+        Raises:
+            PermissionError: If user doesn't have access
+            ValueError, UnicodeDecodeError, csv.Error: If the input is
+                unreadable before its first record
+        """
+        from app.services.transaction_service import TransactionService
+        from app.services.category_index import category_index
+        from app.services.category_classifier import category_classifier
+        from app.services.insight_precompute import insight_precompute
+
+        if user_id is not None and not TransactionService._check_project_access(project_id, user_id):
+            raise PermissionError("User doesn't have access to this project")
+
+        index = category_index.get(project_id)
+        classifier = category_classifier.get(project_id)
+        started = time.perf_counter()
+        report = {
+            'processed': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0,
+            'categorized': {'id': 0, 'name': 0, 'learned': 0, 'default': 0},
+            'chunks': 0, 'errors': [], 'aborted': None, 'dry_run': dry_run
+        }
+        memo = {}
+        seen = {}       # dedupe key -> occurrences in this file so far
+        inserted = {}   # dedupe key -> rows this import wrote
+
+        def flush(chunk):
+            existing = ImportService._existing_counts(project_id, [key for key, _ in chunk])
+            rows, deltas = [], {}
+            now = datetime.utcnow()
+            for key, row in chunk:
+                seen[key] = seen.get(key, 0) + 1
+                if seen[key] <= existing.get(key, 0) - inserted.get(key, 0):
+                    report['duplicates'] += 1
+                    continue
+                inserted[key] = inserted.get(key, 0) + 1
+                rows.append(dict(row, id=generate_id('txn'), created_at=now, updated_at=now))
+
+                # Core inserts bypass the ORM flush hook, so feed the rollups directly
+                bucket = _bucket(row)
+                if bucket:
+                    bucket_key, amount = bucket
+                    total, count = deltas.get(bucket_key, (0, 0))
+                    deltas[bucket_key] = (total + amount, count + 1)
+
+            if rows and not dry_run:
+                try:
+                    connection = db.session.connection()
+                    connection.execute(insert(Transaction.__table__), rows)
+                    if deltas:
+                        RollupService.apply_deltas(connection, deltas)
+                    bump_data_versions(connection, (project_id,))
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+            report['inserted'] += len(rows)
+            report['chunks'] += 1
+            report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            if progress:
+                progress(report)
+
+        chunk = []
+        records = iter(records)
+        number = 0
+        try:
+            while True:
+                try:
+                    record = next(records)
+                except StopIteration:
+                    break
+                except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                    # Earlier chunks are committed: report them rather than failing the import
+                    if not report['processed']:
+                        raise
+                    report['aborted'] = f"Unreadable input after row {number}: {e}"
+                    break
+                number += 1
+                report['processed'] += 1
+                try:
+                    row, source = ImportService._parse_record(project_id, record, index, classifier, memo)
+                except ValueError as e:
+                    report['invalid'] += 1
+                    if len(report['errors']) < MAX_REPORTED_ERRORS:
+                        report['errors'].append({'row': number, 'error': str(e)})
+                    continue
+                report['categorized'][source] += 1
+                chunk.append((dedupe_key(row['occurred_at'], row['amount'], row['note']), row))
+                if len(chunk) >= chunk_size:
+                    flush(chunk)
+                    chunk = []
+            if chunk:
+                flush(chunk)
+        finally:
+            # Core writes are invisible to the commit listeners as well
+            if report['inserted'] and not dry_run:
+                from app.services.cache_service import analytics_cache
+                analytics_cache.invalidate_project(project_id)
+                category_index.invalidate_project(project_id)
+                category_classifier.invalidate_project(project_id)
+                insight_precompute.schedule(project_id)
+
+        elapsed = time.perf_counter() - started
+        report['elapsed_ms'] = round(elapsed * 1000, 1)
+        report['rows_per_sec'] = round(report['processed'] / elapsed) if elapsed else 0
+        return report
@@ -12,6 +12,12 @@ def initialize_database():
     db.create_all()
     print("Database tables created successfully!")
 
+    # Backfill monthly rollups the first time the table appears
+    from app.services.rollup_service import RollupService
+    if RollupService.needs_backfill():
+        count = RollupService.rebuild()
+        print(f"Monthly rollups backfilled ({count} rows)")
+
 
 def create_admin_user():
     """Create admin user (for testing)"""
@@ -0,0 +1,623 @@
+"""
+Insight Precompute
+Regenerates per-project insights in the background after data changes and
+persists them to the insight table, so dashboard reads return stored
+results instead of waiting on aggregates and the LLM
+"""
+import json
+import time
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from app import db
+from app.services.data_version import ai_memo, get_data_version
+
+SOURCE = 'precompute'
+
+InsightJob = namedtuple('InsightJob', 'name build defaults llm prompt_version cache_if')
+
+
+# ============================================================
+# BUILDERS (one stored output each)
+# ============================================================
+
+def build_insights_all(project_id, month, days_ahead, day):
+    """Rule-based alerts, trends, reminders and recommendations (reminders count days from `day`)"""
+    from app.services.insights_service import InsightsService
+    return {
+        'alerts': InsightsService.get_budget_alerts(project_id, month),
+        'trends': InsightsService.get_spending_trends(project_id),
+        'reminders': InsightsService.get_recurring_reminders(project_id, days_ahead),
+        'recommendations': InsightsService.get_smart_recommendations(project_id, month)
+    }
+
+
+def financial_coach_inputs(project_id, month):
+    """(summary, spending_data, goals_data) the financial coach prompt is built from"""
+    from app.services.analytics_service import AnalyticsService
+    from app.models.savings_goal import SavingsGoal
+
+    summary = AnalyticsService.get_monthly_summary(project_id, month)
+    category_data = AnalyticsService.get_category_breakdown(project_id, month, 'expense')
+    spending_data = category_data.get('categories', [])
+
+    goals = SavingsGoal.query.filter_by(
+        project_id=project_id,
+        is_active=True
+    ).all()
+
+    goals_data = []
+    for g in goals:
+        progress_pct = (g.current_amount / g.target_amount * 100) if g.target_amount > 0 else 0
+        goals_data.append({
+            'name': g.name,
+            'current': g.current_amount / 100,  # satang to baht
+            'target': g.target_amount / 100,
+            'progress': progress_pct
+        })
+    return summary.get('summary', {}), spending_data, goals_data
+
+
+def build_financial_coach(project_id, month):
+    """Monthly summary, category breakdown and goals, explained by the LLM"""
+    from app.services.gemini_nlp_service import gemini_nlp
+
+    summary, spending_data, goals_data = financial_coach_inputs(project_id, month)
+    insights = gemini_nlp.generate_financial_insights(summary, spending_data, goals_data)
+    return {'coach': insights, 'summary': summary}
+
+
+def build_weekly_summary(project_id, day):
+    """Last 7 days: totals, daily breakdown, top categories and LLM insights"""
+    from app.services.gemini_nlp_service import gemini_nlp
+    from app.models.transaction import Transaction
+    from app.utils.helpers import satang_to_baht
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=7)
+
+    transactions = Transaction.query.filter(
+        Transaction.project_id == project_id,
+        Transaction.occurred_at >= start_date,
+        Transaction.occurred_at <= end_date,
+        Transaction.deleted_at.is_(None)
+    ).all()
+
+    total_income = sum(t.amount for t in transactions if t.type == 'income')
+    total_expense = sum(t.amount for t in transactions if t.type == 'expense')
+
+    daily_data = {}
+    for t in transactions:
+        day_key = t.occurred_at.strftime('%Y-%m-%d')
+        if day_key not in daily_data:
+            daily_data[day_key] = {'income': 0, 'expense': 0}
+        if t.type == 'income':
+            daily_data[day_key]['income'] += t.amount
+        else:
+            daily_data[day_key]['expense'] += t.amount
+
+    category_totals = {}
+    for t in transactions:
+        if t.type == 'expense' and t.category:
+            cat_name = t.category.name_th
+            category_totals[cat_name] = category_totals.get(cat_name, 0) + t.amount
+
+    top_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:5]
+
+    summary_data = {
+        'income': {'formatted': satang_to_baht(total_income)},
+        'expense': {'formatted': satang_to_baht(total_expense)},
+        'balance': {'formatted': satang_to_baht(total_income - total_expense)}
+    }
+
+    spending_data = [
+        {
+            'category_name': cat,
+            'formatted': satang_to_baht(amount),
+            'percentage': (amount / total_expense * 100) if total_expense > 0 else 0
+        }
+        for cat, amount in top_categories
+    ]
+
+    insights = gemini_nlp.generate_financial_insights(summary_data, spending_data)
+
+    insights['period'] = {
+        'start': start_date.strftime('%Y-%m-%d'),
+        'end': end_date.strftime('%Y-%m-%d'),
+        'days': 7
+    }
+    insights['totals'] = {
+        'income': satang_to_baht(total_income),
+        'expense': satang_to_baht(total_expense),
+        'balance': satang_to_baht(total_income - total_expense),
+        'transaction_count': len(transactions)
+    }
+    insights['daily_breakdown'] = [
+        {
+            'date': day_key,
+            'income': satang_to_baht(data['income']),
+            'expense': satang_to_baht(data['expense'])
+        }
+        for day_key, data in sorted(daily_data.items())
+    ]
+    return insights
+
+
+def build_spending_patterns(project_id, days, day):
+    """LLM analysis of the last `days` days of transactions"""
+    from app.services.gemini_nlp_service import gemini_nlp
+    from app.models.transaction import Transaction
+
+    start_date = datetime.now() - timedelta(days=days)
+
+    transactions = Transaction.query.options(
+        joinedload(Transaction.category)
+    ).filter(
+        Transaction.project_id == project_id,
+        Transaction.created_at >= start_date
+    ).all()
+
+    tx_list = [{
+        "amount": tx.amount / 100,
+        "type": tx.type,
+        "category_name": tx.category.name_th if tx.category else "Other",
+        "date": tx.created_at.strftime("%Y-%m-%d")
+    } for tx in transactions]
+
+    return gemini_nlp.analyze_spending_patterns(tx_list, days)
+
+
+def build_auto_insights(project_id, month):
+    """Dashboard cards/alerts/tips for the current month"""
+    from app.services.gemini_nlp_service import gemini_nlp
+    from app.models.transaction import Transaction
+    from app.models.budget import Budget
+
+    start_of_month = datetime.strptime(month, '%Y-%m')
+
+    transactions = Transaction.query.options(
+        joinedload(Transaction.category)
+    ).filter(
+        Transaction.project_id == project_id,
+        Transaction.created_at >= start_of_month
+    ).all()
+
+    tx_list = [{
+        "amount": tx.amount / 100,
+        "type": tx.type,
+        "category_name": tx.category.name_th if tx.category else "Other",
+        "date": tx.created_at.strftime("%Y-%m-%d")
+    } for tx in transactions]
+
+    budgets = Budget.query.options(
+        joinedload(Budget.category)
+    ).filter_by(project_id=project_id).all()
+    budget_list = []
+    for b in budgets:
+        used_amount = sum(
+            tx.amount / 100 for tx in transactions
+            if tx.category_id == b.category_id and tx.type == 'expense'
+        )
+        budget_list.append({
+            "category": b.category.name_th if b.category else "Unknown",
+            "limit": b.limit_amount / 100,
+            "used": used_amount
+        })
+
+    return gemini_nlp.generate_auto_insights(tx_list, budget_list)
+
+
+def _this_month():
+    return datetime.now().strftime('%Y-%m')
+
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def _not_fallback(value):
+    # Rule-based fallbacks after an LLM error are served but never stored
+    coach = value.get('coach', value)
+    return not (isinstance(coach, dict) and coach.get('fallback'))
+
+
+JOBS = {job.name: job for job in (
+    InsightJob('insights_all', build_insights_all,
+               lambda: {'month': _this_month(), 'days_ahead': 7, 'day': _today()}, False, None, None),
+    InsightJob('financial_coach', build_financial_coach,
+               lambda: {'month': _this_month()}, True, 'financial_insights', _not_fallback),
+    InsightJob('weekly_summary', build_weekly_summary,
+               lambda: {'day': _today()}, True, 'financial_insights', _not_fallback),
+    InsightJob('spending_patterns', build_spending_patterns,
+               lambda: {'days': 30, 'day': _today()}, True, 'spending_patterns', None),
+    InsightJob('auto_insights', build_auto_insights,
+               lambda: {'month': _this_month()}, True, 'auto_insights', None),
+)}
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+class InsightPrecomputeRunner:
+    """
+    Debounced, coalesced background regeneration of stored insights
+
+    Commits that touch a project's data schedule it; the refresh runs
+    debounce seconds after the last write (but never later than max_delay
+    after the first one), so a burst of writes costs one regeneration.
+    A project is refreshed by one worker at a time: writes that land while
+    it runs mark it dirty and it is refreshed once more afterwards.
+
+    LLM jobs are only regenerated for projects read within active_window
+    seconds; for the others they wait until a read finds them stale.
+
+    Stored rows carry the data version they were computed from, so reads
+    can tell fresh results from stale ones (see read()).
+    """
+
+    # Read marks kept before expired ones are pruned
+    MAX_TRACKED_READS = 10000
+
+    def __init__(self, workers=2, llm_concurrency=2, debounce=5.0, max_delay=60.0, active_window=86400):
+        self.workers = workers
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.active_window = active_window
+        self.enabled = True
+        self.app = None
+        self.llm_slots = threading.BoundedSemaphore(llm_concurrency)
+        self.llm_concurrency = llm_concurrency
+        self._pending = {}          # project_id -> (due_at, deadline)
+        self._running = set()
+        self._dirty = set()
+        self._last_read = {}        # project_id -> monotonic time of the last read
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self.scheduled = 0
+        self.coalesced = 0
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+
+    def init_app(self, app):
+        """Configure from Flask app config and start the worker pool when enabled"""
+        self.app = app
+        self.enabled = app.config.get('INSIGHT_PRECOMPUTE_ENABLED', True)
+        self.workers = app.config.get('INSIGHT_PRECOMPUTE_WORKERS', self.workers)
+        self.debounce = app.config.get('INSIGHT_PRECOMPUTE_DEBOUNCE_SECONDS', self.debounce)
+        self.max_delay = app.config.get('INSIGHT_PRECOMPUTE_MAX_DELAY_SECONDS', self.max_delay)
+        self.active_window = app.config.get('INSIGHT_PRECOMPUTE_ACTIVE_SECONDS', self.active_window)
+        self.llm_concurrency = app.config.get('INSIGHT_LLM_MAX_CONCURRENCY', self.llm_concurrency)
+        self.llm_slots = threading.BoundedSemaphore(max(1, self.llm_concurrency))
+        app.extensions['insight_precompute'] = self
+
+        if self.enabled and app.config.get('BACKGROUND_WORKERS_AUTOSTART'):
+            self.start()
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'insight-precompute-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def schedule(self, project_id):
+        """Queue a refresh of a project (debounced; no-op without workers)"""
+        if not project_id or not self.running:
+            return
+        now = time.monotonic()
+        with self._cond:
+            self.scheduled += 1
+            if project_id in self._running:
+                self._dirty.add(project_id)
+                self.coalesced += 1
+                return
+            if project_id in self._pending:
+                deadline = self._pending[project_id][1]
+                self.coalesced += 1
+            else:
+                deadline = now + self.max_delay
+            self._pending[project_id] = (min(now + self.debounce, deadline), deadline)
+            self._cond.notify()
+
+    def _mark_read(self, project_id):
+        now = time.monotonic()
+        with self._cond:
+            self._last_read[project_id] = now
+            if len(self._last_read) > self.MAX_TRACKED_READS:
+                self._last_read = {pid: at for pid, at in self._last_read.items()
+                                   if now - at < self.active_window}
+
+    def recently_read(self, project_id):
+        """True when the project's insights were read within active_window"""
+        with self._cond:
+            read_at = self._last_read.get(project_id)
+        return read_at is not None and time.monotonic() - read_at < self.active_window
+
+    def _next_due(self):
+        """Claim the next due project, waiting until one is due; None on stop"""
+        with self._cond:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                due = [(due_at, pid) for pid, (due_at, _) in self._pending.items()]
+                if due:
+                    due_at, project_id = min(due)
+                    if due_at <= now:
+                        del self._pending[project_id]
+                        self._running.add(project_id)
+                        return project_id
+                    self._cond.wait(due_at - now)
+                else:
+                    self._cond.wait()
+        return None
+
+    def _worker_loop(self):
+        while True:
+            project_id = self._next_due()
+            if project_id is None:
+                return
+            try:
+                with self.app.app_context():
+                    try:
+                        self.refresh(project_id)
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Insight precompute error ({project_id}): {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(project_id)
+                    rerun = project_id in self._dirty
+                    self._dirty.discard(project_id)
+                if rerun:
+                    self.schedule(project_id)
+
+    def refresh(self, project_id):
+        """
+        Regenerate every stored output of a project that is not current
+
+        LLM outputs of a project nobody read lately are left stale
+        (deferred) until a read asks for them.
+
+        Returns:
+            dict: Report (refreshed, skipped, deferred, failed job names, elapsed_ms)
+        """
+        started = time.perf_counter()
+        report = {'project_id': project_id, 'refreshed': [], 'skipped': [], 'deferred': [], 'failed': []}
+        active = self.recently_read(project_id)
+        for job in JOBS.values():
+            if job.llm and not active:
+                report['deferred'].append(job.name)
+                continue
+            params = job.defaults()
+            version = get_data_version(project_id)
+            row = self._load(project_id, job.name, params)
+            if row is not None and self._meta(row).get('data_version') == version:
+                report['skipped'].append(job.name)
+                continue
+            try:
+                value = self._compute(project_id, job, params)
+                if job.cache_if is None or job.cache_if(value):
+                    self._save(project_id, job.name, params, value, version)
+                    db.session.commit()
+                report['refreshed'].append(job.name)
+            except Exception as e:
+                db.session.rollback()
+                report['failed'].append(job.name)
+                print(f"⚠️ Insight precompute {job.name} failed for {project_id}: {e}")
+
+        report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        self.runs += 1
+        self.last_run = report
+        if report['refreshed']:
+            print(f"💡 Insights precomputed for {project_id}: {', '.join(report['refreshed'])} "
+                  f"in {report['elapsed_ms']} ms")
+        return report
+
+    def read(self, project_id, name, params=None):
+        """
+        Stored output for a read endpoint, computed inline only when needed
+
+        A result stored for the current data version is returned as is. An
+        older one is returned too (flagged stale) while the workers
+        regenerate it; without workers it is recomputed inline. Only the
+        default parameters are stored, other values go through the memo.
+
+        Args:
+            project_id: Project ID
+            name: Job name (see JOBS)
+            params: Builder parameters (default: the job's defaults)
+
+        Returns:
+            tuple: (value, freshness dict)
+        """
+        job = JOBS[name]
+        params = params or job.defaults()
+        version = get_data_version(project_id)
+        self._mark_read(project_id)
+
+        stored = self.peek(project_id, name, params, version)
+        if stored is not None:
+            return stored
+
+        value = self._compute(project_id, job, params)
+        return value, self.store(project_id, name, params, value, version)
+
+    def peek(self, project_id, name, params, version=None):
+        """
+        (value, freshness) of the stored result if read() may serve it, else None
+
+        Never computes; streaming endpoints use it to answer from storage
+        before falling back to a live (streamed) generation.
+        """
+        if not self.enabled or params != JOBS[name].defaults():
+            return None
+        self._mark_read(project_id)
+        version = get_data_version(project_id) if version is None else version
+        row = self._load(project_id, name, params)
+        if row is None:
+            return None
+        stored_version = self._meta(row).get('data_version')
+        stale = stored_version != version
+        if stale and not self.running:
+            return None
+        if stale:
+            self.schedule(project_id)
+        return json.loads(row.content), self._freshness(row.created_at, stored_version, stale)
+
+    def store(self, project_id, name, params, value, version):
+        """
+        Persist a result computed outside the runner (default params only)
+
+        Returns:
+            dict: Freshness of the value
+        """
+        job = JOBS[name]
+        generated_at = datetime.utcnow()
+        if self.enabled and params == job.defaults() and (job.cache_if is None or job.cache_if(value)):
+            generated_at = self._save(project_id, name, params, value, version).created_at
+            db.session.commit()
+        return self._freshness(generated_at, version, False, live=True)
+
+    def _compute(self, project_id, job, params):
+        build = lambda: job.build(project_id, **params)
+        if not job.llm:
+            return build()
+        from app.services.gemini_nlp_service import gemini_nlp
+
+        def compute():
+            with self.llm_slots:
+                return build()
+
+        return ai_memo.get_or_compute(
+            project_id, job.name, gemini_nlp.PROMPT_VERSIONS[job.prompt_version], compute,
+            params=params, cache_if=job.cache_if
+        )
+
+    @staticmethod
+    def _key(params):
+        return json.dumps(params, sort_keys=True, default=str)
+
+    @staticmethod
+    def _meta(row):
+        try:
+            return json.loads(row.insight_metadata or '{}')
+        except ValueError:
+            return {}
+
+    @classmethod
+    def _load(cls, project_id, name, params):
+        from app.models.insight import Insight
+        return Insight.query.filter_by(
+            project_id=project_id,
+            insight_type=name,
+            source=SOURCE,
+            title=cls._key(params)
+        ).order_by(Insight.created_at.desc()).first()
+
+    @classmethod
+    def _save(cls, project_id, name, params, value, version):
+        """
+        Replace the stored row for (project, name); caller commits
+
+        Rows for earlier parameters (yesterday's day, last month) are
+        dropped too, so each project keeps one row per job.
+        """
+        from app.models.insight import Insight
+        key = cls._key(params)
+        Insight.query.filter_by(
+            project_id=project_id, insight_type=name, source=SOURCE
+        ).delete(synchronize_session=False)
+        row = Insight(
+            project_id=project_id,
+            insight_type=name,
+            title=key,
+            content=json.dumps(value, ensure_ascii=False, default=str),
+            insight_metadata=json.dumps({'data_version': version, 'params': params})
+        )
+        row.source = SOURCE
+        row.created_at = datetime.utcnow()
+        db.session.add(row)
+        return row
+
+    @staticmethod
+    def _freshness(generated_at, version, stale, live=False):
+        return {
+            'generated_at': generated_at.isoformat() if generated_at else None,
+            'age_seconds': round((datetime.utcnow() - generated_at).total_seconds(), 1) if generated_at else None,
+            'data_version': version,
+            'stale': stale,
+            'source': 'live' if live else 'stored'
+        }
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            pending = len(self._pending)
+            running = len(self._running)
+            active = sum(1 for at in self._last_read.values() if now - at < self.active_window)
+        return {
+            'enabled': self.enabled,
+            'workers': len(self._threads),
+            'llm_concurrency': self.llm_concurrency,
+            'debounce': self.debounce,
+            'pending': pending,
+            'running': running,
+            'scheduled': self.scheduled,
+            'coalesced': self.coalesced,
+            'active_projects': active,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_run': self.last_run
+        }
+
+
+insight_precompute = InsightPrecomputeRunner()
+
+
+def _collect_changed_projects(session, flush_context):
+    from app.services.data_version import _versioned_models
+    models = _versioned_models()
+    projects = session.info.setdefault('insight_precompute_projects', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models) and obj.project_id:
+            projects.add(obj.project_id)
+
+
+def _schedule_changed_projects(session):
+    for project_id in session.info.pop('insight_precompute_projects', ()):
+        insight_precompute.schedule(project_id)
+
+
+def _discard_changed_projects(session, previous_transaction):
+    session.info.pop('insight_precompute_projects', None)
+
+
+def register_listeners(db):
+    """Schedule a background refresh for every project a commit changed"""
+    from sqlalchemy import event
+
+    if event.contains(db.session, 'after_flush', _collect_changed_projects):
+        return
+    event.listen(db.session, 'after_flush', _collect_changed_projects)
+    event.listen(db.session, 'after_commit', _schedule_changed_projects)
+    event.listen(db.session, 'after_soft_rollback', _discard_changed_projects)
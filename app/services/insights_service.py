@@ -5,10 +5,10 @@ Smart insights, alerts, and recommendations for financial management
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, desc
 from app import db
-from app.models.budget import Budget
 from app.models.category import Category
 from app.models.transaction import Transaction
 from app.models.recurring import RecurringRule
+from app.services.budget_service import BudgetService
 from app.utils.helpers import satang_to_baht, get_month_range
 
 
@@ -53,30 +53,17 @@ class InsightsService:
         
         alerts = []
         
-        # Get all budgets for the month
-        budgets = Budget.query.filter_by(
-            project_id=project_id,
-            month_yyyymm=month_yyyymm
-        ).all()
-        
-        for budget in budgets:
-            # Get spending for this category
-            spent = db.session.query(
-                func.sum(Transaction.amount)
-            ).filter(
-                Transaction.project_id == project_id,
-                Transaction.category_id == budget.category_id,
-                Transaction.type == 'expense',
-                Transaction.occurred_at >= start_date,
-                Transaction.occurred_at < end_date,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
+        # Spending for all budgets of the month (one grouped query)
+        for status in BudgetService.get_budget_statuses(project_id, month_yyyymm):
+            budget = status['budget']
+            spent = status['spent']
             
             if budget.limit_amount == 0:
                 continue
                 
-            percentage = int((spent / budget.limit_amount) * 100)
-            remaining = budget.limit_amount - spent
+            percentage = int(status['usage'])
+            remaining = status['remaining']
+            category = status['category']
             
             alert = None
             
@@ -86,8 +73,8 @@ class InsightsService:
                     'type': 'error',
                     'icon': '🔴',
                     'title': 'เกินงบประมาณ!',
-                    'category': budget.category.name_th if budget.category else 'ไม่ระบุ',
-                    'category_icon': budget.category.icon if budget.category else '📁',
+                    'category': category.name_th if category else 'ไม่ระบุ',
+                    'category_icon': category.icon if category else '📁',
                     'message': f'ใช้ไปแล้ว {percentage}% เกินงบ ฿{satang_to_baht(abs(remaining)):,.0f}',
                     'percentage': percentage,
                     'spent': spent,
@@ -101,8 +88,8 @@ class InsightsService:
                     'type': 'warning',
                     'icon': '⚠️',
                     'title': 'ใกล้เกินงบ',
-                    'category': budget.category.name_th if budget.category else 'ไม่ระบุ',
-                    'category_icon': budget.category.icon if budget.category else '📁',
+                    'category': category.name_th if category else 'ไม่ระบุ',
+                    'category_icon': category.icon if category else '📁',
                     'message': f'ใช้ไป {percentage}% เหลือ ฿{satang_to_baht(remaining):,.0f} ({days_left} วัน)',
                     'percentage': percentage,
                     'spent': spent,
@@ -116,8 +103,8 @@ class InsightsService:
                     'type': 'info',
                     'icon': '💡',
                     'title': 'ควรระวัง',
-                    'category': budget.category.name_th if budget.category else 'ไม่ระบุ',
-                    'category_icon': budget.category.icon if budget.category else '📁',
+                    'category': category.name_th if category else 'ไม่ระบุ',
+                    'category_icon': category.icon if category else '📁',
                     'message': f'ใช้ไป {percentage}% เหลือ ฿{satang_to_baht(remaining):,.0f}',
                     'percentage': percentage,
                     'spent': spent,
@@ -0,0 +1,240 @@
+"""
+Intent Router
+Tiered intent parsing: deterministic keyword rules first, Gemini only
+when the rule result is not confident enough
+"""
+import os
+import re
+import time
+import random
+import threading
+from app.services.gemini_nlp_service import gemini_nlp
+
+# Read-only commands the keyword rules recognise reliably
+COMMAND_INTENTS = {
+    'get_summary', 'get_recurring', 'get_transactions', 'get_categories',
+    'get_goals', 'get_budget', 'get_help', 'get_web_link'
+}
+
+# Entities that identify the target of a mutation
+TARGET_ENTITIES = ('index', 'keyword', 'delete_latest', 'delete_all', 'category_name', 'goal_name', 'amount')
+
+# Intents that change or remove data, with the verbs that trigger them and
+# the entities that may name their target
+MUTATION_RULES = {
+    'pause_': (('หยุด', 'พัก', 'pause'), ('keyword',)),
+    'resume_': (('เปิด', 'เริ่ม', 'resume'), ('keyword',)),
+    'withdraw_': (('ถอนเงิน', 'ถอน', 'withdraw'), ('goal_name',)),
+    'delete_': (('ลบ', 'ยกเลิก', 'delete'), ('index', 'keyword', 'delete_latest', 'category_name', 'goal_name')),
+    'update_': (('แก้ไข', 'แก้', 'เปลี่ยน', 'อัพเดท', 'update'), ('index', 'keyword', 'category_name', 'goal_name')),
+}
+
+# Objects a verb may be written together with ("ลบรายการ", "แก้งบ") and still count as a word
+_COMMAND_NOUNS = ('รายการ', 'งบ', 'เป้าหมาย', 'เป้า', 'หมวดหมู่', 'หมวด', 'ประจำ', 'เงิน', 'ออม')
+
+# Score for mutations whose verb or target does not check out (below the default threshold)
+UNVERIFIED_MUTATION_SCORE = 0.5
+
+_QUESTION = re.compile(r'\?|ไหม|มั้ย|อะไร|ทำไม|ยังไง|อย่างไร|เท่าไร|เท่าไหร่|ควร')
+_NUMERIC = re.compile(r'[\d,.]+(?:บาท)?')
+_AMOUNT_LIKE = re.compile(r'\d{2,}')
+
+
+def _has_verb(message: str, verbs) -> bool:
+    """
+    True when one of the verbs is a word of its own
+
+    Thai is written without spaces, so a verb directly followed by a known
+    command noun ("ลบรายการที่ 1") counts as well; "ที่พัก" or
+    "เปิดบัญชี" do not.
+    """
+    for token in message.lower().split():
+        for verb in verbs:
+            if token == verb or (token.startswith(verb) and token[len(verb):].startswith(_COMMAND_NOUNS)):
+                return True
+    return False
+
+
+def _valid_target(name, value) -> bool:
+    if value in (None, '', False):
+        return False
+    if name == 'index':
+        return isinstance(value, int) and value > 0
+    if isinstance(value, str):
+        return not _NUMERIC.fullmatch(value.strip())
+    return True
+
+
+def _mutation_rule(intent):
+    for prefix, rule in MUTATION_RULES.items():
+        if intent.startswith(prefix):
+            return rule
+    return None
+
+
+def score_rule_parse(message: str, parsed: dict) -> float:
+    """
+    Confidence (0-1) that a rule-based parse is what the LLM would return
+
+    Mutations (pause, resume, withdraw, delete, update) stay below the
+    threshold unless their verb is a whole word and their target is a
+    name or index rather than a number picked up from an amount.
+
+    Args:
+        message: Raw user message
+        parsed: Result of GeminiNLPService._simple_parse
+
+    Returns:
+        float: Confidence score
+    """
+    intent = parsed.get('intent', 'general')
+    entities = parsed.get('entities') or {}
+    words = len(message.split())
+    is_question = bool(_QUESTION.search(message))
+
+    if intent == 'general':
+        return 0.0
+
+    if intent in COMMAND_INTENTS:
+        if _AMOUNT_LIKE.search(message):
+            # "ยอดขาย 5000" is a transaction, not a summary request
+            return UNVERIFIED_MUTATION_SCORE
+        score = 0.95 if words <= 3 else 0.8 if words <= 5 else 0.6
+        if intent == 'get_budget':
+            # "งบเท่าไหร่" is a budget question by construction
+            return score
+        return score - 0.3 if is_question else score
+
+    if intent == 'create_transaction':
+        # Rules find the amount but not the category; let the LLM name it
+        return 0.6 if entities.get('category_name') is None else 0.8
+
+    if parsed.get('missing_fields'):
+        return 0.5
+
+    rule = _mutation_rule(intent)
+    if rule is not None:
+        verbs, targets = rule
+        if intent == 'delete_all_confirm' or entities.get('delete_all'):
+            # Wiping everything is never decided by keywords alone
+            return UNVERIFIED_MUTATION_SCORE
+        if not _has_verb(message, verbs):
+            return UNVERIFIED_MUTATION_SCORE
+        if not any(_valid_target(name, entities.get(name)) for name in targets):
+            return UNVERIFIED_MUTATION_SCORE
+        return 0.4 if is_question else 0.8
+
+    if any(entities.get(name) not in (None, '', False) for name in TARGET_ENTITIES):
+        return 0.4 if is_question else 0.8
+    return 0.5
+
+
+class IntentRouter:
+    """
+    Route messages to the cheapest parser that is confident enough
+
+    Tier 1 is GeminiNLPService._simple_parse scored by score_rule_parse;
+    messages below the threshold go to gemini_nlp.parse_message (tier 2).
+    A small share of rule-served messages is re-parsed by Gemini in the
+    background to measure per-intent agreement (the accuracy report).
+    """
+
+    def __init__(self, nlp, threshold=None, shadow_rate=None):
+        self.nlp = nlp
+        self.threshold = threshold if threshold is not None else float(
+            os.environ.get('INTENT_ROUTER_THRESHOLD', '0.75'))
+        self.shadow_rate = shadow_rate if shadow_rate is not None else float(
+            os.environ.get('INTENT_ROUTER_SHADOW_RATE', '0.05'))
+        self._lock = threading.Lock()
+        self._intents = {}
+
+    def _stats(self, intent):
+        return self._intents.setdefault(intent, {
+            'rules': 0, 'llm': 0, 'rules_ms': 0.0, 'llm_ms': 0.0,
+            'llm_max_ms': 0.0, 'checked': 0, 'agreed': 0
+        })
+
+    def _record(self, intent, tier, elapsed_ms):
+        with self._lock:
+            stats = self._stats(intent)
+            stats[tier] += 1
+            stats[f'{tier}_ms'] += elapsed_ms
+            if tier == 'llm':
+                stats['llm_max_ms'] = max(stats['llm_max_ms'], elapsed_ms)
+
+    def _record_agreement(self, rule_intent, llm_intent):
+        with self._lock:
+            stats = self._stats(rule_intent)
+            stats['checked'] += 1
+            if rule_intent == llm_intent:
+                stats['agreed'] += 1
+
+    def _shadow_check(self, message, rule_intent):
+        try:
+            llm_intent = self.nlp.parse_message(message).get('intent')
+        except Exception as e:
+            print(f"Intent shadow check error: {e}")
+            return
+        self._record_agreement(rule_intent, llm_intent)
+
+    def parse(self, message: str) -> dict:
+        """
+        Parse a message, escalating to Gemini only when needed
+
+        Returns:
+            dict with intent, entities, missing_fields, fallback_question, confidence
+        """
+        started = time.perf_counter()
+        parsed = self.nlp._simple_parse(message)
+        confidence = score_rule_parse(message, parsed)
+        parsed['confidence'] = confidence
+        rules_ms = (time.perf_counter() - started) * 1000
+
+        if confidence >= self.threshold or not self.nlp.is_available():
+            self._record(parsed['intent'], 'rules', rules_ms)
+            if self.nlp.is_available() and random.random() < self.shadow_rate:
+                threading.Thread(
+                    target=self._shadow_check, args=(message, parsed['intent']), daemon=True
+                ).start()
+            return parsed
+
+        started = time.perf_counter()
+        result = self.nlp.parse_message(message)
+        self._record(result.get('intent', 'general'), 'llm', (time.perf_counter() - started) * 1000)
+
+        # Escalated messages double as labelled samples for the rule parser
+        if parsed['intent'] != 'general':
+            self._record_agreement(parsed['intent'], result.get('intent'))
+        return result
+
+    def report(self) -> dict:
+        """Per-intent routing share, latency and rule/LLM agreement"""
+        with self._lock:
+            intents = {k: dict(v) for k, v in self._intents.items()}
+
+        total_rules = sum(s['rules'] for s in intents.values())
+        total_llm = sum(s['llm'] for s in intents.values())
+        total = total_rules + total_llm
+
+        report = {}
+        for intent, s in sorted(intents.items()):
+            report[intent] = {
+                'rules': s['rules'],
+                'llm': s['llm'],
+                'rules_avg_ms': round(s['rules_ms'] / s['rules'], 3) if s['rules'] else None,
+                'llm_avg_ms': round(s['llm_ms'] / s['llm'], 1) if s['llm'] else None,
+                'llm_max_ms': round(s['llm_max_ms'], 1) if s['llm'] else None,
+                'checked': s['checked'],
+                'accuracy': round(s['agreed'] / s['checked'], 3) if s['checked'] else None
+            }
+
+        return {
+            'threshold': self.threshold,
+            'shadow_rate': self.shadow_rate,
+            'total': total,
+            'rules_share': round(total_rules / total, 3) if total else 0.0,
+            'intents': report
+        }
+
+
+intent_router = IntentRouter(gemini_nlp)
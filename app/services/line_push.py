@@ -0,0 +1,111 @@
+"""
+LINE Push Service
+Deferred LINE answers: the chat turn is answered at once with a short
+"thinking" reply and the slow (LLM) answer is pushed when it is ready
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.services.http_client import http_client
+
+LINE_PUSH_URL = 'https://api.line.me/v2/bot/message/push'
+
+# LINE rejects text messages longer than this
+LINE_TEXT_LIMIT = 5000
+
+
+class LinePushService:
+    """
+    Bounded pool of background jobs that push their result to a LINE user
+
+    Reply tokens are single-use and expire within a minute, so the early
+    "thinking" message uses the reply while the final text is sent with
+    the push API (which needs the channel access token).
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.enabled = False
+        self.app = None
+        self._executor = None
+        self.deferred = 0
+        self.pushed = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        """Configure from Flask app config (enabled only with a channel access token)"""
+        self.app = app
+        self.workers = app.config.get('AI_LINE_PUSH_WORKERS', self.workers)
+        self.enabled = bool(app.config.get('AI_LINE_PUSH_ENABLED', True) and
+                            app.config.get('LINE_CHANNEL_ACCESS_TOKEN'))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='line-push')
+        app.extensions['line_push'] = self
+
+    def push_text(self, line_user_id, text):
+        """
+        Push one text message to a LINE user, returns True on success
+
+        The retry key makes LINE drop a resent copy, so the push can be
+        retried after a timeout without reaching the user twice.
+        """
+        try:
+            response = http_client.post(
+                LINE_PUSH_URL,
+                json={
+                    'to': line_user_id,
+                    'messages': [{'type': 'text', 'text': text[:LINE_TEXT_LIMIT]}]
+                },
+                headers={
+                    'Authorization': f"Bearer {self.app.config['LINE_CHANNEL_ACCESS_TOKEN']}",
+                    'X-Line-Retry-Key': str(uuid.uuid4())
+                },
+                retries=1,
+                idempotent=True,
+                timeout=10
+            )
+            # 409: an earlier attempt with the same retry key was already accepted
+            if response.status_code not in (200, 409):
+                self.app.logger.error(f"Failed to push LINE message: {response.status_code} {response.text}")
+                self.failed += 1
+                return False
+            self.pushed += 1
+            return True
+        except Exception as e:
+            self.app.logger.error(f"Failed to push LINE message: {str(e)}")
+            self.failed += 1
+            return False
+
+    def defer(self, line_user_id, produce):
+        """
+        Compute text in the background and push it to a LINE user
+
+        Args:
+            line_user_id: LINE user ID (U...)
+            produce: Callable returning the text; runs in an app context
+        """
+        self.deferred += 1
+
+        def job():
+            with self.app.app_context():
+                try:
+                    text = produce()
+                except Exception as e:
+                    self.app.logger.error(f"Deferred LINE answer failed: {str(e)}")
+                    text = "ขออภัยค่ะ เกิดข้อผิดพลาด กรุณาลองใหม่อีกครั้ง"
+                if text:
+                    self.push_text(line_user_id, text)
+
+        return self._executor.submit(job)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'deferred': self.deferred,
+            'pushed': self.pushed,
+            'failed': self.failed
+        }
+
+
+line_push = LinePushService()
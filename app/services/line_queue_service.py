@@ -0,0 +1,290 @@
+"""
+LINE Queue Service
+Durable local work queue for LINE webhook events, drained by a worker pool
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class LineEventQueue:
+    """
+    SQLite-backed queue of LINE webhook events
+
+    Events are claimed one at a time per LINE user: a user's next event is
+    only handed out once the previous one is done, so replies keep the
+    order the user sent the messages in, across threads and processes.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.handler = None
+        self.workers = 0
+        self.max_attempts = 3
+        self.lease_seconds = 120
+        self.poll_interval = 0.5
+        self.done_retention = 86400
+        self.purge_interval = 600
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._local = threading.local()
+        self._app = None
+        self.processed = 0
+        self.failed = 0
+
+    def init_app(self, app, handler):
+        """
+        Configure the queue and start the worker pool
+
+        Args:
+            app: Flask application (workers run inside its app context)
+            handler: Callable(event_dict) that processes one LINE event
+        """
+        self._app = app
+        self.handler = handler
+        self.path = app.config.get('LINE_QUEUE_PATH') or os.path.join(app.instance_path, 'line_queue.db')
+        self.workers = app.config.get('LINE_QUEUE_WORKERS', 4)
+        self.max_attempts = app.config.get('LINE_QUEUE_MAX_ATTEMPTS', 3)
+        self.done_retention = app.config.get('LINE_QUEUE_DONE_RETENTION_SECONDS', self.done_retention)
+        self.purge_interval = app.config.get('LINE_QUEUE_PURGE_INTERVAL_SECONDS', self.purge_interval)
+        self._create_schema()
+        self._release_stale_leases(self._conn(), time.time())
+
+        app.extensions['line_queue'] = self
+        if app.config.get('BACKGROUND_WORKERS_AUTOSTART'):
+            self.start()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'path', None) != self.path:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def _create_schema(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS line_event ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " event_id TEXT UNIQUE,"
+            " user_key TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"  # pending, processing, done, failed
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL,"
+            " locked_until REAL,"
+            " last_error TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_line_event_status ON line_event(status, available_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_line_event_user ON line_event(user_key, status)")
+
+    def _release_stale_leases(self, conn, now):
+        """
+        Return events left 'processing' by a crashed worker to the queue
+
+        An expired lease counts as a failed attempt: events that already
+        used up max_attempts are marked failed instead.
+        """
+        conn.execute(
+            "UPDATE line_event SET status = 'failed', locked_until = NULL, last_error = 'lease expired' "
+            "WHERE status = 'processing' AND locked_until < ? AND attempts >= ?",
+            (now, self.max_attempts)
+        )
+        conn.execute(
+            "UPDATE line_event SET status = 'pending', locked_until = NULL "
+            "WHERE status = 'processing' AND locked_until < ?",
+            (now,)
+        )
+
+    def enqueue(self, events):
+        """
+        Persist webhook events
+
+        Redelivered events (same webhookEventId / message id) are ignored.
+
+        Args:
+            events: List of LINE event dicts
+
+        Returns:
+            int: Number of newly queued events
+        """
+        now = time.time()
+        conn = self._conn()
+        queued = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for event in events:
+                source = event.get('source', {})
+                user_key = source.get('userId') or source.get('groupId') or source.get('roomId') or ''
+                event_id = event.get('webhookEventId') or event.get('message', {}).get('id')
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO line_event (event_id, user_key, payload, available_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (event_id, user_key, json.dumps(event), now, now)
+                )
+                queued += cursor.rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if queued:
+            self._wakeup.set()
+        return queued
+
+    def claim(self):
+        """
+        Lease the oldest runnable event whose user has nothing in flight
+
+        Expired leases are released first, so a crashed worker only holds
+        up its user's events until its lease runs out.
+
+        Returns:
+            tuple: (id, event dict, attempts) or None when nothing is runnable
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._release_stale_leases(conn, now)
+            row = conn.execute(
+                "SELECT e.id, e.payload, e.attempts FROM line_event e "
+                "WHERE e.status = 'pending' AND e.available_at <= ? "
+                "AND NOT EXISTS (SELECT 1 FROM line_event p WHERE p.user_key = e.user_key "
+                "  AND p.status = 'processing') "
+                "AND NOT EXISTS (SELECT 1 FROM line_event o WHERE o.user_key = e.user_key "
+                "  AND o.status = 'pending' AND o.id < e.id) "
+                "ORDER BY e.id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE line_event SET status = 'processing', attempts = attempts + 1, locked_until = ? "
+                "WHERE id = ?",
+                (now + self.lease_seconds, row[0])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def complete(self, event_row_id):
+        self._conn().execute(
+            "UPDATE line_event SET status = 'done', locked_until = NULL WHERE id = ?", (event_row_id,)
+        )
+        self.processed += 1
+
+    def retry_or_fail(self, event_row_id, attempts, error):
+        """Reschedule with exponential backoff, or mark failed after max attempts"""
+        if attempts >= self.max_attempts:
+            self._conn().execute(
+                "UPDATE line_event SET status = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+                (str(error)[:500], event_row_id)
+            )
+            self.failed += 1
+            return
+
+        self._conn().execute(
+            "UPDATE line_event SET status = 'pending', locked_until = NULL, last_error = ?, available_at = ? "
+            "WHERE id = ?",
+            (str(error)[:500], time.time() + 2 ** attempts, event_row_id)
+        )
+
+    def purge_done(self, older_than_seconds=86400):
+        """Delete processed events older than the given age"""
+        cursor = self._conn().execute(
+            "DELETE FROM line_event WHERE status = 'done' AND created_at < ?",
+            (time.time() - older_than_seconds,)
+        )
+        return cursor.rowcount
+
+    def _maybe_purge(self):
+        """Purge done events at most once per purge_interval (across workers)"""
+        now = time.time()
+        if now - self._last_purge < self.purge_interval or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            self.purge_done(self.done_retention)
+        finally:
+            self._purge_lock.release()
+
+    def run_once(self):
+        """Process a single event; returns False when the queue had nothing runnable"""
+        claimed = self.claim()
+        if claimed is None:
+            return False
+
+        event_row_id, event, attempts = claimed
+        try:
+            with self._app.app_context():
+                self.handler(event)
+            self.complete(event_row_id)
+        except Exception as e:
+            self._app.logger.error(f"LINE event {event_row_id} failed (attempt {attempts}): {str(e)}")
+            self.retry_or_fail(event_row_id, attempts, e)
+        return True
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._maybe_purge()
+                if self.run_once():
+                    continue
+            except sqlite3.Error as e:
+                self._app.logger.error(f"LINE queue error: {str(e)}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'line-queue-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        """Backlog metrics"""
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM line_event GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM line_event WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
+        return {
+            'pending': counts.get('pending', 0),
+            'processing': counts.get('processing', 0),
+            'failed': counts.get('failed', 0),
+            'done': counts.get('done', 0),
+            'backlog': counts.get('pending', 0) + counts.get('processing', 0),
+            'oldest_pending_age_seconds': round(time.time() - oldest, 1) if oldest else 0,
+            'workers': len(self._threads),
+            'processed': self.processed,
+            'failed_total': self.failed
+        }
+
+
+line_queue = LineEventQueue()
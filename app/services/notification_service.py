@@ -4,9 +4,8 @@ Notification Service - Handle user notifications
 from datetime import datetime, timedelta
 from app import db
 from app.models.notification import Notification, NotificationPreference
-from app.models.transaction import Transaction
-from app.models.budget import Budget
 from app.models.recurring import RecurringRule
+from app.services.budget_service import BudgetService
 from sqlalchemy import func
 
 
@@ -71,73 +70,56 @@ class NotificationService:
         if not month_yyyymm:
             month_yyyymm = datetime.now().strftime('%Y-%m')
 
-        # Get all budgets for this project and month
-        budgets = Budget.query.filter_by(
-            project_id=project_id,
-            month_yyyymm=month_yyyymm
-        ).all()
+        statuses = BudgetService.get_budget_statuses(project_id, month_yyyymm)
+        if not statuses:
+            return []
+
+        # All budgets belong to the same project, so one owner preference applies
+        owner_user_id = statuses[0]['budget'].project.owner_user_id
+        preference = NotificationService.get_or_create_preference(owner_user_id)
+        if not preference.budget_alerts:
+            return []
+
+        # Budgets already alerted today (one query instead of one per budget)
+        alerted_today = {
+            row.budget_id for row in db.session.query(
+                Notification.data['budget_id'].as_string().label('budget_id')
+            ).filter(
+                Notification.user_id == owner_user_id,
+                Notification.type == 'budget_alert',
+                Notification.project_id == project_id,
+                Notification.created_at >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+        }
 
         alerts_created = []
 
-        for budget in budgets:
-            # Get owner's notification preference
-            preference = NotificationService.get_or_create_preference(budget.project.owner_user_id)
+        for status in statuses:
+            budget = status['budget']
+            total_spent = status['spent']
+            usage_percentage = status['usage']
 
-            if not preference.budget_alerts:
-                continue
+            # Check if threshold exceeded (at most one alert per budget per day)
+            if usage_percentage >= preference.budget_threshold and budget.id not in alerted_today:
+                category = status['category']
+                alert_title = f"แจ้งเตือนงบประมาณ: {category.name_th}"
+                alert_message = f"คุณใช้ไป {usage_percentage:.0f}% ของงบประมาณหมวดหมู่ '{category.name_th}' (฿{total_spent/100:.2f} / ฿{budget.limit_amount/100:.2f})"
 
-            # Calculate spending for this category
-            from app.models.transaction import Transaction
-            start_date = datetime.strptime(f"{month_yyyymm}-01", '%Y-%m-%d')
-            if month_yyyymm.endswith('12'):
-                end_date = datetime.strptime(f"{int(month_yyyymm[:4]) + 1}-01-01", '%Y-%m-%d')
-            else:
-                end_date = datetime.strptime(f"{month_yyyymm[:4]}-{int(month_yyyymm[5:]) + 1:02d}-01", '%Y-%m-%d')
-
-            transactions = Transaction.query.filter(
-                Transaction.project_id == project_id,
-                Transaction.category_id == budget.category_id,
-                Transaction.occurred_at >= start_date,
-                Transaction.occurred_at < end_date,
-                Transaction.type == 'expense'
-            ).all()
-
-            total_spent = sum(t.amount for t in transactions)
-            usage_percentage = (total_spent / budget.limit_amount) * 100 if budget.limit_amount > 0 else 0
-
-            # Check if threshold exceeded
-            if usage_percentage >= preference.budget_threshold:
-                # Check if alert already created for this budget today
-                existing_alert = Notification.query.filter_by(
-                    user_id=budget.project.owner_user_id,
+                notification = NotificationService.create_notification(
+                    user_id=owner_user_id,
                     type='budget_alert',
-                    project_id=project_id
-                ).filter(
-                    Notification.data['budget_id'].astext == budget.id
-                ).filter(
-                    Notification.created_at >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                ).first()
-
-                if not existing_alert:
-                    category = budget.category
-                    alert_title = f"แจ้งเตือนงบประมาณ: {category.name_th}"
-                    alert_message = f"คุณใช้ไป {usage_percentage:.0f}% ของงบประมาณหมวดหมู่ '{category.name_th}' (฿{total_spent/100:.2f} / ฿{budget.limit_amount/100:.2f})"
-
-                    notification = NotificationService.create_notification(
-                        user_id=budget.project.owner_user_id,
-                        type='budget_alert',
-                        title=alert_title,
-                        message=alert_message,
-                        project_id=project_id,
-                        data={
-                            'budget_id': budget.id,
-                            'category_id': budget.category_id,
-                            'usage_percentage': round(usage_percentage, 2),
-                            'spent': total_spent,
-                            'limit': budget.limit_amount
-                        }
-                    )
-                    alerts_created.append(notification.to_dict())
+                    title=alert_title,
+                    message=alert_message,
+                    project_id=project_id,
+                    data={
+                        'budget_id': budget.id,
+                        'category_id': budget.category_id,
+                        'usage_percentage': round(usage_percentage, 2),
+                        'spent': total_spent,
+                        'limit': budget.limit_amount
+                    }
+                )
+                alerts_created.append(notification.to_dict())
 
         return alerts_created
 
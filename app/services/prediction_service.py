@@ -6,9 +6,9 @@ from datetime import datetime, timedelta
 from sqlalchemy import func, extract, desc
 from app import db
 from app.models.transaction import Transaction
-from app.models.budget import Budget
 from app.models.savings_goal import SavingsGoal
 from app.models.recurring import RecurringRule
+from app.services.budget_service import BudgetService
 from app.utils.helpers import satang_to_baht
 import statistics
 
@@ -182,30 +182,14 @@ class PredictionService:
         else:
             days_remaining = 0
 
-        # Get budgets for this month
-        budgets = db.session.query(
-            Budget.id,
-            Budget.category_id,
-            Budget.limit_amount
-        ).filter(
-            Budget.project_id == project_id,
-            Budget.month_yyyymm == month_str
-        ).all()
+        # Spending for all budgets of the month (one grouped query)
+        statuses = BudgetService.get_budget_statuses(project_id, month_str)
 
         budget_projections = []
 
-        for budget in budgets:
-            # Get actual spending
-            spent = db.session.query(
-                func.sum(Transaction.amount)
-            ).filter(
-                Transaction.project_id == project_id,
-                Transaction.category_id == budget.category_id,
-                Transaction.type == 'expense',
-                extract('year', Transaction.occurred_at) == year,
-                extract('month', Transaction.occurred_at) == month,
-                Transaction.deleted_at.is_(None)
-            ).scalar() or 0
+        for status in statuses:
+            budget = status['budget']
+            spent = status['spent']
 
             remaining = budget.limit_amount - spent
             daily_allowance = remaining / days_remaining if days_remaining > 0 else 0
@@ -240,7 +224,7 @@ class PredictionService:
             })
 
         # Calculate overall totals
-        total_budget = sum(b.limit_amount for b in budgets)
+        total_budget = sum(b["limit"] for b in budget_projections)
         total_spent = sum(b["spent"] for b in budget_projections)
         total_remaining = total_budget - total_spent
         overall_daily_allowance = total_remaining / days_remaining if days_remaining > 0 else 0
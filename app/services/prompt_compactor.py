@@ -0,0 +1,325 @@
+"""
+Prompt Compactor
+Turns a project's transaction history into a compact statistical digest
+for LLM prompts (per-category monthly series, top notes, recurrence
+candidates), built from aggregates and trimmed to a hard token budget
+"""
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models.transaction import Transaction
+from app.models.transaction_rollup import TransactionMonthlyRollup
+from app.models.category import Category
+
+# Rows kept before budget trimming
+TOP_CATEGORIES = 12
+TOP_NOTES = 15
+MAX_CANDIDATES = 10
+
+# Name of the bucket that absorbs categories trimmed from the digest
+OTHER_CATEGORY = 'อื่นๆ'
+
+# (max average interval in days, label) for recurrence candidates
+FREQUENCIES = (
+    (10, 'รายสัปดาห์'),
+    (40, 'รายเดือน'),
+    (100, 'รายไตรมาส'),
+    (400, 'รายปี'),
+)
+
+# A note counts as recurring when its amounts stay within this spread of the average
+RECURRING_AMOUNT_SPREAD = 0.25
+
+
+def _months_back(count, today=None):
+    """The last `count` "YYYY-MM" months, oldest first, ending with the current one"""
+    today = today or datetime.now()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(f'{year:04d}-{month:02d}')
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return months[::-1]
+
+
+def _baht(satang):
+    return round((satang or 0) / 100, 2)
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _frequency(interval_days):
+    for limit, label in FREQUENCIES:
+        if interval_days <= limit:
+            return label
+    return None
+
+
+class PromptCompactor:
+    """Builds and budgets transaction digests for AI prompts"""
+
+    @staticmethod
+    def build_digest(project_id, months=3, tx_type=None, token_budget=None,
+                     max_categories=TOP_CATEGORIES, include_notes=True):
+        """
+        Compact summary of the last `months` months of a project
+
+        Cost and size depend on the number of categories and distinct notes,
+        not on how many transactions the period holds.
+
+        Args:
+            project_id: Project ID
+            months: Number of calendar months, ending with the current one
+            tx_type: Restrict to 'income' or 'expense' (None for both)
+            token_budget: Token budget (defaults to AI_PROMPT_TOKEN_BUDGET)
+            max_categories: Categories kept before the rest fold into OTHER_CATEGORY
+                            (None keeps all)
+            include_notes: Also collect top notes and recurrence candidates
+
+        Returns:
+            dict: {'period', 'months', 'totals', 'categories', 'top_notes',
+                   'recurring_candidates'} with amounts in baht
+        """
+        month_list = _months_back(months)
+        start = datetime.strptime(month_list[0], '%Y-%m')
+
+        digest = {
+            'period': f'{month_list[0]}..{month_list[-1]}',
+            'months': month_list,
+            'totals': {'income': 0, 'expense': 0, 'balance': 0, 'transaction_count': 0},
+            'categories': PromptCompactor._category_series(project_id, month_list, tx_type, max_categories),
+            'top_notes': [],
+            'recurring_candidates': []
+        }
+
+        totals = digest['totals']
+        for category in digest['categories']:
+            totals[category['type']] = round(totals.get(category['type'], 0) + category['total'], 2)
+            totals['transaction_count'] += category['count']
+        totals['balance'] = round(totals['income'] - totals['expense'], 2)
+
+        if include_notes:
+            notes = PromptCompactor._note_stats(project_id, start, tx_type or 'expense')
+            digest['top_notes'] = [
+                {'note': n['note'], 'count': n['count'], 'total': n['total'], 'avg': n['avg']}
+                for n in notes[:TOP_NOTES]
+            ]
+            digest['recurring_candidates'] = PromptCompactor._recurring_candidates(notes)
+
+        if token_budget is None:
+            token_budget = current_app.config.get('AI_PROMPT_TOKEN_BUDGET', 1200)
+        return PromptCompactor.fit_to_budget(digest, token_budget)
+
+    @staticmethod
+    def _category_series(project_id, month_list, tx_type=None, max_categories=TOP_CATEGORIES):
+        """Per-category totals and monthly series from the rollup table"""
+        query = db.session.query(
+            TransactionMonthlyRollup.month_yyyymm,
+            TransactionMonthlyRollup.type,
+            TransactionMonthlyRollup.category_id,
+            Category.name_th,
+            TransactionMonthlyRollup.total_amount,
+            TransactionMonthlyRollup.tx_count
+        ).outerjoin(
+            Category, Category.id == TransactionMonthlyRollup.category_id
+        ).filter(
+            TransactionMonthlyRollup.project_id == project_id,
+            TransactionMonthlyRollup.month_yyyymm.in_(month_list)
+        )
+        if tx_type:
+            query = query.filter(TransactionMonthlyRollup.type == tx_type)
+
+        index = {m: i for i, m in enumerate(month_list)}
+        categories = {}
+        for row in query.all():
+            entry = categories.get((row.type, row.category_id))
+            if entry is None:
+                entry = categories[(row.type, row.category_id)] = {
+                    'name': row.name_th or OTHER_CATEGORY,
+                    'type': row.type,
+                    'total': 0,
+                    'count': 0,
+                    'monthly': [0] * len(month_list)
+                }
+            entry['monthly'][index[row.month_yyyymm]] += row.total_amount or 0
+            entry['count'] += row.tx_count or 0
+
+        result = []
+        for entry in categories.values():
+            entry['total'] = _baht(sum(entry['monthly']))
+            entry['monthly'] = [_baht(v) for v in entry['monthly']]
+            result.append(entry)
+        result.sort(key=lambda c: c['total'], reverse=True)
+        while max_categories and len(result) > max_categories and PromptCompactor._fold_tail(result):
+            pass
+        return result
+
+    @staticmethod
+    def _note_stats(project_id, start, tx_type):
+        """
+        Usage statistics per note since `start` (one GROUP BY, most used first)
+
+        Notes that differ only in case or surrounding spaces are merged.
+        """
+        rows = db.session.query(
+            Transaction.note,
+            func.count(Transaction.id).label('count'),
+            func.sum(Transaction.amount).label('total'),
+            func.min(Transaction.amount).label('min_amount'),
+            func.max(Transaction.amount).label('max_amount'),
+            func.min(Transaction.occurred_at).label('first_at'),
+            func.max(Transaction.occurred_at).label('last_at')
+        ).filter(
+            Transaction.project_id == project_id,
+            Transaction.deleted_at.is_(None),
+            Transaction.note.isnot(None),
+            Transaction.note != '',
+            Transaction.type == tx_type,
+            Transaction.occurred_at >= start
+        ).group_by(Transaction.note).order_by(
+            func.count(Transaction.id).desc()
+        ).limit((TOP_NOTES + MAX_CANDIDATES) * 3).all()
+
+        merged = {}
+        for row in rows:
+            key = row.note.strip().lower()
+            if not key:
+                continue
+            first_at, last_at = _as_datetime(row.first_at), _as_datetime(row.last_at)
+            stats = merged.get(key)
+            if stats is None:
+                merged[key] = {
+                    'note': row.note.strip(), 'count': row.count, 'total_satang': row.total or 0,
+                    'min': row.min_amount, 'max': row.max_amount,
+                    'first_at': first_at, 'last_at': last_at
+                }
+                continue
+            stats['count'] += row.count
+            stats['total_satang'] += row.total or 0
+            stats['min'] = min(stats['min'], row.min_amount)
+            stats['max'] = max(stats['max'], row.max_amount)
+            stats['first_at'] = min(stats['first_at'], first_at)
+            stats['last_at'] = max(stats['last_at'], last_at)
+
+        notes = sorted(merged.values(), key=lambda n: (n['count'], n['total_satang']), reverse=True)
+        for n in notes:
+            n['total'] = _baht(n['total_satang'])
+            n['avg'] = _baht(n['total_satang'] / n['count'])
+        return notes
+
+    @staticmethod
+    def _recurring_candidates(notes):
+        """Notes repeating at a steady interval with a steady amount"""
+        candidates = []
+        for n in notes:
+            if n['count'] < 2 or not n['first_at'] or not n['last_at']:
+                continue
+            avg_satang = n['total_satang'] / n['count']
+            if avg_satang <= 0 or (n['max'] - n['min']) > avg_satang * RECURRING_AMOUNT_SPREAD:
+                continue
+            interval = (n['last_at'] - n['first_at']).days / (n['count'] - 1)
+            if interval < 5:
+                continue  # Daily habits (coffee, lunch) are not bills
+            frequency = _frequency(interval)
+            if not frequency:
+                continue
+            candidates.append({
+                'note': n['note'],
+                'amount': n['avg'],
+                'count': n['count'],
+                'interval_days': round(interval),
+                'frequency': frequency,
+                'last_date': n['last_at'].date().isoformat(),
+                'next_date': (n['last_at'] + timedelta(days=round(interval))).date().isoformat()
+            })
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        return candidates
+
+    @staticmethod
+    def estimate_tokens(value):
+        """
+        Rough token count of a prompt fragment (dicts are measured as compact JSON)
+
+        ASCII runs at about 4 characters per token; Thai and other
+        non-ASCII text at about 2.
+        """
+        text = value if isinstance(value, str) else PromptCompactor.to_prompt(value)
+        ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+        return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+    @staticmethod
+    def to_prompt(digest):
+        """Compact JSON for the prompt (no indentation)"""
+        return json.dumps(digest, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def fit_to_budget(digest, token_budget):
+        """
+        Trim a digest until it fits token_budget
+
+        Order: notes the candidates do not need, tail categories (folded
+        into OTHER_CATEGORY), recurrence candidates, then monthly series.
+        Totals and the period are always kept.
+        """
+        estimate = PromptCompactor.estimate_tokens
+        if estimate(digest) <= token_budget:
+            return digest
+
+        while len(digest['top_notes']) > 5 and estimate(digest) > token_budget:
+            digest['top_notes'].pop()
+
+        categories = digest['categories']
+        while len(categories) > 3 and estimate(digest) > token_budget:
+            if not PromptCompactor._fold_tail(categories):
+                break
+
+        for key in ('top_notes', 'recurring_candidates'):
+            while digest[key] and estimate(digest) > token_budget:
+                digest[key].pop()
+
+        if estimate(digest) > token_budget:
+            for category in categories:
+                category.pop('monthly', None)
+            digest.pop('months', None)
+
+        while len(categories) > 1 and estimate(digest) > token_budget:
+            if not PromptCompactor._fold_tail(categories):
+                break
+
+        digest['truncated'] = True
+        return digest
+
+    @staticmethod
+    def _fold_tail(categories):
+        """
+        Fold the smallest category into its type's OTHER_CATEGORY bucket
+
+        Returns False when only buckets are left.
+        """
+        for i in range(len(categories) - 1, -1, -1):
+            if categories[i]['name'] != OTHER_CATEGORY:
+                dropped = categories.pop(i)
+                break
+        else:
+            return False
+
+        other = next((c for c in categories
+                      if c['name'] == OTHER_CATEGORY and c['type'] == dropped['type']), None)
+        if other is None:
+            other = {'name': OTHER_CATEGORY, 'type': dropped['type'], 'total': 0, 'count': 0}
+            if 'monthly' in dropped:
+                other['monthly'] = [0] * len(dropped['monthly'])
+            categories.append(other)
+        other['total'] = round(other['total'] + dropped['total'], 2)
+        other['count'] += dropped['count']
+        if 'monthly' in other and 'monthly' in dropped:
+            other['monthly'] = [round(a + b, 2) for a, b in zip(other['monthly'], dropped['monthly'])]
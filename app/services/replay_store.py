@@ -0,0 +1,290 @@
+"""
+Replay Store
+Bot request nonces and idempotency responses with bounded lifetime.
+Backends: time-bucketed memory (single node) or a SQLite file with a
+background expiry sweeper and batched inserts (several workers).
+"""
+import time
+import heapq
+import sqlite3
+import threading
+
+NONCE_TTL_SECONDS = 300  # Matches the bot HMAC timestamp window
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+IDEMPOTENCY_LEASE_SECONDS = 60  # In-flight claim on an Idempotency-Key (released by expiry)
+
+
+class MemoryReplayStore:
+    """
+    In-process store with entries grouped into fixed time buckets
+
+    Expiry drops whole buckets instead of scanning entries, and the
+    bucket closest to expiry is dropped early when max_entries is
+    exceeded. Buckets are kept in a heap by end time, since short-lived
+    nonces land in buckets that end before those of earlier responses.
+    """
+
+    def __init__(self, bucket_seconds=60, max_entries=100000, clock=time.time):
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._nonces = {}  # nonce -> expires_at
+        self._responses = {}  # event_id -> (expires_at, status, body)
+        self._buckets = {}  # bucket end -> [(kind, key)]
+        self._bucket_ends = []  # heap of bucket ends
+        self.replays_blocked = 0
+        self.dropped_early = 0
+
+    def _bucket_for(self, expires_at):
+        return (int(expires_at // self.bucket_seconds) + 1) * self.bucket_seconds
+
+    def _track(self, kind, key, expires_at):
+        bucket = self._bucket_for(expires_at)
+        entries = self._buckets.get(bucket)
+        if entries is None:
+            entries = self._buckets[bucket] = []
+            heapq.heappush(self._bucket_ends, bucket)
+        entries.append((kind, key))
+
+    def _pop_bucket(self):
+        bucket = heapq.heappop(self._bucket_ends)
+        return bucket, self._buckets.pop(bucket)
+
+    def _drop_bucket(self, entries, now):
+        for kind, key in entries:
+            table = self._nonces if kind == 'nonce' else self._responses
+            value = table.get(key)
+            expires_at = value if kind == 'nonce' else (value[0] if value else None)
+            # The key may have been re-stored into a later bucket
+            if expires_at is not None and (expires_at <= now or self._bucket_for(expires_at) <= now):
+                del table[key]
+
+    def _expire(self, now):
+        while self._bucket_ends and self._bucket_ends[0] <= now:
+            _, entries = self._pop_bucket()
+            self._drop_bucket(entries, now)
+
+        while self._bucket_ends and len(self._nonces) + len(self._responses) > self.max_entries:
+            bucket, entries = self._pop_bucket()
+            before = len(self._nonces) + len(self._responses)
+            self._drop_bucket(entries, bucket)
+            self.dropped_early += before - len(self._nonces) - len(self._responses)
+
+    def claim_nonce(self, nonce, bot_id, ttl=NONCE_TTL_SECONDS):
+        """Record a nonce; False when it was already used"""
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            expires_at = self._nonces.get(nonce)
+            if expires_at is not None and expires_at > now:
+                self.replays_blocked += 1
+                return False
+            self._nonces[nonce] = now + ttl
+            self._track('nonce', nonce, now + ttl)
+            return True
+
+    def get_response(self, event_id):
+        """Return (status, body) stored for event_id, or None"""
+        now = self._clock()
+        with self._lock:
+            entry = self._responses.get(event_id)
+            if entry is None or entry[0] <= now:
+                return None
+            return entry[1], entry[2]
+
+    def put_response(self, event_id, endpoint, status, body, ttl=IDEMPOTENCY_TTL_SECONDS):
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            self._responses[event_id] = (now + ttl, status, body)
+            self._track('response', event_id, now + ttl)
+
+    def sweep(self):
+        with self._lock:
+            self._expire(self._clock())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'nonces': len(self._nonces),
+                'responses': len(self._responses),
+                'buckets': len(self._buckets),
+                'replays_blocked': self.replays_blocked,
+                'dropped_early': self.dropped_early
+            }
+
+
+class SQLiteReplayStore:
+    """
+    Store shared by all workers through a standalone SQLite file
+
+    Nonce inserts are buffered and written in batches by the sweeper
+    thread. Each worker also remembers its own nonces in memory, so a
+    replay to the same worker is always caught; across workers the
+    guarantee holds once the batch is flushed (flush_interval).
+    """
+
+    def __init__(self, path, flush_interval=0.5, sweep_interval=60, batch_size=200):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []  # [(nonce, bot_id, expires_at)]
+        self._recent = MemoryReplayStore(max_entries=50000)
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_sweep = 0
+        self.replays_blocked = 0
+        self.batches_written = 0
+        self.rows_swept = 0
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS replay_nonce ("
+            " nonce TEXT PRIMARY KEY, bot_id TEXT, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_replay_nonce_expires ON replay_nonce(expires_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS replay_response ("
+            " event_id TEXT PRIMARY KEY, endpoint TEXT, status INTEGER, body TEXT, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_replay_response_expires ON replay_response(expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        """Start the flush/sweep thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='replay-store-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - self._last_sweep >= self.sweep_interval:
+                    self.sweep()
+            except sqlite3.Error as e:
+                print(f"Replay store sweeper error: {e}")
+
+    def claim_nonce(self, nonce, bot_id, ttl=NONCE_TTL_SECONDS):
+        """Record a nonce; False when it was already used (here or by another worker)"""
+        if not self._recent.claim_nonce(nonce, bot_id, ttl):
+            self.replays_blocked += 1
+            return False
+
+        row = self._conn().execute(
+            "SELECT 1 FROM replay_nonce WHERE nonce = ? AND expires_at > ?", (nonce, time.time())
+        ).fetchone()
+        if row is not None:
+            self.replays_blocked += 1
+            return False
+
+        with self._lock:
+            self._pending.append((nonce, bot_id, time.time() + ttl))
+            full = len(self._pending) >= self.batch_size
+        if full or self._thread is None:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write buffered nonces in one transaction"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO replay_nonce (nonce, bot_id, expires_at) VALUES (?, ?, ?)", batch
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            with self._lock:
+                self._pending = batch + self._pending
+            raise
+        self.batches_written += 1
+        return len(batch)
+
+    def get_response(self, event_id):
+        row = self._conn().execute(
+            "SELECT status, body FROM replay_response WHERE event_id = ? AND expires_at > ?",
+            (event_id, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_response(self, event_id, endpoint, status, body, ttl=IDEMPOTENCY_TTL_SECONDS):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO replay_response (event_id, endpoint, status, body, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (event_id, endpoint, status, body, time.time() + ttl)
+        )
+
+    def sweep(self):
+        """Delete expired rows so both tables stay bounded"""
+        now = time.time()
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM replay_nonce WHERE expires_at <= ?", (now,)).rowcount
+        removed += conn.execute("DELETE FROM replay_response WHERE expires_at <= ?", (now,)).rowcount
+        self._recent.sweep()
+        self._last_sweep = now
+        self.rows_swept += removed
+        return removed
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'backend': 'sqlite',
+            'nonces': conn.execute("SELECT COUNT(*) FROM replay_nonce").fetchone()[0],
+            'responses': conn.execute("SELECT COUNT(*) FROM replay_response").fetchone()[0],
+            'pending_nonces': len(self._pending),
+            'replays_blocked': self.replays_blocked,
+            'batches_written': self.batches_written,
+            'rows_swept': self.rows_swept
+        }
+
+
+class ReplayStoreProxy:
+    """Module-level handle to the configured backend (memory until init_app)"""
+
+    def __init__(self):
+        self.backend = MemoryReplayStore()
+
+    def init_app(self, app):
+        backend = app.config.get('REPLAY_STORE_BACKEND', 'memory')
+        if backend == 'sqlite':
+            self.backend = SQLiteReplayStore(app.config['REPLAY_STORE_PATH'])
+            if not app.testing:
+                self.backend.start()
+        else:
+            self.backend = MemoryReplayStore(
+                max_entries=app.config.get('REPLAY_STORE_MAX_ENTRIES', 100000)
+            )
+        app.extensions['replay_store'] = self
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+replay_store = ReplayStoreProxy()
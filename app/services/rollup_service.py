@@ -0,0 +1,297 @@
+"""
+Rollup Service
+Maintains the per-(project, month, type, category) transaction rollup table
+"""
+from datetime import datetime
+from sqlalchemy import event, func, extract, inspect, update, insert, delete
+from app import db
+from app.models.transaction import Transaction
+from app.models.transaction_rollup import TransactionMonthlyRollup
+from app.utils.helpers import generate_id
+
+# Columns that decide which rollup bucket (and how much) a transaction contributes to
+ROLLUP_KEY_COLUMNS = ('project_id', 'type', 'category_id', 'amount', 'occurred_at', 'deleted_at')
+
+
+def _month_of(occurred_at):
+    """Return "YYYY-MM" for a datetime (or ISO string) value"""
+    if occurred_at is None:
+        return None
+    if isinstance(occurred_at, str):
+        return occurred_at[:7]
+    return occurred_at.strftime('%Y-%m')
+
+
+def _bucket(values):
+    """
+    Map transaction column values to (rollup key, amount)
+
+    Returns None for rows that do not count (soft-deleted or incomplete).
+    """
+    if values['deleted_at'] is not None:
+        return None
+    if not values['project_id'] or not values['category_id'] or values['amount'] is None:
+        return None
+    month = _month_of(values['occurred_at'])
+    if not month:
+        return None
+    key = (values['project_id'], month, values['type'], values['category_id'])
+    return key, values['amount']
+
+
+def _current_values(txn):
+    return {name: getattr(txn, name) for name in ROLLUP_KEY_COLUMNS}
+
+
+def _previous_values(txn):
+    """Values as they were before the pending flush (requires active history)"""
+    state = inspect(txn)
+    values = {}
+    for name in ROLLUP_KEY_COLUMNS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = getattr(txn, name)
+    return values
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    pass
+
+
+class RollupService:
+    """Service for incremental monthly rollups of transactions"""
+
+    @staticmethod
+    def register_listeners():
+        """
+        Hook rollup maintenance into every session flush
+
+        Transactions are written from many places (services, bot routes,
+        recurring execution), so deltas are derived from the ORM unit of work
+        instead of from each call site. Safe to call more than once.
+        """
+        if event.contains(db.session, 'after_flush', RollupService._after_flush):
+            return
+
+        # Make sure the pre-update value is loaded on assignment, otherwise
+        # changing an expired attribute loses the bucket it must be removed from
+        for name in ROLLUP_KEY_COLUMNS:
+            attr = getattr(Transaction, name)
+            event.listen(attr, 'set', _noop_set, active_history=True)
+
+        event.listen(db.session, 'after_flush', RollupService._after_flush)
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        """Translate flushed Transaction changes into rollup deltas"""
+        deltas = {}
+
+        def add(bucket, sign):
+            if bucket is None:
+                return
+            key, amount = bucket
+            total, count = deltas.get(key, (0, 0))
+            deltas[key] = (total + sign * amount, count + sign)
+
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                add(_bucket(_current_values(obj)), 1)
+
+        for obj in session.dirty:
+            if isinstance(obj, Transaction) and session.is_modified(obj, include_collections=False):
+                add(_bucket(_previous_values(obj)), -1)
+                add(_bucket(_current_values(obj)), 1)
+
+        for obj in session.deleted:
+            if isinstance(obj, Transaction):
+                add(_bucket(_previous_values(obj)), -1)
+
+        if deltas:
+            RollupService.apply_deltas(session.connection(), deltas)
+
+    @staticmethod
+    def apply_deltas(connection, deltas):
+        """
+        Apply rollup deltas on the given connection (inside the caller's transaction)
+
+        Args:
+            connection: SQLAlchemy connection
+            deltas: {(project_id, month_yyyymm, type, category_id): (amount_delta, count_delta)}
+        """
+        table = TransactionMonthlyRollup.__table__
+        now = datetime.utcnow()
+
+        for (project_id, month_yyyymm, type, category_id), (amount, count) in deltas.items():
+            if amount == 0 and count == 0:
+                continue
+
+            result = connection.execute(
+                update(table).where(
+                    table.c.project_id == project_id,
+                    table.c.month_yyyymm == month_yyyymm,
+                    table.c.type == type,
+                    table.c.category_id == category_id
+                ).values(
+                    total_amount=table.c.total_amount + amount,
+                    tx_count=table.c.tx_count + count,
+                    updated_at=now
+                )
+            )
+
+            if result.rowcount == 0:
+                connection.execute(insert(table).values(
+                    id=generate_id('rlp'),
+                    project_id=project_id,
+                    month_yyyymm=month_yyyymm,
+                    type=type,
+                    category_id=category_id,
+                    total_amount=amount,
+                    tx_count=count,
+                    updated_at=now
+                ))
+
+    @staticmethod
+    def rebuild(project_id=None):
+        """
+        Recompute rollups from transaction history
+
+        Args:
+            project_id: Optional project ID (default: all projects)
+
+        Returns:
+            int: Number of rollup rows written
+        """
+        table = TransactionMonthlyRollup.__table__
+
+        year = extract('year', Transaction.occurred_at)
+        month = extract('month', Transaction.occurred_at)
+
+        query = db.session.query(
+            Transaction.project_id,
+            year.label('year'),
+            month.label('month'),
+            Transaction.type,
+            Transaction.category_id,
+            func.sum(Transaction.amount).label('total'),
+            func.count(Transaction.id).label('count')
+        ).filter(
+            Transaction.deleted_at.is_(None)
+        )
+
+        if project_id:
+            query = query.filter(Transaction.project_id == project_id)
+
+        results = query.group_by(
+            Transaction.project_id,
+            year,
+            month,
+            Transaction.type,
+            Transaction.category_id
+        ).all()
+
+        now = datetime.utcnow()
+        rows = [{
+            'id': generate_id('rlp'),
+            'project_id': r.project_id,
+            'month_yyyymm': f"{int(r.year)}-{str(int(r.month)).zfill(2)}",
+            'type': r.type,
+            'category_id': r.category_id,
+            'total_amount': r.total or 0,
+            'tx_count': r.count or 0,
+            'updated_at': now
+        } for r in results]
+
+        stmt = delete(table)
+        if project_id:
+            stmt = stmt.where(table.c.project_id == project_id)
+        db.session.execute(stmt)
+
+        if rows:
+            db.session.execute(insert(table), rows)
+
+        db.session.commit()
+        return len(rows)
+
+    @staticmethod
+    def needs_backfill():
+        """True when transactions exist but the rollup table has never been populated"""
+        has_rollups = db.session.query(TransactionMonthlyRollup.id).first() is not None
+        if has_rollups:
+            return False
+        return db.session.query(Transaction.id).filter(
+            Transaction.deleted_at.is_(None)
+        ).first() is not None
+
+    @staticmethod
+    def get_month_totals(project_id, month_yyyymm):
+        """
+        Get income/expense totals for a month from the rollup table
+
+        Args:
+            project_id: Project ID
+            month_yyyymm: Month in format "YYYY-MM"
+
+        Returns:
+            dict: {'income': {'total': int, 'count': int}, 'expense': {...}}
+        """
+        results = db.session.query(
+            TransactionMonthlyRollup.type,
+            func.sum(TransactionMonthlyRollup.total_amount).label('total'),
+            func.sum(TransactionMonthlyRollup.tx_count).label('count')
+        ).filter(
+            TransactionMonthlyRollup.project_id == project_id,
+            TransactionMonthlyRollup.month_yyyymm == month_yyyymm
+        ).group_by(
+            TransactionMonthlyRollup.type
+        ).all()
+
+        totals = {
+            'income': {'total': 0, 'count': 0},
+            'expense': {'total': 0, 'count': 0}
+        }
+        for r in results:
+            if r.type in totals:
+                totals[r.type] = {'total': r.total or 0, 'count': r.count or 0}
+
+        return totals
+
+    @staticmethod
+    def get_months_totals(project_id, months):
+        """
+        Get income/expense totals for several months in one query
+
+        Args:
+            project_id: Project ID
+            months: Iterable of "YYYY-MM" strings
+
+        Returns:
+            dict: {"YYYY-MM": {'income': {...}, 'expense': {...}}}
+        """
+        months = list(months)
+        totals = {
+            m: {'income': {'total': 0, 'count': 0}, 'expense': {'total': 0, 'count': 0}}
+            for m in months
+        }
+
+        results = db.session.query(
+            TransactionMonthlyRollup.month_yyyymm,
+            TransactionMonthlyRollup.type,
+            func.sum(TransactionMonthlyRollup.total_amount).label('total'),
+            func.sum(TransactionMonthlyRollup.tx_count).label('count')
+        ).filter(
+            TransactionMonthlyRollup.project_id == project_id,
+            TransactionMonthlyRollup.month_yyyymm.in_(months)
+        ).group_by(
+            TransactionMonthlyRollup.month_yyyymm,
+            TransactionMonthlyRollup.type
+        ).all()
+
+        for r in results:
+            if r.type in totals[r.month_yyyymm]:
+                totals[r.month_yyyymm][r.type] = {'total': r.total or 0, 'count': r.count or 0}
+
+        return totals
@@ -0,0 +1,178 @@
+"""
+Single Flight
+Keyed coalescing of concurrent identical computations: the first caller
+computes, callers arriving while it runs wait for and share its result
+"""
+import copy
+import hashlib
+import json
+import threading
+import functools
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error', 'shared', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.shared = False         # value holds a snapshot followers may copy
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    In-process single-flight group
+
+    Only in-flight calls are shared; nothing is kept once the leader
+    returns (caching is the job of analytics_cache / ai_memo). The leader
+    keeps its result and followers get deep copies of a snapshot taken
+    before they are woken, so callers that decorate the returned dict
+    never see each other's changes; followers re-raise the leader's
+    exception. A follower that waits longer than wait_timeout, or whose
+    leader's result cannot be copied, computes on its own.
+    """
+
+    def __init__(self, wait_timeout=60.0):
+        self.wait_timeout = wait_timeout
+        self.enabled = True
+        self._calls = {}            # key -> _Call
+        self._lock = threading.Lock()
+        self._metrics = {}          # namespace -> {'calls', 'coalesced', 'timeouts'}
+
+    def init_app(self, app):
+        """Configure from Flask app config"""
+        self.enabled = app.config.get('SINGLE_FLIGHT_ENABLED', True)
+        self.wait_timeout = app.config.get('SINGLE_FLIGHT_WAIT_SECONDS', self.wait_timeout)
+        app.extensions['single_flight'] = self
+
+    def _count(self, namespace, field):
+        metrics = self._metrics.setdefault(namespace, {'calls': 0, 'coalesced': 0, 'timeouts': 0})
+        metrics[field] += 1
+
+    def do(self, namespace, key, fn):
+        """
+        Run fn once per concurrent (namespace, key)
+
+        Args:
+            namespace: Metrics bucket ('analytics', 'openrouter', 'gemini', ...)
+            key: Hashable key identifying identical computations
+            fn: Zero-argument callable
+
+        Returns:
+            fn's result (the leader's, deep-copied for followers)
+        """
+        if not self.enabled:
+            return fn()
+
+        full_key = (namespace, key)
+        with self._lock:
+            self._count(namespace, 'calls')
+            call = self._calls.get(full_key)
+            if call is None:
+                call = self._calls[full_key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                self._count(namespace, 'coalesced')
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self._count(namespace, 'timeouts')
+                return fn()
+            if call.error is not None:
+                raise call.error
+            if not call.shared:
+                return fn()
+            return copy.deepcopy(call.value)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.error = e
+            self._finish(full_key, call)
+            raise
+
+        # Followers copy from a private snapshot: the leader's caller owns `result`
+        # and may mutate or cache it while they are still copying
+        waiters = self._finish(full_key, call, wake=False)
+        try:
+            if waiters:
+                call.value = copy.deepcopy(result)
+                call.shared = True
+        except Exception:
+            pass  # Not copyable: followers recompute instead of sharing
+        finally:
+            call.done.set()
+        return result
+
+    def _finish(self, full_key, call, wake=True):
+        """Unregister a call (no follower can join afterwards), returns its waiter count"""
+        with self._lock:
+            self._calls.pop(full_key, None)
+            waiters = call.waiters
+        if wake:
+            call.done.set()
+        return waiters
+
+    def stats(self):
+        with self._lock:
+            namespaces = {name: dict(metrics) for name, metrics in self._metrics.items()}
+            inflight = len(self._calls)
+        calls = sum(m['calls'] for m in namespaces.values())
+        coalesced = sum(m['coalesced'] for m in namespaces.values())
+        return {
+            'enabled': self.enabled,
+            'inflight': inflight,
+            'calls': calls,
+            'coalesced': coalesced,
+            'coalesced_rate': round(coalesced / calls, 4) if calls else 0.0,
+            'namespaces': namespaces
+        }
+
+
+single_flight = SingleFlight()
+
+
+def _freeze(value):
+    """Hashable form of call arguments (lists/dicts/sets become tuples)"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def prompt_key(*parts):
+    """Compact key for an LLM request (model, prompts, generation settings)"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def coalesced(namespace, project_scoped=True):
+    """
+    Decorator: coalesce concurrent calls with identical arguments
+
+    For project-scoped functions (project_id first) the key includes the
+    project's analytics cache generation, so a caller arriving after its
+    own write never joins a computation that started before it.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                key = (fn.__qualname__, _freeze(args), _freeze(kwargs))
+                if project_scoped and args:
+                    from app.services.cache_service import analytics_cache
+                    key += (analytics_cache.generation(args[0]),)
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            return single_flight.do(namespace, key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -2,12 +2,49 @@
 Transaction service - Business logic for transactions
 """
 from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models.transaction import Transaction
 from app.models.category import Category
 from app.models.project import Project, ProjectMember
 from app.utils.validators import validate_transaction_type, validate_amount
-from app.utils.helpers import baht_to_satang
+from app.utils.helpers import baht_to_satang, encode_cursor, decode_cursor
+
+
+# Operations accepted per batch request (see TransactionService.apply_batch)
+MAX_BATCH_OPERATIONS = 200
+
+BATCH_OPS = ('create', 'update', 'delete')
+
+# Fields a batch update may change
+BATCH_UPDATE_FIELDS = ('type', 'category_id', 'amount', 'occurred_at', 'note', 'member_id')
+
+
+# Columns read by the cursor listing (see serialize_listing_row)
+LISTING_COLUMNS = (
+    Transaction.id,
+    Transaction.project_id,
+    Transaction.member_id,
+    Transaction.type,
+    Transaction.category_id,
+    Transaction.amount,
+    Transaction.currency,
+    Transaction.occurred_at,
+    Transaction.note,
+    Transaction.created_at,
+    Transaction.updated_at,
+    Category.id.label('category_row_id'),
+    Category.project_id.label('category_project_id'),
+    Category.type.label('category_type'),
+    Category.name_th.label('category_name_th'),
+    Category.name_en.label('category_name_en'),
+    Category.icon.label('category_icon'),
+    Category.color.label('category_color'),
+    Category.sort_order.label('category_sort_order'),
+    Category.is_active.label('category_is_active'),
+    Category.created_at.label('category_created_at'),
+)
 
 
 class TransactionService:
@@ -96,6 +133,41 @@ class TransactionService:
 
         return transaction
 
+    @staticmethod
+    def _listing_filters(project_id, filters=None):
+        """Filter expressions shared by the paged and cursor listings"""
+        conditions = [
+            Transaction.project_id == project_id,
+            Transaction.deleted_at.is_(None)
+        ]
+        if not filters:
+            return conditions
+
+        if filters.get('type'):
+            conditions.append(Transaction.type == filters['type'])
+
+        if filters.get('category_id'):
+            conditions.append(Transaction.category_id == filters['category_id'])
+
+        if filters.get('from_date'):
+            from_date = datetime.fromisoformat(filters['from_date'].replace('Z', '+00:00'))
+            # Strip timezone info if present
+            if from_date.tzinfo is not None:
+                from_date = from_date.replace(tzinfo=None)
+            conditions.append(Transaction.occurred_at >= from_date)
+
+        if filters.get('to_date'):
+            to_date = datetime.fromisoformat(filters['to_date'].replace('Z', '+00:00'))
+            # Strip timezone info if present
+            if to_date.tzinfo is not None:
+                to_date = to_date.replace(tzinfo=None)
+            conditions.append(Transaction.occurred_at <= to_date)
+
+        if filters.get('member_id'):
+            conditions.append(Transaction.member_id == filters['member_id'])
+
+        return conditions
+
     @staticmethod
     def get_transactions(project_id, user_id, filters=None):
         """
@@ -105,52 +177,119 @@ class TransactionService:
             project_id: Project ID
             user_id: User ID (for permission check)
             filters: Dictionary of filters (type, category_id, from_date, to_date, etc.)
+                     plus page, per_page and count (False skips the COUNT(*) query)
 
         Returns:
-            List of Transaction objects
+            Pagination of Transaction objects (category joined-loaded)
         """
         # Check access
         if not TransactionService._check_project_access(project_id, user_id):
             raise PermissionError("User doesn't have access to this project")
 
-        query = Transaction.query.filter_by(
-            project_id=project_id,
-            deleted_at=None
-        )
+        query = Transaction.query.options(
+            joinedload(Transaction.category)
+        ).filter(
+            *TransactionService._listing_filters(project_id, filters)
+        ).order_by(Transaction.occurred_at.desc(), Transaction.id.desc())
 
-        # Apply filters
-        if filters:
-            if filters.get('type'):
-                query = query.filter_by(type=filters['type'])
+        # Pagination
+        page = filters.get('page', 1) if filters else 1
+        per_page = filters.get('per_page', 50) if filters else 50
+        count = filters.get('count', True) if filters else True
 
-            if filters.get('category_id'):
-                query = query.filter_by(category_id=filters['category_id'])
+        return query.paginate(page=page, per_page=per_page, error_out=False, count=count)
 
-            if filters.get('from_date'):
-                from_date = datetime.fromisoformat(filters['from_date'].replace('Z', '+00:00'))
-                # Strip timezone info if present
-                if from_date.tzinfo is not None:
-                    from_date = from_date.replace(tzinfo=None)
-                query = query.filter(Transaction.occurred_at >= from_date)
+    @staticmethod
+    def list_transactions(project_id, user_id, filters=None, cursor=None, limit=50, with_count=False):
+        """
+        Keyset-paginated transaction listing without ORM hydration
 
-            if filters.get('to_date'):
-                to_date = datetime.fromisoformat(filters['to_date'].replace('Z', '+00:00'))
-                # Strip timezone info if present
-                if to_date.tzinfo is not None:
-                    to_date = to_date.replace(tzinfo=None)
-                query = query.filter(Transaction.occurred_at <= to_date)
+        Pages are ordered by (occurred_at, id) descending and continue from
+        the cursor of the previous page, so every page costs the same index
+        range scan however deep the client scrolls. Rows are column
+        projections joined to their category in the same query.
 
-            if filters.get('member_id'):
-                query = query.filter_by(member_id=filters['member_id'])
+        Args:
+            project_id: Project ID
+            user_id: User ID (for permission check)
+            filters: Dictionary of filters (type, category_id, from_date, to_date, member_id)
+            cursor: next_cursor returned by the previous page (None for the first page)
+            limit: Page size
+            with_count: Also return the total number of matching rows (one COUNT(*))
 
-        # Order by occurred_at descending
-        query = query.order_by(Transaction.occurred_at.desc())
+        Returns:
+            dict: items (serialized), next_cursor, has_more and total (None unless requested)
 
-        # Pagination
-        page = filters.get('page', 1) if filters else 1
-        per_page = filters.get('per_page', 50) if filters else 50
+        Raises:
+            PermissionError: If user doesn't have access
+            ValueError: If the cursor is malformed
+        """
+        if not TransactionService._check_project_access(project_id, user_id):
+            raise PermissionError("User doesn't have access to this project")
+
+        conditions = TransactionService._listing_filters(project_id, filters)
+        total = None
+        if with_count:
+            total = db.session.query(db.func.count(Transaction.id)).filter(*conditions).scalar()
+
+        if cursor:
+            occurred_at, last_id = decode_cursor(cursor)
+            conditions.append(tuple_(Transaction.occurred_at, Transaction.id) < (occurred_at, last_id))
+
+        rows = db.session.query(
+            *LISTING_COLUMNS
+        ).outerjoin(
+            Category, Category.id == Transaction.category_id
+        ).filter(
+            *conditions
+        ).order_by(
+            Transaction.occurred_at.desc(), Transaction.id.desc()
+        ).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].occurred_at, rows[-1].id) if has_more else None
+
+        return {
+            'items': [TransactionService.serialize_listing_row(row) for row in rows],
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'total': total
+        }
 
-        return query.paginate(page=page, per_page=per_page, error_out=False)
+    @staticmethod
+    def serialize_listing_row(row):
+        """Same shape as Transaction.to_dict(include_category=True), from a LISTING_COLUMNS row"""
+        data = {
+            'id': row.id,
+            'project_id': row.project_id,
+            'member_id': row.member_id,
+            'type': row.type,
+            'category_id': row.category_id,
+            'amount': row.amount,
+            'amount_formatted': row.amount / 100.0,
+            'currency': row.currency,
+            'occurred_at': row.occurred_at.isoformat() if row.occurred_at else None,
+            'note': row.note,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
+        }
+
+        if row.category_row_id:
+            data['category'] = {
+                'id': row.category_row_id,
+                'project_id': row.category_project_id,
+                'type': row.category_type,
+                'name_th': row.category_name_th,
+                'name_en': row.category_name_en,
+                'icon': row.category_icon,
+                'color': row.category_color,
+                'sort_order': row.category_sort_order,
+                'is_active': row.category_is_active,
+                'created_at': row.category_created_at.isoformat() if row.category_created_at else None
+            }
+
+        return data
 
     @staticmethod
     def update_transaction(transaction_id, user_id, updates):
@@ -236,6 +375,201 @@ class TransactionService:
 
         return True
 
+    @staticmethod
+    def _batch_amount(amount):
+        """Same baht/satang rule as create_transaction"""
+        if isinstance(amount, (int, float)) and not isinstance(amount, bool) and amount < 1000000:
+            amount = baht_to_satang(amount)
+        return validate_amount(amount)
+
+    @staticmethod
+    def _batch_occurred_at(value, required=False):
+        """
+        ISO string or datetime to a naive datetime
+
+        None is allowed for creates (defaults to now) but not for updates.
+        """
+        if value is None and not required:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        elif not isinstance(value, datetime):
+            raise ValueError("occurred_at must be an ISO 8601 date/time string")
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def _batch_text(value, field):
+        """Optional string field (note, member_id): None or a string"""
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        return value
+
+    @staticmethod
+    def _batch_category(index, op, type, fallback=False):
+        """
+        Category entry for a create/update op (category_id, else category_name)
+
+        With fallback, an unknown category_name maps to the first category
+        of the type, as /bot/transactions/create does.
+        """
+        if op.get('category_id'):
+            entry = index.get(op['category_id'])
+        elif op.get('category_name'):
+            entry = index.lookup(op['category_name'], type)
+            if entry is None and fallback:
+                entry = index.default_for_type(type)
+        else:
+            return None
+        if entry is None:
+            raise ValueError("Invalid category for this project")
+        return entry
+
+    @staticmethod
+    def apply_batch(project_id, user_id, operations):
+        """
+        Validate and apply create/update/delete operations in one DB transaction
+
+        Every operation is validated first (categories from the in-memory
+        project index, referenced transactions in one query); nothing is
+        written unless all of them pass, and then everything is committed
+        at once.
+
+        Args:
+            project_id: Project ID
+            user_id: User ID (for permission check)
+            operations: List of dicts with "op" ('create' (default), 'update'
+                or 'delete'), an optional client "ref", "id" for update/delete,
+                and the fields of create_transaction / update_transaction
+                (category_name is accepted in place of category_id)
+
+        Returns:
+            tuple: (ok, results) with one result per operation, in order:
+                {index, op, ref, success, transaction | id | error}
+
+        Raises:
+            ValueError: If operations is not a non-empty list within MAX_BATCH_OPERATIONS
+            PermissionError: If user doesn't have access
+        """
+        from app.services.category_index import category_index
+
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("operations must be a non-empty list")
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+        if not TransactionService._check_project_access(project_id, user_id):
+            raise PermissionError("User doesn't have access to this project")
+
+        index = category_index.get(project_id)
+        ids = {op['id'] for op in operations if isinstance(op, dict) and isinstance(op.get('id'), str)}
+        existing = {
+            t.id: t for t in Transaction.query.filter(
+                Transaction.id.in_(ids),
+                Transaction.project_id == project_id,
+                Transaction.deleted_at.is_(None)
+            )
+        } if ids else {}
+
+        # Pass 1: validate everything into a plan, touching no ORM state
+        plan, results, deleted = [], [], set()
+        for i, op in enumerate(operations):
+            result = {'index': i, 'op': None, 'ref': None, 'success': False}
+            results.append(result)
+            try:
+                if not isinstance(op, dict):
+                    raise ValueError("Operation must be an object")
+                kind = op.get('op', 'create')
+                result['op'], result['ref'] = kind, op.get('ref')
+                if kind not in BATCH_OPS:
+                    raise ValueError(f"Invalid op. Must be one of: {', '.join(BATCH_OPS)}")
+
+                if kind == 'create':
+                    type = validate_transaction_type(op.get('type'))
+                    entry = TransactionService._batch_category(index, op, type, fallback=True)
+                    if entry is None:
+                        raise ValueError("No valid category found. Please provide category_id or category_name")
+                    if entry.type != type:
+                        raise ValueError(f"Category type mismatch: category is {entry.type}, transaction is {type}")
+                    plan.append((kind, None, {
+                        'type': type,
+                        'category_id': entry.id,
+                        'amount': TransactionService._batch_amount(op.get('amount')),
+                        'occurred_at': TransactionService._batch_occurred_at(op.get('occurred_at')),
+                        'note': TransactionService._batch_text(op.get('note'), 'note'),
+                        'member_id': TransactionService._batch_text(op.get('member_id'), 'member_id')
+                    }))
+                else:
+                    if not isinstance(op.get('id'), str):
+                        raise ValueError("id must be a transaction id string")
+                    transaction = existing.get(op['id'])
+                    if transaction is None or transaction.id in deleted:
+                        raise ValueError("Transaction not found")
+
+                    if kind == 'delete':
+                        deleted.add(transaction.id)
+                        plan.append((kind, transaction, None))
+                    else:
+                        changes = {field: op[field] for field in BATCH_UPDATE_FIELDS if field in op}
+                        if 'amount' in changes:
+                            changes['amount'] = TransactionService._batch_amount(changes['amount'])
+                        if 'type' in changes:
+                            changes['type'] = validate_transaction_type(changes['type'])
+                        if 'occurred_at' in changes:
+                            changes['occurred_at'] = TransactionService._batch_occurred_at(
+                                changes['occurred_at'], required=True)
+                        for field in ('note', 'member_id'):
+                            if field in changes:
+                                TransactionService._batch_text(changes[field], field)
+                        type = changes.get('type', transaction.type)
+                        if 'category_id' in changes or op.get('category_name'):
+                            changes['category_id'] = TransactionService._batch_category(index, op, type).id
+                        entry = index.get(changes.get('category_id', transaction.category_id))
+                        if entry is not None and entry.type != type:
+                            raise ValueError(f"Category type mismatch: category is {entry.type}, transaction is {type}")
+                        plan.append((kind, transaction, changes))
+
+            except (ValueError, TypeError) as e:
+                result['error'] = str(e)
+            else:
+                result['success'] = True
+
+        if not all(result['success'] for result in results):
+            for result in results:
+                if result['success']:
+                    result['success'] = False
+                    result['error'] = 'Not applied: another operation in the batch failed'
+            return False, results
+
+        # Pass 2: apply and commit once
+        now = datetime.utcnow()
+        touched = []
+        for (kind, transaction, values), result in zip(plan, results):
+            if kind == 'create':
+                transaction = Transaction(project_id=project_id, **values)
+                db.session.add(transaction)
+            elif kind == 'update':
+                for field, value in values.items():
+                    setattr(transaction, field, value)
+            else:
+                transaction.deleted_at = now
+            touched.append(transaction)
+
+        try:
+            db.session.flush()
+            # Serialize before commit so expire_on_commit does not reload every row
+            for (kind, _, _), transaction, result in zip(plan, touched, results):
+                if kind == 'delete':
+                    result['id'] = transaction.id
+                else:
+                    result['transaction'] = transaction.to_dict(include_category=True)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return True, results
+
     @staticmethod
     def _check_project_access(project_id, user_id):
         """
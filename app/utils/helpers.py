@@ -1,6 +1,7 @@
 """
 Helper utilities
 """
+import base64
 import secrets
 import string
 from datetime import datetime
@@ -101,3 +102,39 @@ def get_month_range(year, month):
         end_date = datetime(year, month + 1, 1)
 
     return start_date, end_date
+
+
+def encode_cursor(occurred_at, item_id):
+    """
+    Encode a keyset pagination position as an opaque URL-safe token
+
+    Args:
+        occurred_at: Sort timestamp of the last item on the page
+        item_id: ID of the last item (tie-breaker)
+
+    Returns:
+        Cursor string
+    """
+    raw = f"{occurred_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor
+
+    Args:
+        cursor: Cursor string
+
+    Returns:
+        tuple: (occurred_at, item_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        occurred_at, item_id = raw.split('|', 1)
+        return datetime.fromisoformat(occurred_at), item_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,100 @@
+"""
+Keyword matcher - Aho-Corasick multi-pattern automaton
+Finds every keyword occurring in a text in one linear pass
+"""
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a fixed keyword table
+
+    Build once at import time; find_all() then reports every keyword that
+    occurs as a substring of the text (same semantics as `kw in text`),
+    in O(len(text) + matches) regardless of the number of keywords.
+    """
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords: Iterable of keywords (tag = keyword itself)
+                or of (keyword, tag) pairs
+        """
+        # Trie (goto), failure links and per-node output tags; node 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for item in keywords:
+            keyword, tag = (item, item) if isinstance(item, str) else item
+            if keyword:
+                self._add(keyword, tag)
+        self._build()
+
+    @classmethod
+    def from_groups(cls, groups):
+        """
+        Build from {tag: [keywords]}; find_all() then returns matched tags
+
+        Args:
+            groups: Dict mapping a tag to its keyword list
+        """
+        return cls((keyword, tag) for tag, keywords in groups.items() for keyword in keywords)
+
+    def _add(self, keyword, tag):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node] = self._out[node] + (tag,)
+
+    def _build(self):
+        # Breadth-first, so a node's failure target is always finished first;
+        # depth-1 nodes keep the root as their failure link
+        order = []
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+        # Fold failure links into a full transition table (DFA), so scanning
+        # does exactly one dict lookup per character
+        self._delta = [None] * len(self._goto)
+        self._delta[0] = dict(self._goto[0])
+        for node in order:
+            delta = dict(self._delta[self._fail[node]])
+            delta.update(self._goto[node])
+            self._delta[node] = delta
+
+    def find_all(self, text):
+        """
+        Return the set of tags of all keywords found in text
+
+        Args:
+            text: Text to scan (normalize case before calling)
+
+        Returns:
+            set: Matched tags
+        """
+        delta = self._delta
+        out = self._out
+        found = set()
+        node = 0
+        for ch in text:
+            node = delta[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
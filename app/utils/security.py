@@ -7,8 +7,7 @@ import base64
 from datetime import datetime
 from flask import current_app, request, g
 from functools import wraps
-from app import db
-from app.models.security import BotNonce, IdempotencyKey
+from app.services.replay_store import replay_store
 
 
 def verify_line_signature(body, signature):
@@ -79,17 +78,7 @@ def check_bot_nonce(nonce, bot_id):
     Returns:
         bool: True if nonce is valid (not used before)
     """
-    existing = BotNonce.query.filter_by(nonce=nonce).first()
-
-    if existing:
-        return False
-
-    # Store nonce
-    bot_nonce = BotNonce(nonce=nonce, bot_id=bot_id)
-    db.session.add(bot_nonce)
-    db.session.commit()
-
-    return True
+    return replay_store.claim_nonce(nonce, bot_id)
 
 
 def check_idempotency(event_id, endpoint):
@@ -103,13 +92,14 @@ def check_idempotency(event_id, endpoint):
     Returns:
         tuple: (is_duplicate, existing_response)
     """
-    existing = IdempotencyKey.query.filter_by(event_id=event_id).first()
+    stored = replay_store.get_response(event_id)
 
-    if existing and not existing.is_expired():
+    if stored:
         # Return cached response
+        status, body = stored
         return True, {
-            'status': existing.response_status,
-            'body': existing.response_body
+            'status': status,
+            'body': body
         }
 
     # Not a duplicate or expired
@@ -126,15 +116,7 @@ def store_idempotency_response(event_id, endpoint, status_code, response_body):
         status_code: HTTP status code
         response_body: Response body (as string)
     """
-    key = IdempotencyKey.query.filter_by(event_id=event_id).first()
-
-    if not key:
-        key = IdempotencyKey(event_id=event_id, endpoint=endpoint)
-        db.session.add(key)
-
-    key.response_status = status_code
-    key.response_body = response_body
-    db.session.commit()
+    replay_store.put_response(event_id, endpoint, status_code, response_body)
 
 
 def require_bot_auth(require_idempotency=False):
@@ -185,7 +167,8 @@ def require_bot_auth(require_idempotency=False):
 
             # Check idempotency if required
             if require_idempotency:
-                event_id = request.json.get('event_id') if request.json else None
+                payload = request.get_json(silent=True)
+                event_id = payload.get('event_id') if isinstance(payload, dict) else None
                 if not event_id:
                     return {
                         'error': {
@@ -1,6 +1,11 @@
 """
 Script to run database migrations
 """
+import os
+
+# One-shot script: no LINE queue / precompute workers
+os.environ['BACKGROUND_WORKERS_AUTOSTART'] = 'False'
+
 from app import create_app, db
 from app.migrations.add_invite_fields import upgrade
 from app.migrations.add_advanced_analytics_tables import migrate
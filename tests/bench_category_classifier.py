@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark: local learned categorizer vs rule-based matching vs Gemini
+Trains the naive Bayes classifier on a labelled note history, then compares
+holdout accuracy and per-note latency. Pass --llm (with GEMINI_API_KEY set)
+to also time Gemini on a sample of the holdout set.
+"""
+import os
+import sys
+import random
+import time
+import timeit
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.gemini_nlp_service import GeminiNLPService
+from app.services.category_index import CategoryIndex
+from app.services.category_classifier import NaiveBayesCategorizer
+
+CATEGORIES = [
+    {'id': 'food', 'name_th': 'อาหาร', 'type': 'expense'},
+    {'id': 'transport', 'name_th': 'เดินทาง', 'type': 'expense'},
+    {'id': 'shopping', 'name_th': 'ช้อปปิ้ง', 'type': 'expense'},
+    {'id': 'fun', 'name_th': 'ความบันเทิง', 'type': 'expense'},
+    {'id': 'health', 'name_th': 'สุขภาพ', 'type': 'expense'},
+    {'id': 'bills', 'name_th': 'ค่าสาธารณูปโภค', 'type': 'expense'},
+    {'id': 'pets', 'name_th': 'สัตว์เลี้ยง', 'type': 'expense'},
+]
+
+# What one household actually writes: shop names and personal shorthand,
+# mostly absent from the built-in alias lists
+NOTES = {
+    'food': ['ข้าวมันไก่', 'ก๋วยเตี๋ยว', 'กาแฟ amazon', 'starbucks', 'ส้มตำ', 'ข้าวเย็น', 'mk suki',
+             'ชานมไข่มุก', 'ข้าวกะเพรา', 'kfc', 'ผัดไทย', 'บุฟเฟ่ต์ชาบู', 'โจ๊กเช้า', 'กาแฟ'],
+    'transport': ['grab ไปออฟฟิศ', 'bts', 'เติมน้ำมัน ptt', 'วินมอไซค์', 'ค่าทางด่วน', 'bolt',
+                  'mrt', 'แท็กซี่กลับบ้าน', 'ที่จอดรถ', 'rabbit card', 'shell', 'รถตู้'],
+    'shopping': ['shopee', 'lazada', 'uniqlo', 'ต่างหู', 'ikea', 'big c', 'เซเว่น', 'lotus',
+                 'เสื้อยืด', 'รองเท้าวิ่ง', 'makro', 'ของใช้ในบ้าน'],
+    'fun': ['netflix', 'spotify', 'ดูหนัง major', 'steam', 'youtube premium', 'คาราโอเกะ',
+            'คอนเสิร์ต', 'disney+', 'เกม', 'โบว์ลิ่ง'],
+    'health': ['ร้านยา', 'หมอฟัน', 'fitness first', 'วิตามิน', 'คลินิก', 'โรงพยาบาล', 'นวดแผนไทย',
+               'ตรวจสุขภาพ', 'แว่นตา'],
+    'bills': ['ค่าไฟ', 'ค่าน้ำ', 'true internet', 'ais รายเดือน', 'ค่าส่วนกลาง', 'ais fibre',
+              'dtac', 'ค่าเน็ต', 'ค่าแก๊ส'],
+    'pets': ['อาหารแมว', 'ทรายแมว', 'หมอหมา', 'วัคซีนแมว', 'royal canin', 'ขนมหมา',
+             'อาบน้ำหมา', 'petshop'],
+}
+
+# Notes that never appear in the history (new shops, first-time purchases)
+NOVEL = {
+    'food': ['ข้าวผัดปู', 'ร้านอาหารญี่ปุ่น', 'ชาเขียว'],
+    'transport': ['taxi สนามบิน', 'ตั๋วรถทัวร์', 'grab bike'],
+    'shopping': ['ซื้อกระเป๋า', 'shopee 11.11', 'เสื้อผ้าเด็ก'],
+    'fun': ['netflix รายปี', 'ดูหนังรอบดึก', 'game pass'],
+    'health': ['ยาแก้แพ้', 'คลินิกผิวหนัง', 'gym รายเดือน'],
+    'bills': ['ค่าไฟบ้านแม่', 'อินเทอร์เน็ตมือถือ', 'บิลโทรศัพท์'],
+    'pets': ['อาหารแมวเปียก', 'ทรายแมวเต้าหู้', 'ขนมแมว'],
+}
+
+DECORATIONS = ['', '', '', ' {n}', ' {n} บาท', ' วันนี้', ' ตอนเช้า', ' กับแฟน', ' (2)', ' ครึ่งนึง']
+
+
+def make_notes(size, vocabulary, rng):
+    notes = []
+    for _ in range(size):
+        category_id = rng.choice(list(vocabulary))
+        note = rng.choice(vocabulary[category_id]) + rng.choice(DECORATIONS).format(n=rng.randint(20, 2000))
+        notes.append((note, category_id))
+    return notes
+
+
+def make_dataset(size, novel_share=0.15, seed=7):
+    """(train, holdout): holdout mixes repeat notes with novel_share unseen ones"""
+    rng = random.Random(seed)
+    history = make_notes(size, NOTES, rng)
+    split = int(len(history) * 0.8)
+    train, holdout = history[:split], history[split:]
+    novel = int(len(holdout) * novel_share)
+    holdout = holdout[novel:] + make_notes(novel, NOVEL, rng)
+    return train, holdout
+
+
+def evaluate(predict, holdout):
+    correct = sum(1 for note, category_id in holdout if predict(note) == category_id)
+    return correct / len(holdout)
+
+
+def per_call_us(fn, items, number):
+    total = timeit.timeit(lambda: [fn(x) for x in items], number=number)
+    return total / (number * len(items)) * 1e6
+
+
+def main(size=2000, number=20, llm_sample=20):
+    train, holdout = make_dataset(size)
+    holdout_notes = [note for note, _ in holdout]
+
+    nlp = GeminiNLPService()
+    index = CategoryIndex(CATEGORIES)
+
+    started = time.perf_counter()
+    model = NaiveBayesCategorizer()
+    for note, category_id in train:
+        model.learn(note, category_id)
+    train_ms = (time.perf_counter() - started) * 1000
+
+    def rule_based(note):
+        return nlp._rule_based_categorize(note, CATEGORIES, index)['category_id']
+
+    def learned(note):
+        return model.predict(note)[0]
+
+    def hybrid(note):
+        # What suggest_category returns without an API key
+        local = nlp._learned_categorize(note, CATEGORIES, model)
+        if local and local['confidence'] >= model.min_confidence:
+            return local['category_id']
+        return nlp._best_local(local, nlp._rule_based_categorize(note, CATEGORIES, index))['category_id']
+
+    confident = sum(1 for note in holdout_notes if model.predict(note)[1] >= model.min_confidence)
+
+    print(f"🏷️  Category suggestion benchmark ({len(train)} train / {len(holdout)} holdout notes)")
+    print("=" * 62)
+    print(f"  naive Bayes training:      {train_ms:8.1f} ms total "
+          f"({train_ms * 1000 / len(train):.1f} µs/note), {model.stats()['vocabulary']} n-grams")
+    print(f"  {'method':<26}{'accuracy':>10}{'µs/note':>12}")
+    for name, fn in (('rule-based (index)', rule_based), ('naive Bayes', learned), ('naive Bayes + rules', hybrid)):
+        print(f"  {name:<26}{evaluate(fn, holdout):>9.1%}{per_call_us(fn, holdout_notes, number):>12.1f}")
+    print(f"  answered locally (conf ≥ {model.min_confidence}): {confident / len(holdout):.1%} of notes")
+
+    if '--llm' in sys.argv:
+        if not nlp.is_available():
+            print("  Gemini: skipped (GEMINI_API_KEY not set or SDK missing)")
+            return
+        sample = random.Random(1).sample(holdout, llm_sample)
+        started = time.perf_counter()
+        accuracy = evaluate(lambda note: nlp.suggest_category(note, CATEGORIES, index=index)['category_id'], sample)
+        elapsed_us = (time.perf_counter() - started) / len(sample) * 1e6
+        print(f"  {'Gemini (' + str(len(sample)) + ' notes)':<26}{accuracy:>9.1%}{elapsed_us:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
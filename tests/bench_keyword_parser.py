@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the rule-based chat parser
+Measures per-message cost of keyword matching, _simple_parse and _rule_based_categorize
+"""
+import os
+import sys
+import timeit
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.gemini_nlp_service import (
+    GeminiNLPService, PARSE_KEYWORDS, CATEGORY_KEYWORD_GROUPS
+)
+
+MESSAGES = [
+    'สรุป', 'สรุปเดือนที่แล้ว', 'รายการประจำ', 'เพิ่มรายการประจำ Netflix 300 บาท ทุกวันที่ 1',
+    'ลบรายการประจำที่ 2', 'ตั้งงบ อาหาร 5000 บาท', 'ดูรายการวันนี้', 'ลบรายการล่าสุด',
+    'กาแฟ 50 บาท', 'เงินเดือน 30000 บาท', 'ตั้งเป้าหมาย ทริป 20000 บาท 6 เดือน', 'ช่วยเหลือ',
+]
+
+CATEGORIES = [
+    {'id': str(i), 'name_th': name, 'type': 'expense'}
+    for i, name in enumerate(list(CATEGORY_KEYWORD_GROUPS) + ['อื่นๆ'])
+]
+
+NOTES = ['กาแฟ', 'grab ไปทำงาน', 'netflix', 'ค่าไฟ', 'ซื้อรองเท้า', 'ข้าวมันไก่ ร้านอาหาร', 'xyz']
+
+
+def per_call_us(fn, items, number):
+    total = timeit.timeit(lambda: [fn(x) for x in items], number=number)
+    return total / (number * len(items)) * 1e6
+
+
+def main(number=2000):
+    nlp = GeminiNLPService()
+    keywords = sorted(PARSE_KEYWORDS.find_all(' '.join(MESSAGES).lower()) | {
+        kw for group in CATEGORY_KEYWORD_GROUPS.values() for kw in group
+    })
+    lowered = [m.lower() for m in MESSAGES]
+
+    print("⏱️  Rule parser micro-benchmark (µs per message)")
+    print("=" * 50)
+    print(f"  naive substring scan ({len(keywords)} kw): "
+          f"{per_call_us(lambda m: {k for k in keywords if k in m}, lowered, number):8.2f}")
+    print(f"  automaton find_all:                "
+          f"{per_call_us(PARSE_KEYWORDS.find_all, lowered, number):8.2f}")
+    print(f"  _simple_parse:                     "
+          f"{per_call_us(nlp._simple_parse, MESSAGES, number):8.2f}")
+    print(f"  _rule_based_categorize ({len(CATEGORIES)} cats):  "
+          f"{per_call_us(lambda n: nlp._rule_based_categorize(n, CATEGORIES), NOTES, number):8.2f}")
+
+
+if __name__ == '__main__':
+    main()
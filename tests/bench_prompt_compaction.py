@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: raw transaction rows vs compact digest in AI prompts
+Seeds growing histories into an in-memory database and compares the
+estimated prompt tokens of the old row-list payload with the
+PromptCompactor digest (which must stay within AI_PROMPT_TOKEN_BUDGET)
+"""
+import os
+import sys
+import io
+import json
+import random
+import time
+import contextlib
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FLASK_ENV'] = 'testing'  # No SQL echo
+
+from app import create_app, db
+from app.models.user import User
+from app.models.project import Project
+from app.models.category import Category
+from app.models.transaction import Transaction
+from app.services.prompt_compactor import PromptCompactor
+
+EXPENSE_NOTES = ['ข้าวมันไก่', 'กาแฟ', 'grab', 'bts', 'shopee', 'เซเว่น', 'ก๋วยเตี๋ยว', 'ค่าไฟ',
+                 'ค่าน้ำ', 'เติมน้ำมัน', 'lazada', 'mk suki', 'ร้านยา', 'ดูหนัง']
+BILLS = [('Netflix', 41900), ('ค่าเน็ต', 59900), ('ฟิตเนส', 150000)]
+
+
+def seed(project_id, categories, size, rng, now, bills=False):
+    """`size` random transactions over the last year (plus a year of monthly bills)"""
+    expense = [c for c in categories if c.type == 'expense']
+    income = [c for c in categories if c.type == 'income']
+    for _ in range(size):
+        category = rng.choice(income) if rng.random() < 0.1 else rng.choice(expense)
+        note = 'เงินเดือน' if category.type == 'income' else rng.choice(EXPENSE_NOTES) + rng.choice(['', '', ' ร้านใหม่'])
+        db.session.add(Transaction(project_id, category.type, category.id, rng.randint(2000, 90000),
+                                   occurred_at=now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+                                   note=note))
+    for month in range(12 if bills else 0):
+        for note, amount in BILLS:
+            db.session.add(Transaction(project_id, 'expense', expense[-1].id, amount,
+                                       occurred_at=now - timedelta(days=30 * month + 2), note=note))
+    db.session.commit()
+
+
+def raw_payload(project_id, days):
+    """The row list the AI endpoints used to serialize (capped at 500 rows)"""
+    rows = Transaction.query.filter(
+        Transaction.project_id == project_id,
+        Transaction.deleted_at.is_(None),
+        Transaction.occurred_at >= datetime.now() - timedelta(days=days)
+    ).order_by(Transaction.occurred_at.desc()).limit(500).all()
+    return json.dumps([{
+        'amount': tx.amount / 100, 'type': tx.type, 'category_name': tx.category.name_th,
+        'note': tx.note or '', 'date': tx.occurred_at.strftime('%Y-%m-%d')
+    } for tx in rows], ensure_ascii=False, indent=2)
+
+
+def main(sizes=(100, 1000, 5000, 20000)):
+    app = create_app('testing')
+    rng = random.Random(7)
+    now = datetime.now()
+
+    with app.app_context():
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.create_all()
+        user = User(line_user_id='U-bench-prompt', display_name='Bench')
+        db.session.add(user)
+        db.session.flush()
+        project = Project(name='Bench', owner_user_id=user.id)
+        db.session.add(project)
+        db.session.flush()
+        categories = [Category(project.id, 'expense', name) for name in
+                      ('อาหาร', 'เดินทาง', 'ช้อปปิ้ง', 'บันเทิง', 'สุขภาพ', 'บิล')]
+        categories.append(Category(project.id, 'income', 'เงินเดือน'))
+        db.session.add_all(categories)
+        db.session.commit()
+
+        budget = app.config['AI_PROMPT_TOKEN_BUDGET']
+        print(f"🗜️  Prompt compaction benchmark (token budget {budget})")
+        print("=" * 66)
+        print(f"  {'history':>8}{'raw rows (90d)':>16}{'digest 3m':>12}{'digest 6m exp':>15}{'build ms':>11}")
+
+        seeded = 0
+        for size in sizes:
+            seed(project.id, categories, size - seeded, rng, now, bills=not seeded)
+            seeded = size
+
+            raw_tokens = PromptCompactor.estimate_tokens(raw_payload(project.id, 90))
+            started = time.perf_counter()
+            plan_digest = PromptCompactor.build_digest(project.id, months=3)
+            build_ms = (time.perf_counter() - started) * 1000
+            recurring_digest = PromptCompactor.build_digest(project.id, months=6, tx_type='expense')
+
+            print(f"  {size:>8}{raw_tokens:>16}{PromptCompactor.estimate_tokens(plan_digest):>12}"
+                  f"{PromptCompactor.estimate_tokens(recurring_digest):>15}{build_ms:>11.1f}")
+
+        candidates = ', '.join(f"{c['note']} ({c['frequency']})" for c in recurring_digest['recurring_candidates'])
+        print(f"  recurrence candidates: {candidates or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check
+Runs every read-only API endpoint against a seeded in-memory database,
+captures the SQL it issues and fails when EXPLAIN QUERY PLAN shows a
+full scan of a large table (exit code 1)
+"""
+import os
+import re
+import sys
+import io
+import contextlib
+from datetime import datetime, date, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FLASK_ENV'] = 'testing'  # No SQL echo
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models.user import User
+from app.models.project import Project
+from app.models.category import Category
+from app.models.transaction import Transaction
+from app.models.budget import Budget
+from app.models.recurring import RecurringRule
+
+# Tables that grow with usage; a scan of any other table is fine
+WATCHED_TABLES = ('transaction', 'transaction_monthly_rollup', 'budget', 'recurring_rule')
+
+# Statements that scan on purpose (whole-database maintenance, not request paths)
+ALLOWED_SCANS = (
+    re.compile(r'^SELECT transaction\.id AS transaction_id\s+FROM transaction\s+WHERE transaction\.deleted_at IS NULL'),
+)
+
+# SQLite >= 3.36 prints "SCAN t", older versions "SCAN TABLE t"
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def seed():
+    """Two projects with a year of transactions, budgets and recurring rules"""
+    user = User(line_user_id='U-plan-check', display_name='Plan Check')
+    db.session.add(user)
+    db.session.flush()
+
+    projects = []
+    for n in range(2):
+        project = Project(name=f'P{n}', owner_user_id=user.id)
+        db.session.add(project)
+        db.session.flush()
+        projects.append(project)
+
+        categories = [
+            Category(project.id, 'expense', name) for name in ('อาหาร', 'เดินทาง', 'ช้อปปิ้ง', 'บิล')
+        ] + [Category(project.id, 'income', 'เงินเดือน')]
+        db.session.add_all(categories)
+        db.session.flush()
+
+        now = datetime.now()
+        for i in range(600):
+            category = categories[i % len(categories)]
+            txn = Transaction(project.id, category.type, category.id, 1000 + i,
+                              occurred_at=now - timedelta(hours=15 * i), note=f'note {i % 25}')
+            if i % 50 == 0:
+                txn.deleted_at = now
+            db.session.add(txn)
+
+        month = now.strftime('%Y-%m')
+        for category in categories[:4]:
+            db.session.add(Budget(project_id=project.id, category_id=category.id,
+                                  month_yyyymm=month, limit_amount=500000))
+        db.session.add(RecurringRule(project.id, 'expense', categories[3].id, 30000, 'monthly',
+                                     date.today() + timedelta(days=3), day_of_month=5))
+
+    user.current_project_id = projects[0].id
+    db.session.commit()
+    return user.id, projects[0].id
+
+
+def explain(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    scans = []
+    for detail in plan:
+        match = SCAN_RE.match(detail)
+        if match and match.group(1) in WATCHED_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def main(verbose=False):
+    app = create_app('testing')
+
+    with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+        db.create_all()
+        user_id, project_id = seed()
+
+    statements = {}
+    errors = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.setdefault(statement, (parameters, set()))[1].add(capture.endpoint)
+
+    capture.endpoint = None
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+    endpoints = []
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or not rule.rule.startswith('/api/v1/'):
+            continue
+        if rule.arguments - {'project_id'} or '/ai/' in rule.rule or '/export/' in rule.rule:
+            # Needs other ids, calls an LLM, or is covered by the service-level export below
+            continue
+        endpoints.append(rule.rule.replace('<project_id>', project_id))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            for url in sorted(endpoints):
+                capture.endpoint = url
+                with contextlib.redirect_stdout(io.StringIO()):
+                    status = client.get(url).status_code
+                if status >= 500:
+                    errors.append((url, status))
+
+            # Streaming export is consumed lazily; drive the service directly
+            from app.services.export_service import ExportService
+            capture.endpoint = 'ExportService.iter_csv'
+            ''.join(ExportService.iter_csv(project_id))
+
+            # AI endpoints are skipped above; their prompt digests are plain aggregates
+            from app.services.prompt_compactor import PromptCompactor
+            capture.endpoint = 'PromptCompactor.build_digest'
+            PromptCompactor.build_digest(project_id, months=6)
+            PromptCompactor.build_digest(project_id, months=6, tx_type='expense')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        failures = []
+        with db.engine.connect() as connection:
+            for statement, (parameters, sources) in statements.items():
+                if not any(f'{table}' in statement for table in WATCHED_TABLES):
+                    continue
+                if any(pattern.match(statement) for pattern in ALLOWED_SCANS):
+                    continue
+                try:
+                    plan = explain(connection, statement, parameters)
+                except Exception as e:
+                    print(f"⚠️  Could not explain query from {sorted(sources)[0]}: {e}")
+                    continue
+                if verbose and 'transaction' in statement:
+                    print(' '.join(statement.split())[:160])
+                    print('    ' + ' | '.join(plan))
+                if full_scans(plan):
+                    failures.append((sorted(sources), statement, plan))
+
+    print("🔍 Query-plan check")
+    print("=" * 50)
+    print(f"  endpoints exercised: {len(endpoints) + 2}")
+    print(f"  distinct SELECTs:    {len(statements)}")
+    for url, status in errors:
+        print(f"  ⚠️  {status} from {url} (queries after the error were not checked)")
+
+    for sources, statement, plan in failures:
+        print(f"\n❌ Full scan ({', '.join(sources[:3])}{' ...' if len(sources) > 3 else ''})")
+        print('   ' + ' '.join(statement.split())[:400])
+        for detail in plan:
+            print(f"     {detail}")
+
+    if failures:
+        print(f"\n❌ {len(failures)} queries regress to a full scan")
+        return 1
+    print("\n✅ No full scans on watched tables")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(verbose='-v' in sys.argv))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Replay store expiry check
+Drives MemoryReplayStore with a fake clock: nonces stored after a 24h
+idempotency response must still expire on time, and overflow must drop
+the soonest-expiring entries, never a live response (exit code 1)
+"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.replay_store import MemoryReplayStore, NONCE_TTL_SECONDS
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def check_nonces_expire_behind_response():
+    clock = FakeClock()
+    store = MemoryReplayStore(clock=clock)
+    store.put_response('evt-1', '/bot/x', 200, '{}')
+    for i in range(50):
+        store.claim_nonce(f'n-{i}', 'bot')
+
+    clock.advance(NONCE_TTL_SECONDS + 120)
+    store.sweep()
+    stats = store.stats()
+    assert stats['nonces'] == 0, f"expired nonces kept: {stats}"
+    assert store.get_response('evt-1') == (200, '{}'), "live response dropped by expiry"
+    assert store.claim_nonce('n-0', 'bot'), "expired nonce still blocks"
+
+
+def check_overflow_keeps_live_responses():
+    clock = FakeClock()
+    store = MemoryReplayStore(max_entries=10, clock=clock)
+    for i in range(3):
+        store.put_response(f'evt-{i}', '/bot/x', 200, str(i))
+    for i in range(7):
+        store.claim_nonce(f'old-{i}', 'bot')
+
+    # Old nonces expire; new ones push the store over max_entries
+    clock.advance(NONCE_TTL_SECONDS + 120)
+    for i in range(7):
+        store.claim_nonce(f'new-{i}', 'bot')
+    for i in range(3):
+        assert store.get_response(f'evt-{i}') == (200, str(i)), f"live response evt-{i} evicted"
+
+    # Still over the limit with only live entries: nonces (sooner expiry) go first
+    for i in range(5):
+        store.claim_nonce(f'more-{i}', 'bot')
+    stats = store.stats()
+    assert stats['nonces'] + stats['responses'] <= 10, f"over max_entries: {stats}"
+    for i in range(3):
+        assert store.get_response(f'evt-{i}') is not None, f"response evt-{i} evicted before nonces"
+
+
+def main():
+    checks = (check_nonces_expire_behind_response, check_overflow_keeps_live_responses)
+    print("🧹 Replay store expiry check")
+    print("=" * 50)
+    failed = 0
+    for check in checks:
+        try:
+            check()
+            print(f"  ✅ {check.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ❌ {check.__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())